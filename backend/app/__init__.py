@@ -1,76 +1,107 @@
-from flask import Flask, request, jsonify
+import time
+
+# Boot reference point for time-to-first-request
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from pymongo import MongoClient
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from dotenv import load_dotenv
 import logging
-import sys
+from app.utils.database import init_db, connect_db, ensure_db
+from app.utils.rate_limit import create_rate_limiter
+from app.utils.load_shedding import create_load_shedder
+from app.utils.logging_config import configure_logging, REQUEST_LOGGER
+from app.utils.timing import start_timing, finish_timing, server_timing_header, PhaseStats, span
+from app.utils.compression import create_compressor
+from app.utils.optimizer_pool import create_optimizer_pool
+from app.utils.health import create_health_probe
+from app.models.repository import create_repository
+from app.utils.read_routing import CAUSAL_TOKEN_HEADER, decode_token
+
+# Probe endpoints: exempt from request logging, load shedding and rate limits.
+# /api/health is an alias of /api/health/ready
+LIVENESS_ALIASES = ['/', '/health']
+HEALTH_PATHS = LIVENESS_ALIASES + ['/api/health', '/api/health/live', '/api/health/ready']
+
+request_logger = logging.getLogger(REQUEST_LOGGER)
 
 # Load environment variables
 load_dotenv()
 
+def reset_startup_clock(app):
+    """Measure time-to-first-request from now (a freshly forked worker)"""
+    app.startup_clock = time.perf_counter()
+    app.startup_metrics['first_request_ms'] = None
+    app.startup_metrics['first_request_pid'] = None
+
 def create_app():
     app = Flask(__name__)
     
-    # Enhanced logging configuration
-    if os.getenv('FLASK_ENV') == 'production':
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s %(levelname)s: %(message)s',
-            handlers=[logging.StreamHandler(sys.stdout)]
-        )
-    else:
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format='%(asctime)s %(levelname)s: %(message)s'
-        )
+    # Logging goes through a background queue listener (JSON in production)
+    configure_logging()
     
     app.logger.info('Starting EasyXpense Backend...')
     
     # Configuration
     mongo_uri = os.getenv('MONGO_URI')
+    # Routes reach storage through app.repo (MongoDB or embedded SQLite)
+    app.repo = create_repository(app)
     
-    if not mongo_uri:
+    if app.repo.kind == 'mongo' and not mongo_uri:
         app.logger.error('MONGO_URI environment variable is required')
         raise ValueError('MONGO_URI environment variable is required')
     
-    app.logger.info(f'Flask environment: {os.getenv("FLASK_ENV", "development")}')
+    app.logger.info('Flask environment: %s', os.getenv("FLASK_ENV", "development"))
     
     # Strict CORS configuration
     cors_origins = ['https://easyxpense.netlify.app']
     if os.getenv('FLASK_ENV') == 'development':
         cors_origins.extend(['http://localhost:3000', 'http://localhost:5173'])
     
-    app.logger.info(f'CORS origins: {cors_origins}')
+    app.logger.info('CORS origins: %s', cors_origins)
     CORS(app, 
          origins=cors_origins, 
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type'],
+         allow_headers=['Content-Type', CAUSAL_TOKEN_HEADER],
+         expose_headers=[CAUSAL_TOKEN_HEADER],
          supports_credentials=False,
          max_age=3600)
     
+    # Render terminates TLS in a proxy: take the client address from
+    # X-Forwarded-For (trusting PROXY_FIX_HOPS proxies) so rate limits and
+    # logs see real clients instead of the proxy
+    proxy_hops = int(os.getenv('PROXY_FIX_HOPS', '1'))
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    
     # Request size limits (10MB max)
     app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
     
-    # MongoDB connection with timeouts
-    app.db = None
-    try:
-        app.logger.info('Connecting to MongoDB...')
-        client = MongoClient(
-            mongo_uri, 
-            serverSelectionTimeoutMS=10000,
-            connectTimeoutMS=10000,
-            socketTimeoutMS=10000,
-            maxPoolSize=10,
-            minPoolSize=1
-        )
-        app.db = client['EasyXpense']
-        app.db.command('ping')
-        app.logger.info(f'✓ MongoDB connected successfully to database: {app.db.name}')
-    except Exception as e:
-        app.logger.error(f'✗ MongoDB connection failed: {e}')
-        app.db = None
-        raise RuntimeError(f'Failed to connect to MongoDB: {e}')
+    # MongoDB connection is deferred so gunicorn can preload the app before
+    # forking; each worker opens its own client (see gunicorn.conf.py post_fork)
+    init_db(app, mongo_uri)
+    if app.repo.kind == 'sqlite':
+        # Embedded database: open it (creating the schema) now and report ready
+        app.repo.ping()
+        app.db_status.update(state='ready')
+        app.health_probe = None
+        app.logger.info('Using SQLite storage at %s', app.repo.path)
+    else:
+        # Background DB ping + index bootstrap; health routes read its cache
+        app.health_probe = create_health_probe(app)
+        if os.getenv('DB_CONNECT_ON_START', 'false').lower() == 'true':
+            connect_db(app)
+    
+    # Startup timings in milliseconds: app_ready_ms since the app package was
+    # imported, first_request_ms since the worker started (see post_fork)
+    app.startup_clock = BOOT_STARTED
+    app.startup_metrics = {
+        'app_ready_ms': None,
+        'first_request_ms': None,
+        'first_request_pid': None
+    }
     
     # Security headers middleware
     @app.after_request
@@ -81,28 +112,137 @@ def create_app():
         response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
         return response
     
+    # Request phase timing (Server-Timing header, optional per-endpoint aggregates)
+    timing_enabled = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    app.phase_stats = PhaseStats() if os.getenv('PHASE_METRICS_ENABLED', 'true').lower() == 'true' else None
+    
+    @app.before_request
+    def begin_timing():
+        if timing_enabled:
+            g.request_started = time.perf_counter()
+            start_timing()
+    
+    @app.after_request
+    def add_server_timing(response):
+        if timing_enabled and 'request_started' in g:
+            total_ms = (time.perf_counter() - g.request_started) * 1000
+            spans = finish_timing()
+            response.headers['Server-Timing'] = server_timing_header(spans, total_ms)
+            response.headers['Timing-Allow-Origin'] = ', '.join(cors_origins)
+            if app.phase_stats is not None and request.url_rule is not None:
+                app.phase_stats.record(request.url_rule.rule, spans, total_ms)
+        return response
+    
+    # Negotiated gzip/brotli compression (runs before Server-Timing is added)
+    app.compressor = create_compressor()
+    
+    @app.after_request
+    def compress_response(response):
+        if app.compressor is not None:
+            with span('compress'):
+                app.compressor.compress(response, request.accept_encodings)
+        return response
+    
     # Request validation and logging
     @app.before_request
     def log_and_validate():
+        ensure_db(app)
+        
         # Skip logging for health checks
-        if request.path in ['/health', '/api/health']:
+        if request.path in HEALTH_PATHS:
             return
         
-        app.logger.info(f'{request.method} {request.path} from {request.remote_addr}')
+        request_logger.info('%s %s from %s', request.method, request.path, request.remote_addr)
         
         # Validate Content-Type for POST/PUT
         if request.method in ['POST', 'PUT']:
             if request.content_type and 'application/json' not in request.content_type:
                 return jsonify({'success': False, 'error': 'Content-Type must be application/json'}), 400
     
+    # CPU-heavy debt optimization runs in a bounded process pool
+    app.optimizer_pool = create_optimizer_pool()
+    
+    # Overload protection: shed expensive work first, then rate limit per IP/group
+    app.load_shedder = create_load_shedder()
+    app.rate_limiter = create_rate_limiter()
+    
+    @app.before_request
+    def protect_capacity():
+        if request.path in HEALTH_PATHS or request.method == 'OPTIONS':
+            return
+        
+        shedder = app.load_shedder
+        if shedder is not None:
+            shedder.enter()
+            g.in_flight_counted = True
+            if shedder.should_shed(request.path, app.db_pool.waiting):
+                app.logger.warning('Shedding %s %s (in flight: %s, pool waiting: %s)', request.method, request.path, shedder.in_flight, app.db_pool.waiting)
+                response = jsonify({'error': 'Service overloaded, please retry shortly'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(shedder.retry_after)
+                return response
+        
+        if app.rate_limiter is not None:
+            group_id = request.args.get('group_id')
+            if not group_id and request.method in ['POST', 'PUT']:
+                body = request.get_json(silent=True)
+                if isinstance(body, dict):
+                    group_id = body.get('group_id')
+            
+            allowed, retry_after = app.rate_limiter.check(request.remote_addr, group_id, request.path)
+            if not allowed:
+                app.logger.warning('Rate limit exceeded for %s on %s', request.remote_addr, request.path)
+                response = jsonify({'error': 'Too many requests'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+    
+    @app.teardown_request
+    def release_capacity(exc):
+        if g.pop('in_flight_counted', False):
+            app.load_shedder.leave()
+    
+    # Recorded once the first request has been served, so it covers its
+    # lazy connection and cold-cache cost
+    @app.teardown_request
+    def record_first_request(exc):
+        if app.startup_metrics['first_request_pid'] != os.getpid():
+            app.startup_metrics['first_request_pid'] = os.getpid()
+            app.startup_metrics['first_request_ms'] = round((time.perf_counter() - app.startup_clock) * 1000, 2)
+            app.logger.info('Time to first request: %sms (pid %s)', app.startup_metrics["first_request_ms"], os.getpid())
+    
+    # Causal tokens: successful writes hand one out; reads that send it back
+    # see those writes even when served by a secondary (READ_PREFERENCE)
+    @app.before_request
+    def read_causal_token():
+        value = request.headers.get(CAUSAL_TOKEN_HEADER)
+        if value:
+            try:
+                g.causal_token = decode_token(value)
+            except ValueError:
+                return jsonify({'error': 'Invalid causal token'}), 400
+    
+    @app.after_request
+    def add_causal_token(response):
+        if request.method in ['POST', 'PUT', 'DELETE'] and response.status_code < 400 and request.path.startswith('/api/'):
+            try:
+                token = app.repo.causal_token()
+            except Exception as e:
+                app.logger.warning('Causal token unavailable: %s', e)
+                token = None
+            if token:
+                response.headers[CAUSAL_TOKEN_HEADER] = token
+        return response
+    
     # Register blueprints
     try:
         from app.routes.friends import friends_bp
         from app.routes.expenses import expenses_bp
         from app.routes.settlements import settlements_bp
         from app.routes.debts import debts_bp
-        from app.routes.health import health_bp
+        from app.routes.health import health_bp, liveness
         from app.routes.groups import groups_bp
+        from app.routes.sync import sync_bp
         
         app.register_blueprint(friends_bp, url_prefix='/api')
         app.register_blueprint(expenses_bp, url_prefix='/api')
@@ -110,80 +250,50 @@ def create_app():
         app.register_blueprint(debts_bp, url_prefix='/api')
         app.register_blueprint(health_bp, url_prefix='/api')
         app.register_blueprint(groups_bp, url_prefix='/api')
+        app.register_blueprint(sync_bp, url_prefix='/api')
         
         app.logger.info('All blueprints registered successfully')
     except Exception as e:
-        app.logger.error(f'Failed to register blueprints: {e}')
+        app.logger.error('Failed to register blueprints: %s', e)
         raise
     
-    # Root endpoint
-    @app.route('/', methods=['GET', 'HEAD'])
-    def root():
-        """Root endpoint for backend status"""
-        try:
-            db_status = 'connected' if app.db is not None else 'disconnected'
-            return jsonify({
-                'status': 'ok',
-                'service': 'EasyXpense Backend',
-                'environment': os.getenv('FLASK_ENV', 'development'),
-                'database': db_status
-            }), 200
-        except Exception as e:
-            app.logger.error(f'Root endpoint error: {e}')
-            return jsonify({
-                'status': 'error',
-                'service': 'EasyXpense Backend',
-                'database': 'unknown'
-            }), 200
-    
-    # Health endpoint for monitoring
-    @app.route('/health', methods=['GET', 'HEAD'])
-    def health():
-        """Simple health check for Render monitoring"""
-        try:
-            db_status = 'connected' if app.db is not None else 'disconnected'
-            return jsonify({
-                'status': 'healthy',
-                'database': db_status
-            }), 200
-        except Exception as e:
-            app.logger.error(f'Health check error: {e}')
-            return jsonify({
-                'status': 'healthy',
-                'database': 'unknown'
-            }), 200
+    # Legacy probe paths: '/' and '/health' answer like /api/health/live
+    # (process up, no database access)
+    for path in LIVENESS_ALIASES:
+        app.add_url_rule(path, f'liveness_alias_{path}', liveness, methods=['GET', 'HEAD'])
     
     # Enhanced error handlers
     @app.errorhandler(400)
     def bad_request(error):
-        app.logger.warning(f'Bad request: {error}')
+        app.logger.warning('Bad request: %s', error)
         return jsonify({'error': 'Bad request', 'message': str(error)}), 400
     
     @app.errorhandler(404)
     def not_found(error):
         if request.path not in ['/', '/health']:
-            app.logger.warning(f'Endpoint not found: {request.url}')
+            app.logger.warning('Endpoint not found: %s', request.url)
         return jsonify({'error': 'Endpoint not found'}), 404
     
     @app.errorhandler(405)
     def method_not_allowed(error):
-        app.logger.warning(f'Method not allowed: {request.method} {request.url}')
+        app.logger.warning('Method not allowed: %s %s', request.method, request.url)
         return jsonify({'error': 'Method not allowed'}), 405
     
     @app.errorhandler(413)
     def request_entity_too_large(error):
-        app.logger.warning(f'Request too large from {request.remote_addr}')
+        app.logger.warning('Request too large from %s', request.remote_addr)
         return jsonify({'error': 'Request body too large (max 10MB)'}), 413
     
     @app.errorhandler(500)
     def internal_error(error):
-        app.logger.error(f'Internal server error: {error}')
+        app.logger.error('Internal server error: %s', error)
         return jsonify({'error': 'Internal server error'}), 500
     
     @app.errorhandler(503)
     def service_unavailable(error):
-        app.logger.error(f'Service unavailable: {error}')
+        app.logger.error('Service unavailable: %s', error)
         return jsonify({'error': 'Service temporarily unavailable'}), 503
     
-    app.logger.info('EasyXpense Backend initialized successfully')
+    app.startup_metrics['app_ready_ms'] = round((time.perf_counter() - BOOT_STARTED) * 1000, 2)
+    app.logger.info('EasyXpense Backend initialized successfully in %sms', app.startup_metrics["app_ready_ms"])
     return app
\ No newline at end of file
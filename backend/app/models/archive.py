@@ -0,0 +1,321 @@
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import logging
+from pymongo import ReplaceOne, DeleteOne
+from app.models.sync import SyncLog
+from app.models.member import MemberNames
+from app.utils.database import run_in_transaction
+from app.utils.ledger_schema import amount_paisa, expense_shares, settlement_parties, balance_projection
+
+logger = logging.getLogger(__name__)
+
+COPY_BATCH_SIZE = 1000
+# Re-copies of one document that keeps changing before compaction gives up
+RECOPY_ATTEMPTS = 3
+
+
+class CompactionConflict(Exception):
+    """Raised when documents change while their block is being archived"""
+
+
+class LedgerArchive:
+    """
+    Archival compaction of settled history.
+    When every balance in a group was zero at some time T, all expenses and
+    settlements up to T sum to zero per member; they move to the
+    expenses_archive / settlements_archive collections and are replaced by
+    one summary document in ledger_archives. Current balances then only
+    read the hot collections, whose remaining activity starts after T.
+    Historical readers (as_of queries, exports) use the archive for dates
+    up to `archived_until` and the hot collections after it.
+    """
+    _indexed = False
+
+    def __init__(self, db):
+        self.db = db
+        self.summaries = db.ledger_archives
+        self.hot = {'expense': db.expenses, 'settlement': db.settlements}
+        self.archive = {'expense': db.expenses_archive, 'settlement': db.settlements_archive}
+        if not LedgerArchive._indexed:
+            try:
+                self.summaries.create_index('group_id', unique=True)
+                for collection in self.archive.values():
+                    collection.create_index([('group_id', 1), ('date', 1)])
+                LedgerArchive._indexed = True
+            except Exception:
+                pass
+
+    def summary(self, group_id):
+        return self.summaries.find_one({'group_id': group_id})
+
+    def archived_until(self, group_id):
+        summary = self.summary(group_id)
+        return summary['archived_until'] if summary else None
+
+    def find(self, kind, group_id, date_filter=None, sort=None, archived_until=None, lookup=True, projection=None):
+        """
+        Iterate `kind` ('expense' or 'settlement') documents of a group across
+        archive and hot collections, split at archived_until. With `sort`
+        (1 or -1 on date) the combined sequence stays date-ordered.
+        """
+        if lookup and archived_until is None:
+            archived_until = self.archived_until(group_id)
+
+        hot_query = {'group_id': group_id}
+        if date_filter:
+            hot_query['date'] = dict(date_filter)
+        if archived_until is None:
+            cursor = self.hot[kind].find(hot_query, projection)
+            return cursor.sort('date', sort) if sort else cursor
+
+        archive_query = {'group_id': group_id, 'date': dict(date_filter or {})}
+        archive_query['date']['$lte'] = min(archive_query['date'].get('$lte', archived_until), archived_until)
+        hot_query['date'] = dict(date_filter or {})
+        hot_query['date']['$gt'] = max(hot_query['date'].get('$gt', archived_until), archived_until)
+
+        archive_cursor = self.archive[kind].find(archive_query, projection)
+        hot_cursor = self.hot[kind].find(hot_query, projection)
+        if not sort:
+            return itertools.chain(archive_cursor, hot_cursor)
+        archive_cursor = archive_cursor.sort('date', sort)
+        hot_cursor = hot_cursor.sort('date', sort)
+        return itertools.chain(archive_cursor, hot_cursor) if sort > 0 else itertools.chain(hot_cursor, archive_cursor)
+
+    def find_all(self, kind, query=None, projection=None, session=None):
+        """
+        Iterate `kind` documents matching `query` (group_id and/or date
+        filters) across archive and hot collections, each group split at
+        its own archived_until. Order is unspecified.
+        """
+        query = dict(query or {})
+        if isinstance(query.get('group_id'), str):
+            return self.find(kind, query['group_id'], date_filter=query.get('date'), projection=projection)
+
+        boundaries = {
+            summary['group_id']: summary['archived_until']
+            for summary in self.summaries.find({}, {'group_id': 1, 'archived_until': 1}, session=session)
+        }
+        if not boundaries:
+            return self.hot[kind].find(query, projection, session=session)
+        if projection is not None:
+            # The split needs each document's group and date
+            projection = dict(projection, group_id=1, date=1)
+
+        def split():
+            for doc in self.hot[kind].find(query, projection, session=session):
+                until = boundaries.get(doc.get('group_id'))
+                if until is None or doc['date'] > until:
+                    yield doc
+            for doc in self.archive[kind].find(query, projection, session=session):
+                until = boundaries.get(doc.get('group_id'))
+                if until is not None and doc['date'] <= until:
+                    yield doc
+        return split()
+
+    def _find_zero_point(self, group_id, cutoff, start, session=None):
+        """
+        Latest date <= cutoff at which every member balance was zero, with
+        counts and totals of the documents up to it. None if never settled.
+        """
+        query = self._block_query(group_id, start, cutoff)
+        member_names = MemberNames(self.db, session)
+        member_names.load([group_id])
+
+        def find(kind):
+            cursor = self.hot[kind].find(query, balance_projection(kind, 'date'), session=session).sort('date', 1)
+            return member_names.fill_each(kind, cursor)
+        expenses = find('expense')
+        settlements = find('settlement')
+        merged = heapq.merge(
+            (('expense', d) for d in expenses),
+            (('settlement', d) for d in settlements),
+            key=lambda item: item[1]['date']
+        )
+
+        balances = {}
+        nonzero = 0
+        counts = {'expense': 0, 'settlement': 0}
+        total_paisa = 0
+        last_date = None
+        zero_point = None
+
+        def add(person, delta):
+            nonlocal nonzero
+            before = balances.get(person, 0)
+            after = before + delta
+            balances[person] = after
+            nonzero += (after != 0) - (before != 0)
+
+        for kind, doc in merged:
+            # Only a boundary between distinct timestamps is a clean cut
+            if last_date is not None and doc['date'] > last_date and nonzero == 0:
+                zero_point = (last_date, dict(counts), total_paisa)
+            last_date = doc['date']
+            counts[kind] += 1
+            if kind == 'expense':
+                payer, shares = expense_shares(doc)
+                if not payer or not shares:
+                    continue
+                total_paisa += amount_paisa(doc)
+                add(payer, amount_paisa(doc))
+                for name, share_paisa in shares:
+                    add(name, -share_paisa)
+            else:
+                from_user, to_user, settled_paisa = settlement_parties(doc)
+                if from_user and to_user and settled_paisa > 0:
+                    add(from_user, settled_paisa)
+                    add(to_user, -settled_paisa)
+
+        if last_date is not None and nonzero == 0:
+            zero_point = (last_date, dict(counts), total_paisa)
+        return zero_point
+
+    def _block_query(self, group_id, start, until):
+        query = {'group_id': group_id, 'date': {'$lte': until}}
+        if start is not None:
+            query['date']['$gt'] = start
+        return query
+
+    def _copy(self, kind, query, session):
+        """Copy hot documents matching `query` to the archive; idempotent"""
+        batch = []
+        copied = 0
+        for doc in self.hot[kind].find(query, batch_size=COPY_BATCH_SIZE, session=session):
+            batch.append(doc)
+            if len(batch) >= COPY_BATCH_SIZE:
+                copied += self._upsert_batch(kind, batch, session)
+                batch = []
+        if batch:
+            copied += self._upsert_batch(kind, batch, session)
+        return copied
+
+    def _upsert_batch(self, kind, batch, session):
+        # Replaces copies left by an interrupted earlier run
+        self.archive[kind].bulk_write(
+            [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in batch],
+            ordered=False, session=session
+        )
+        return len(batch)
+
+    def _delete_hot(self, kind, query, session):
+        """
+        Delete hot documents whose archive copy is identical (the full copy
+        is the delete filter), so an edit made after the copy is never lost.
+        Returns the number of documents re-copied because they had changed.
+        """
+        batch = []
+        recopied = 0
+        for copy in self.archive[kind].find(query, batch_size=COPY_BATCH_SIZE, session=session):
+            batch.append(copy)
+            if len(batch) >= COPY_BATCH_SIZE:
+                recopied += self._delete_batch(kind, query, batch, session)
+                batch = []
+        if batch:
+            recopied += self._delete_batch(kind, query, batch, session)
+        return recopied
+
+    def _delete_batch(self, kind, query, batch, session):
+        if session is not None:
+            result = self.hot[kind].bulk_write([DeleteOne(copy) for copy in batch], ordered=False, session=session)
+            missed = len(batch) - result.deleted_count
+            # Only hot documents that were already gone may be missing (a
+            # concurrent write inside the snapshot aborts with a write conflict)
+            if missed and self.hot[kind].count_documents(
+                    {'_id': {'$in': [copy['_id'] for copy in batch]}}, session=session):
+                raise CompactionConflict(f'{missed} {kind}s changed while being archived')
+            return 0
+
+        # No transaction: one delete per document, so a miss can be told
+        # apart and the archive copy brought up to date
+        recopied = 0
+        for copy in batch:
+            for _ in range(RECOPY_ATTEMPTS):
+                if self.hot[kind].delete_one(copy).deleted_count:
+                    break
+                current = self.hot[kind].find_one(dict(query, _id=copy['_id']))
+                if current is None:
+                    # Deleted or moved out of the block since the copy: it
+                    # must not reappear from the archive
+                    self.archive[kind].delete_one({'_id': copy['_id']})
+                    recopied += 1
+                    break
+                # Edited after the copy: archive the current version instead
+                self.archive[kind].replace_one({'_id': copy['_id']}, current)
+                copy = current
+                recopied += 1
+            else:
+                raise CompactionConflict(f'{kind} {copy["_id"]} keeps changing while being archived')
+        return recopied
+
+    def _compact(self, group_id, cutoff, session):
+        previous = self.summaries.find_one({'group_id': group_id}, session=session)
+        start = previous['archived_until'] if previous else None
+
+        zero_point = self._find_zero_point(group_id, cutoff, start, session)
+        if zero_point is None:
+            return None
+        until, counts, total_paisa = zero_point
+        query = self._block_query(group_id, start, until)
+
+        copied = {kind: self._copy(kind, query, session) for kind in self.hot}
+
+        # Commit point: readers switch to archive for dates <= until
+        previous_counts = previous or {}
+        summary = {
+            'group_id': group_id,
+            'archived_until': until,
+            'expense_count': previous_counts.get('expense_count', 0) + counts['expense'],
+            'settlement_count': previous_counts.get('settlement_count', 0) + counts['settlement'],
+            'total_paisa': previous_counts.get('total_paisa', 0) + total_paisa,
+            # All balances are zero at archived_until, so the summary adds
+            # nothing to current balances; kept explicit for readers
+            'balances': [],
+            'compacted_at': datetime.utcnow()
+        }
+        self.summaries.replace_one({'group_id': group_id}, summary, upsert=True, session=session)
+
+        recopied = sum(self._delete_hot(kind, query, session) for kind in self.hot)
+        if recopied:
+            logger.warning('Group %s: %s documents were edited during archival and re-copied; '
+                           'run compaction on a replica set to make it atomic', group_id, recopied)
+        return summary, copied
+
+    def compact(self, group_id, min_age_days=30):
+        """
+        Archive the group's history up to its latest all-zero point older
+        than min_age_days. Returns the summary document, or None if there
+        was nothing to archive or a concurrent edit got in the way.
+
+        On a replica set the scan, copy, summary and delete are one
+        transaction. Without transactions, documents edited after they were
+        copied are copied again before their hot version is deleted.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=min_age_days)
+        try:
+            result = run_in_transaction(self.db, lambda session: self._compact(group_id, cutoff, session))
+        except CompactionConflict as e:
+            logger.warning('Skipped archiving group %s: %s', group_id, e)
+            return None
+        if result is None:
+            return None
+        summary, copied = result
+
+        # Hot listings changed; invalidate their ETags
+        SyncLog(self.db).touch(group_id)
+        logger.info('Archived group %s up to %s: %s expenses, %s settlements',
+                    group_id, summary['archived_until'].isoformat(), copied['expense'], copied['settlement'])
+        return summary
+
+    def compact_all(self, min_age_days=30):
+        """Compact every group that has hot expenses; returns {group_id: summary}"""
+        results = {}
+        for group_id in self.hot['expense'].distinct('group_id'):
+            if group_id:
+                results[group_id] = self.compact(group_id, min_age_days)
+        return results
+
+    def delete_group(self, group_id):
+        self.summaries.delete_one({'group_id': group_id})
+        for collection in self.archive.values():
+            collection.delete_many({'group_id': group_id})
@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta
+from bisect import bisect_right
+import os
+import logging
+from app.utils.debt_optimizer import calculate_net_balances
+from app.models.archive import LedgerArchive
+from app.models.member import MemberNames
+from app.models.sync import SyncLog
+from app.utils.ledger_schema import balance_projection
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints are aligned to fixed periods counted from this epoch
+CHECKPOINT_EPOCH = datetime(2024, 1, 1)
+
+# Never checkpoint the most recent window, where inserts may still land
+CHECKPOINT_SAFETY_MARGIN = timedelta(hours=1)
+
+
+class BalanceCheckpoint:
+    """
+    Periodic per-group balance snapshots.
+    Each document stores the net balance vector of a group at a period
+    boundary (`as_of`), so point-in-time queries replay only the activity
+    after the nearest earlier checkpoint.
+    Checkpoints are written only by build_checkpoints.py. Expense edits and
+    deletes drop those at or after the expense's date in their transaction
+    (settlements are never edited or deleted); reads fall back to the
+    nearest remaining one.
+    """
+    _indexed = False
+
+    def __init__(self, db, interval_days=None):
+        self.db = db
+        self.collection = db.balance_checkpoints
+        # Historical replays may reach into archived history
+        self.ledger = LedgerArchive(db)
+        self.member_names = MemberNames(db)
+        if interval_days is None:
+            interval_days = int(os.getenv('CHECKPOINT_INTERVAL_DAYS', '7'))
+        self.interval = timedelta(days=interval_days)
+        if not BalanceCheckpoint._indexed:
+            try:
+                self.collection.create_index([('group_id', 1), ('as_of', -1)], unique=True)
+                BalanceCheckpoint._indexed = True
+            except Exception:
+                pass
+
+    def _boundary_at_or_before(self, when):
+        """Latest period boundary <= when"""
+        periods = (when - CHECKPOINT_EPOCH) // self.interval
+        return CHECKPOINT_EPOCH + periods * self.interval
+
+    def _load(self, group_id, after, until, sort=None):
+        """(expenses, settlements) of the group with after < date <= until"""
+        date_filter = {'$lte': until}
+        if after is not None:
+            date_filter['$gt'] = after
+        archived_until = self.ledger.archived_until(group_id)
+
+        def load(kind):
+            documents = self.ledger.find(kind, group_id, date_filter, sort=sort,
+                                         archived_until=archived_until, lookup=False,
+                                         projection=balance_projection(kind, 'date'))
+            return self.member_names.fill(kind, documents)
+        return load('expense'), load('settlement')
+
+    @staticmethod
+    def _decode(checkpoint):
+        # Names may contain '.' or '$', so balances are stored as pairs
+        return {entry['name']: entry['paisa'] for entry in checkpoint['balances']}
+
+    def _save(self, group_id, as_of, balances):
+        self.collection.update_one(
+            {'group_id': group_id, 'as_of': as_of},
+            {'$set': {
+                'balances': [{'name': name, 'paisa': paisa} for name, paisa in balances.items()],
+                'created_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    def get_nearest(self, group_id, as_of):
+        """Latest checkpoint at or before as_of, or None"""
+        return self.collection.find_one(
+            {'group_id': group_id, 'as_of': {'$lte': as_of}},
+            sort=[('as_of', -1)]
+        )
+
+    def ensure_checkpoints(self, group_id, until=None):
+        """
+        Materialize checkpoints for every period boundary up to `until`
+        (default now) that saw activity since the latest stored checkpoint.
+        Returns how many were created, or None if the group was written to
+        meanwhile: the new checkpoints may have missed that write, so they
+        are dropped again (run it again later).
+        """
+        latest_safe = datetime.utcnow() - CHECKPOINT_SAFETY_MARGIN
+        target = self._boundary_at_or_before(min(until, latest_safe) if until is not None else latest_safe)
+        latest = self.collection.find_one({'group_id': group_id}, sort=[('as_of', -1)])
+        if latest is not None and latest['as_of'] >= target:
+            return 0
+
+        # Every write to the group reserves a seq before it lands and drops
+        # later checkpoints after it, so comparing the marker once the
+        # checkpoints are saved catches any write that overlapped the build
+        sync_log = SyncLog(self.db)
+        marker = sync_log.marker(group_id)
+
+        start = latest['as_of'] if latest is not None else None
+        balances = self._decode(latest) if latest is not None else {}
+
+        expenses, settlements = self._load(group_id, start, target, sort=1)
+        if not expenses and not settlements:
+            if latest is None:
+                return 0
+            self._save(group_id, target, balances)
+            return self._check_unchanged(sync_log, group_id, marker, target, 1)
+
+        expense_dates = [e['date'] for e in expenses]
+        settlement_dates = [s['date'] for s in settlements]
+        first_date = min(expense_dates[:1] + settlement_dates[:1])
+
+        # Walk period by period, folding each slice into the running vector
+        boundary = self._boundary_at_or_before(first_date)
+        if boundary < first_date:
+            boundary += self.interval
+        first_boundary = boundary
+        e_pos = s_pos = 0
+        created = 0
+        while boundary <= target:
+            e_end = bisect_right(expense_dates, boundary, lo=e_pos)
+            s_end = bisect_right(settlement_dates, boundary, lo=s_pos)
+            if e_end > e_pos or s_end > s_pos:
+                balances = calculate_net_balances(expenses[e_pos:e_end], settlements[s_pos:s_end], balances)
+                self._save(group_id, boundary, balances)
+                created += 1
+                e_pos, s_pos = e_end, s_end
+                if e_pos == len(expenses) and s_pos == len(settlements):
+                    break
+            boundary += self.interval
+
+        created = self._check_unchanged(sync_log, group_id, marker, first_boundary, created)
+        if created is not None:
+            logger.info('Created %s balance checkpoints for group %s', created, group_id)
+        return created
+
+    def ensure_all(self):
+        """Build checkpoints for every group with expenses; returns {group_id: created}"""
+        group_ids = set(self.ledger.hot['expense'].distinct('group_id'))
+        group_ids.update(self.ledger.archive['expense'].distinct('group_id'))
+        return {group_id: self.ensure_checkpoints(group_id) for group_id in sorted(group_ids) if group_id}
+
+    def _check_unchanged(self, sync_log, group_id, marker, since, created):
+        if sync_log.marker(group_id) == marker:
+            return created
+        self.invalidate(group_id, since)
+        logger.warning('Group %s changed while its checkpoints were built; dropped them', group_id)
+        return None
+
+    def balances_as_of(self, group_id, as_of):
+        """
+        Net balances at `as_of` from the nearest earlier checkpoint plus the
+        delta after it. Returns (balances, checkpoint_as_of or None).
+        Read-only: missing checkpoints mean a longer replay, not a write.
+        """
+        checkpoint = self.get_nearest(group_id, as_of)
+
+        start = checkpoint['as_of'] if checkpoint is not None else None
+        initial = self._decode(checkpoint) if checkpoint is not None else None
+
+        expenses, settlements = self._load(group_id, start, as_of)
+        return calculate_net_balances(expenses, settlements, initial), start
+
+    def invalidate(self, group_id, since=None, session=None):
+        """Drop checkpoints that include history changed at or after `since`"""
+        query = {'group_id': group_id}
+        if since is not None:
+            query['as_of'] = {'$gte': since}
+        self.collection.delete_many(query, session=session)
@@ -1,100 +1,240 @@
 from bson import ObjectId
 from datetime import datetime
 from app.utils.money import rupees_to_paisa, paisa_to_rupees, split_equally, validate_amount_paisa
+from app.models.member import MemberTable, MemberNames
+from app.models.sync import SyncLog, UNGROUPED
+from app.models.checkpoint import BalanceCheckpoint
+from app.utils.ledger_schema import to_version, write_version, expense_to_v1
+from app.utils.database import run_in_transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExpenseConflict(Exception):
+    """Raised when an expense cannot be changed (archived or edited concurrently)"""
+
+
+def _validate_amount(amount):
+    """Validate and convert amount to paisa (integer)"""
+    try:
+        # Convert to paisa
+        amount_paisa = rupees_to_paisa(amount)
+        # Validate range
+        validate_amount_paisa(amount_paisa)
+        return amount_paisa
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid amount: {amount}")
+
+
+def _validate_participants(participants, payer):
+    """Validate participants list"""
+    if not participants or len(participants) == 0:
+        raise ValueError("At least one participant is required")
+    
+    if len(participants) > 50:
+        raise ValueError("Too many participants (max 50)")
+    
+    # Ensure payer is in participants
+    if payer not in participants:
+        participants.append(payer)
+    
+    return list(set(participants))  # Remove duplicates
+
+
+def expense_fields(description, amount, payer, participants):
+    """
+    Validated storage-independent expense fields (v1 shape, no group,
+    member IDs or date); shared by every storage backend.
+    """
+    # Validate and convert amount to paisa
+    amount_paisa = _validate_amount(amount)
+    
+    # Validate participants
+    validated_participants = _validate_participants(participants, payer)
+    
+    # Calculate shares in paisa
+    shares_paisa = split_equally(amount_paisa, len(validated_participants))
+    
+    # Create participant shares
+    participant_shares = []
+    for i, participant in enumerate(validated_participants):
+        participant_shares.append({
+            'name': participant,
+            'share_paisa': shares_paisa[i]
+        })
+    
+    return {
+        'description': description.strip(),
+        'amount_paisa': amount_paisa,  # Store as integer paisa
+        'amount': paisa_to_rupees(amount_paisa),  # Also store rupees for backward compatibility
+        'payer': payer.strip(),
+        'participants': validated_participants,
+        'participant_shares': participant_shares,  # Exact shares in paisa
+        'currency': 'INR'
+    }
+
 
 class Expense:
+    _indexed = False
+
     def __init__(self, db):
+        self.db = db
         self.collection = db.expenses
-        try:
-            self.collection.create_index("date")
-            self.collection.create_index("payer")
-            self.collection.create_index("participants")
-        except Exception:
-            pass
+        if not Expense._indexed:
+            try:
+                self.collection.create_index("date")
+                self.collection.create_index("payer")
+                self.collection.create_index("participants")
+                self.collection.create_index("n")
+                self.collection.create_index([('group_id', 1), ('date', 1)])
+                Expense._indexed = True
+            except Exception:
+                pass
     
-    def _validate_amount(self, amount):
-        """Validate and convert amount to paisa (integer)"""
-        try:
-            # Convert to paisa
-            amount_paisa = rupees_to_paisa(amount)
-            # Validate range
-            validate_amount_paisa(amount_paisa)
-            return amount_paisa
-        except (ValueError, TypeError) as e:
-            raise ValueError(f"Invalid amount: {amount}")
-    
-    def _validate_participants(self, participants, payer):
-        """Validate participants list"""
-        if not participants or len(participants) == 0:
-            raise ValueError("At least one participant is required")
-        
-        if len(participants) > 50:
-            raise ValueError("Too many participants (max 50)")
+    def _build_expense(self, description, amount, payer, participants, group_id=None):
+        """Validated v1-shaped expense document (without date or seq)"""
+        expense_data = expense_fields(description, amount, payer, participants)
+        validated_participants = expense_data['participants']
+        shares_paisa = [share['share_paisa'] for share in expense_data['participant_shares']]
         
-        # Ensure payer is in participants
-        if payer not in participants:
-            participants.append(payer)
+        # Add group_id if provided
+        if group_id:
+            expense_data['group_id'] = group_id
+            
+            # Integer member IDs with shares as parallel arrays for the debt engine
+            member_ids = MemberTable(self.db).get_ids(group_id, [expense_data['payer']] + validated_participants)
+            expense_data['payer_id'] = member_ids[expense_data['payer']]
+            expense_data['member_ids'] = [member_ids[p] for p in validated_participants]
+            expense_data['shares'] = shares_paisa
         
-        return list(set(participants))  # Remove duplicates
+        return expense_data
     
     def create_expense(self, description, amount, payer, participants, group_id=None):
         """Create expense with integer paisa storage"""
-        import logging
-        logger = logging.getLogger(__name__)
+        expense_data = self._build_expense(description, amount, payer, participants, group_id)
+        expense_data['date'] = datetime.utcnow()
         
-        logger.info(f'Creating expense: {description}, amount: {amount}, payer: {payer}')
+        def insert(session):
+            # The seq commits together with the expense (see SyncLog)
+            if group_id:
+                SyncLog(self.db).stamp(group_id, [expense_data], session)
+            # v1 until LEDGER_SCHEMA_VERSION=2 is set after the rollout
+            document = to_version('expense', expense_data, write_version())
+            return self.collection.insert_one(document, session=session).inserted_id
         
-        # Validate and convert amount to paisa
-        amount_paisa = self._validate_amount(amount)
-        logger.info(f'Amount in paisa: {amount_paisa}')
+        try:
+            inserted_id = run_in_transaction(self.db, insert)
+            logger.debug('Expense %s created: %s paisa paid by %s, %s participants',
+                         inserted_id, expense_data['amount_paisa'], expense_data['payer'],
+                         len(expense_data['participants']))
+            return inserted_id
+        except Exception as e:
+            logger.error('MongoDB insert failed: %s', e)
+            raise
+    
+    def _find_current(self, expense_id):
+        """Hot expense by ID, or None; archived history is read-only"""
+        if not ObjectId.is_valid(expense_id):
+            return None
+        expense = self.collection.find_one({'_id': ObjectId(expense_id)})
+        if expense is None:
+            if self.db.expenses_archive.find_one({'_id': ObjectId(expense_id)}, {'_id': 1}):
+                raise ExpenseConflict('Archived expenses cannot be changed')
+            return None
+        return MemberNames(self.db).fill('expense', [expense])[0]
+    
+    def _write_invalidating(self, old, write):
+        """
+        Run write(session) and drop the group's balance checkpoints from
+        old's date on, atomically where the server supports transactions.
+        `write` raises ExpenseConflict if the expense changed meanwhile.
+        """
+        def apply(session=None):
+            result = write(session)
+            group_id = old.get('group_id')
+            if group_id:
+                BalanceCheckpoint(self.db).invalidate(group_id, old['date'], session)
+            return result
         
-        # Validate participants
-        validated_participants = self._validate_participants(participants, payer)
-        logger.info(f'Validated participants: {validated_participants}')
+        return run_in_transaction(self.db, apply)
+    
+    def update_expense(self, expense_id, description, amount, payer, participants, group_id=None):
+        """
+        Replace an expense's description, amount, payer and participants,
+        keeping its ID, group and date. Balance checkpoints from its date on
+        are dropped in the same transaction.
+        Returns the updated v1 document, or None if there is no such expense.
+        """
+        old = self._find_current(expense_id)
+        if old is None:
+            return None
         
-        # Calculate shares in paisa
-        shares_paisa = split_equally(amount_paisa, len(validated_participants))
+        if group_id and group_id != old.get('group_id'):
+            raise ValueError('Expenses cannot move between groups')
+        group_id = old.get('group_id')
+        expense_data = self._build_expense(description, amount, payer, participants, group_id)
+        expense_data['date'] = old['date']
         
-        # Create participant shares
-        participant_shares = []
-        for i, participant in enumerate(validated_participants):
-            participant_shares.append({
-                'name': participant,
-                'share_paisa': shares_paisa[i]
-            })
+        def replace(session):
+            if group_id:
+                SyncLog(self.db).stamp(group_id, [expense_data], session)
+            else:
+                expense_data['changed_at'] = datetime.utcnow()
+            document = to_version('expense', expense_data, write_version())
+            # Only the version we read: a concurrent edit or delete wins
+            result = self.collection.replace_one(
+                {'_id': old['_id'], 'seq': old.get('seq'), 'changed_at': old.get('changed_at')},
+                document,
+                session=session
+            )
+            if result.matched_count == 0:
+                raise ExpenseConflict('Expense was changed concurrently, please retry')
+            return expense_data
         
-        expense_data = {
-            'description': description.strip(),
-            'amount_paisa': amount_paisa,  # Store as integer paisa
-            'amount': paisa_to_rupees(amount_paisa),  # Also store rupees for backward compatibility
-            'payer': payer.strip(),
-            'participants': validated_participants,
-            'participant_shares': participant_shares,  # Exact shares in paisa
-            'date': datetime.utcnow(),
-            'currency': 'INR'
-        }
+        self._write_invalidating(old, replace)
+        if not group_id:
+            # After the write, so a listing cached under the new marker is current
+            SyncLog(self.db).touch(UNGROUPED)
+        logger.debug('Expense %s updated', expense_id)
+        return dict(expense_data, _id=old['_id'])
+    
+    def delete_expense(self, expense_id):
+        """Delete an expense and drop the balance checkpoints from its date on"""
+        old = self._find_current(expense_id)
+        if old is None:
+            return False
         
-        # Add group_id if provided
-        if group_id:
-            expense_data['group_id'] = group_id
+        group_id = old.get('group_id')
         
-        logger.info(f'Inserting expense with amount_paisa: {amount_paisa}')
+        def delete(session):
+            result = self.collection.delete_one(
+                {'_id': old['_id'], 'seq': old.get('seq'), 'changed_at': old.get('changed_at')},
+                session=session
+            )
+            if result.deleted_count == 0:
+                raise ExpenseConflict('Expense was changed concurrently, please retry')
+            if group_id:
+                SyncLog(self.db).record_deletions(group_id, 'expense', [old['_id']], session)
+            return None
         
-        try:
-            result = self.collection.insert_one(expense_data)
-            logger.info(f'Expense created with ID: {result.inserted_id}')
-            return result.inserted_id
-        except Exception as e:
-            logger.error(f'MongoDB insert failed: {e}')
-            raise
+        self._write_invalidating(old, delete)
+        if not group_id:
+            SyncLog(self.db).touch(UNGROUPED)
+        logger.debug('Expense %s deleted', expense_id)
+        return True
     
-    def get_all_expenses(self, group_id=None):
-        """Get all expenses sorted by date (newest first)"""
+    def get_all_expenses(self, group_id=None, session=None):
+        """Get all expenses sorted by date (newest first), in the v1 shape"""
         query = {'group_id': group_id} if group_id else {}
-        return list(self.collection.find(query).sort('date', -1))
+        expenses = self.collection.find(query, session=session).sort('date', -1)
+        return [expense_to_v1(doc) for doc in MemberNames(self.db, session).fill('expense', expenses)]
     
     def get_expenses_by_participant(self, participant_name):
         """Get expenses where a specific person participated"""
-        return list(self.collection.find({
-            'participants': participant_name
-        }).sort('date', -1))
\ No newline at end of file
+        # Grouped v2 expenses list participants by member ID only
+        clauses = [{'participants': participant_name}, {'n': participant_name}]
+        for member in self.db.members.find({'name': participant_name}, {'group_id': 1, 'member_id': 1}):
+            clauses.append({'group_id': member['group_id'], 'mi': member['member_id']})
+        expenses = self.collection.find({'$or': clauses}).sort('date', -1)
+        return [expense_to_v1(doc) for doc in MemberNames(self.db).fill('expense', expenses)]
\ No newline at end of file
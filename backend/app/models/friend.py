@@ -0,0 +1,149 @@
+import logging
+from bson import ObjectId
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from app.models.sync import SyncLog
+from app.utils.database import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+# Bulk inserts retried after a concurrent insert aborts their transaction
+INSERT_ATTEMPTS = 3
+
+
+class Friend:
+    # Index creation is a server round trip; do it once per process
+    _indexed = False
+    # Why the last index build failed (e.g. duplicate rows block the unique
+    # index). Requests do not retry it; the health probe's bootstrap does
+    index_error = None
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.friends
+        if not Friend._indexed and Friend.index_error is None:
+            Friend.create_indexes(db)
+
+    @staticmethod
+    def create_indexes(db):
+        """Build the friend indexes; False (with index_error set) on failure"""
+        try:
+            db.friends.create_index([('group_id', 1), ('email', 1)], unique=True)
+            db.friends.create_index([('group_id', 1), ('name', 1)])
+        except Exception as e:
+            Friend.index_error = str(e)
+            logger.error('Friend index build failed; duplicate-email protection is off: %s', e)
+            return False
+        Friend._indexed = True
+        Friend.index_error = None
+        return True
+
+    def _friend_data(self, name, email, group_id):
+        data = {
+            'name': name,
+            'email': email,
+            'created_at': datetime.utcnow()
+        }
+        if group_id:
+            data['group_id'] = group_id
+        return data
+
+    def add_friend(self, name, email, group_id=None):
+        """
+        Insert a friend with one upsert (grouped friends reserve their sync
+        seq first). Returns the new _id, or None if the (group_id, email) pair exists.
+        """
+        # Ungrouped friends have no group_id field at all
+        key = {'email': email, 'group_id': group_id if group_id else {'$exists': False}}
+        data = {'name': name, 'created_at': datetime.utcnow()}
+
+        def upsert(session):
+            if group_id:
+                # Reserved in the upsert's transaction, so the friend never
+                # exists without its seq; a duplicate leaves an unused seq,
+                # which sync skips over
+                SyncLog(self.db).stamp(group_id, [data], session)
+            return self.collection.update_one(key, {'$setOnInsert': data}, upsert=True, session=session)
+
+        try:
+            result = run_in_transaction(self.db, upsert)
+        except DuplicateKeyError:
+            # Lost a race with a concurrent insert of the same member
+            return None
+        return result.upserted_id
+
+    def add_friends(self, friends, group_id=None):
+        """
+        Insert many friends with a single unordered insert_many.
+        Returns (inserted, duplicates): inserted is a list of (index, _id),
+        duplicates a list of indexes into `friends`.
+        """
+        documents = []
+        positions = []
+        duplicates = []
+        seen = set()
+        for index, friend in enumerate(friends):
+            if friend['email'] in seen:
+                duplicates.append(index)
+                continue
+            seen.add(friend['email'])
+            document = self._friend_data(friend['name'], friend['email'], group_id)
+            document['_id'] = ObjectId()
+            documents.append(document)
+            positions.append(index)
+
+        if not documents:
+            return [], duplicates
+
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                failed = run_in_transaction(self.db, lambda session: self._insert_new(documents, group_id, session))
+                break
+            except BulkWriteError as e:
+                # A concurrent insert aborted the transaction; the next
+                # attempt's existence check finds it
+                codes = {error.get('code') for error in e.details.get('writeErrors', [])}
+                if codes != {DUPLICATE_KEY} or attempt == INSERT_ATTEMPTS - 1:
+                    raise
+
+        inserted = []
+        for doc_index, document in enumerate(documents):
+            if doc_index in failed:
+                duplicates.append(positions[doc_index])
+            else:
+                inserted.append((positions[doc_index], document['_id']))
+        duplicates.sort()
+        return inserted, duplicates
+
+    def _insert_new(self, documents, group_id, session):
+        """
+        Insert the documents whose email is not yet in the group, stamped in
+        the same transaction. Returns indexes of the ones that already exist.
+        """
+        scope = group_id if group_id else {'$exists': False}
+        emails = [document['email'] for document in documents]
+        existing = {
+            friend['email']
+            for friend in self.collection.find({'group_id': scope, 'email': {'$in': emails}}, {'email': 1}, session=session)
+        }
+        failed = {index for index, document in enumerate(documents) if document['email'] in existing}
+        new_indexes = [index for index in range(len(documents)) if index not in failed]
+        new = [documents[index] for index in new_indexes]
+        if not new:
+            return failed
+        if group_id:
+            SyncLog(self.db).stamp(group_id, new, session)
+
+        try:
+            self.collection.insert_many(new, ordered=False, session=session)
+        except BulkWriteError as e:
+            if session is not None:
+                # Inside a transaction the whole insert is rolled back
+                raise
+            # No transaction: the other rows went in; report the raced ones
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') != DUPLICATE_KEY:
+                    raise
+                failed.add(new_indexes[error['index']])
+        return failed
@@ -2,29 +2,43 @@ from bson import ObjectId
 from datetime import datetime
 import secrets
 
+
+def validate_group_name(name):
+    if not name or len(name.strip()) == 0:
+        raise ValueError("Group name is required")
+    
+    if len(name) > 50:
+        raise ValueError("Group name too long (max 50 characters)")
+
+
+def new_group_code():
+    """Random 6-character group code (callers check uniqueness)"""
+    return secrets.token_hex(3).upper()
+
+
 class Group:
+    _indexed = False
+
     def __init__(self, db):
         self.collection = db.groups
-        try:
-            self.collection.create_index("group_code", unique=True)
-            self.collection.create_index("created_at")
-        except Exception:
-            pass
+        if not Group._indexed:
+            try:
+                self.collection.create_index("group_code", unique=True)
+                self.collection.create_index("created_at")
+                Group._indexed = True
+            except Exception:
+                pass
     
     def _generate_group_code(self):
         """Generate unique 6-character group code"""
         while True:
-            code = secrets.token_hex(3).upper()  # 6 chars
+            code = new_group_code()
             if not self.collection.find_one({'group_code': code}):
                 return code
     
     def create_group(self, name):
         """Create new group"""
-        if not name or len(name.strip()) == 0:
-            raise ValueError("Group name is required")
-        
-        if len(name) > 50:
-            raise ValueError("Group name too long (max 50 characters)")
+        validate_group_name(name)
         
         group_code = self._generate_group_code()
         
@@ -45,9 +59,9 @@ class Group:
         """Get group by ID"""
         return self.collection.find_one({'_id': ObjectId(group_id)})
     
-    def get_all_groups(self):
+    def get_all_groups(self, session=None):
         """Get all groups"""
-        return list(self.collection.find({}).sort('created_at', -1))
+        return list(self.collection.find({}, session=session).sort('created_at', -1))
     
     def delete_group(self, group_id):
         """Delete group"""
@@ -0,0 +1,40 @@
+"""
+Index bootstrap.
+Models create their indexes the first time they are constructed in a
+process; bootstrap_indexes() does that up front from the health probe so
+the first requests after a deploy do not pay for it, and so readiness can
+report whether it finished.
+"""
+import time
+from app.models.expense import Expense
+from app.models.group import Group
+from app.models.settlement import Settlement
+from app.models.friend import Friend
+from app.models.member import MemberTable
+from app.models.sync import SyncLog
+from app.models.archive import LedgerArchive
+from app.models.checkpoint import BalanceCheckpoint
+
+MODELS = (Expense, Settlement, Group, Friend, MemberTable, SyncLog, LedgerArchive, BalanceCheckpoint)
+
+
+def bootstrap_indexes(db):
+    """
+    Create every model's indexes.
+    Returns {'state', 'duration_ms', 'pending', 'errors'}; models whose index
+    creation failed stay in `pending` and retry on their next construction,
+    except Friend, which only retries here (see Friend.index_error).
+    """
+    start = time.perf_counter()
+    if not Friend._indexed:
+        Friend.create_indexes(db)
+    for model in MODELS:
+        model(db)
+    pending = [model.__name__ for model in MODELS if not model._indexed]
+    errors = {model.__name__: model.index_error for model in MODELS if getattr(model, 'index_error', None)}
+    return {
+        'state': 'failed' if pending else 'ready',
+        'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        'pending': pending,
+        'errors': errors
+    }
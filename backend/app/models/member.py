@@ -0,0 +1,135 @@
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from app.utils.ledger_schema import unnamed_member_ids, add_member_names
+
+DUPLICATE_KEY = 11000
+
+
+class MemberTable:
+    """
+    Per-group member table mapping names to small integer IDs.
+    IDs are dense per group (0, 1, 2, ...) so balances can live in compact
+    integer arrays indexed by member ID.
+    """
+    _indexed = False
+
+    def __init__(self, db):
+        self.collection = db.members
+        self.counters = db.member_counters
+        if not MemberTable._indexed:
+            try:
+                self.collection.create_index([('group_id', 1), ('name', 1)], unique=True)
+                self.collection.create_index([('group_id', 1), ('member_id', 1)], unique=True)
+                MemberTable._indexed = True
+            except Exception:
+                pass
+
+    def get_ids(self, group_id, names):
+        """Return {name: member_id}, assigning IDs to names seen for the first time"""
+        names = list(dict.fromkeys(names))
+        ids = {
+            doc['name']: doc['member_id']
+            for doc in self.collection.find({'group_id': group_id, 'name': {'$in': names}})
+        }
+        missing = [name for name in names if name not in ids]
+        if not missing:
+            return ids
+
+        # Reserve a contiguous block of IDs with one counter increment
+        counter = self.counters.find_one_and_update(
+            {'_id': group_id},
+            {'$inc': {'seq': len(missing)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first_id = counter['seq'] - len(missing)
+        documents = [
+            {'group_id': group_id, 'name': name, 'member_id': first_id + offset}
+            for offset, name in enumerate(missing)
+        ]
+
+        raced = []
+        try:
+            self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') != DUPLICATE_KEY:
+                    raise
+                raced.append(documents[error['index']]['name'])
+
+        for document in documents:
+            ids[document['name']] = document['member_id']
+
+        # Another request registered these names first; use its IDs
+        if raced:
+            for doc in self.collection.find({'group_id': group_id, 'name': {'$in': raced}}):
+                ids[doc['name']] = doc['member_id']
+        return ids
+
+    def names_for_groups(self, group_ids, session=None):
+        """{group_id: names indexed by member ID} with one query (every group for None)"""
+        result = {}
+        query = {} if group_ids is None else {'group_id': {'$in': list(group_ids)}}
+        for doc in self.collection.find(query, {'_id': 0}, session=session):
+            names = result.setdefault(doc['group_id'], [])
+            member_id = doc['member_id']
+            if member_id >= len(names):
+                names.extend([None] * (member_id + 1 - len(names)))
+            names[member_id] = doc['name']
+        return result
+
+    def delete_group(self, group_id):
+        self.collection.delete_many({'group_id': group_id})
+        self.counters.delete_one({'_id': group_id})
+
+
+class MemberNames:
+    """
+    Fills names back into grouped v2 documents, which store member IDs only.
+    Member IDs never change meaning within a group, so tables are cached for
+    the resolver's lifetime; a group is fetched again only when a document
+    carries an ID assigned after the cached copy was read.
+    """
+
+    def __init__(self, db, session=None):
+        self.table = MemberTable(db)
+        self.session = session
+        self._names = {}
+        self._loaded_all = False
+
+    def load(self, group_ids=None):
+        """Fetch member tables of `group_ids` (every group for None) in one query"""
+        if group_ids is None:
+            if self._loaded_all:
+                return
+            fetched = self.table.names_for_groups(None, self.session)
+            self._names.update(fetched)
+            self._loaded_all = True
+            return
+        missing = [group_id for group_id in set(group_ids) if group_id not in self._names]
+        if missing:
+            fetched = self.table.names_for_groups(missing, self.session)
+            for group_id in missing:
+                self._names[group_id] = fetched.get(group_id, [])
+
+    def _names_for(self, group_id, member_ids):
+        names = self._names.get(group_id)
+        if names is None and self._loaded_all:
+            names = []
+        if names is None or any(i >= len(names) or names[i] is None for i in member_ids):
+            names = self._names[group_id] = self.table.names_for_groups([group_id], self.session).get(group_id, [])
+        return names
+
+    def fill_each(self, kind, docs):
+        """Yield `docs` with names filled in; call load() first to batch the lookups"""
+        for doc in docs:
+            member_ids = unnamed_member_ids(kind, doc)
+            if member_ids is not None:
+                add_member_names(kind, doc, self._names_for(doc['group_id'], member_ids))
+            yield doc
+
+    def fill(self, kind, docs):
+        """`docs` as a list with names filled in, one lookup for all their groups"""
+        docs = list(docs)
+        self.load(doc['group_id'] for doc in docs if unnamed_member_ids(kind, doc) is not None)
+        return list(self.fill_each(kind, docs))
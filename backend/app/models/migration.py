@@ -0,0 +1,122 @@
+from datetime import datetime
+import time
+import logging
+from pymongo import UpdateOne
+from app.utils.ledger_schema import SCHEMA_VERSION, to_version
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = 'ledger_v2'
+# Re-reads of a batch whose documents changed between read and replace
+CONFLICT_RETRIES = 3
+
+
+class LedgerMigration:
+    """
+    Online, resumable migration of expenses and settlements (hot and
+    archived) to the compact v2 schema.
+    Documents are converted in _id order, one batch per bulk write. The
+    last converted _id of each collection is saved after every batch, so
+    an interrupted run resumes where it stopped. Each update only matches
+    a document that is still v1 and unchanged since it was read, so the
+    migration can run while the app keeps serving writes. Conversions are
+    in-place updates rather than replaces, so live event streams (which
+    only forward inserts and replaces) do not re-send every document.
+    """
+
+    def __init__(self, db, batch_size=500, pause=0.0):
+        self.state = db.migrations
+        self.batch_size = batch_size
+        self.pause = pause
+        self.targets = (
+            ('expense', db.expenses),
+            ('settlement', db.settlements),
+            ('expense', db.expenses_archive),
+            ('settlement', db.settlements_archive)
+        )
+
+    def progress(self):
+        return self.state.find_one({'_id': MIGRATION_ID}) or {}
+
+    def remaining(self):
+        """{collection: documents not yet in v2}"""
+        return {
+            collection.name: collection.count_documents({'v': {'$ne': SCHEMA_VERSION}})
+            for _, collection in self.targets
+        }
+
+    @staticmethod
+    def _conversion(kind, doc):
+        """Update turning `doc` into its v2 encoding"""
+        converted = to_version(kind, doc, SCHEMA_VERSION)
+        update = {'$set': {key: value for key, value in converted.items() if key != '_id'}}
+        dropped = {key: '' for key in doc if key not in converted}
+        if dropped:
+            update['$unset'] = dropped
+        return update
+
+    def _convert_batch(self, kind, collection, batch):
+        """Convert `batch` to v2 in place; returns how many were converted"""
+        modified = 0
+        for _ in range(CONFLICT_RETRIES + 1):
+            # Match the whole pre-image: a concurrent v1 write (edit, seq
+            # bump) between read and update must not be overwritten
+            requests = [
+                UpdateOne(dict(doc, v={'$ne': SCHEMA_VERSION}), self._conversion(kind, doc))
+                for doc in batch
+            ]
+            result = collection.bulk_write(requests, ordered=False)
+            modified += result.modified_count
+            if result.modified_count == len(batch):
+                break
+            # Lost races (or deletions): convert the current copies instead
+            batch = list(collection.find({'_id': {'$in': [doc['_id'] for doc in batch]}, 'v': {'$ne': SCHEMA_VERSION}}))
+            if not batch:
+                break
+        return modified
+
+    def _migrate_collection(self, kind, collection, last_id):
+        migrated = 0
+        while True:
+            query = {'v': {'$ne': SCHEMA_VERSION}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            batch = list(collection.find(query).sort('_id', 1).limit(self.batch_size))
+            if not batch:
+                return migrated
+
+            modified = self._convert_batch(kind, collection, batch)
+            migrated += modified
+            last_id = batch[-1]['_id']
+
+            # Checkpoint after every batch so a restart skips finished work
+            self.state.update_one(
+                {'_id': MIGRATION_ID},
+                {
+                    '$set': {f'last_ids.{collection.name}': last_id, 'updated_at': datetime.utcnow()},
+                    '$inc': {f'migrated.{collection.name}': modified}
+                },
+                upsert=True
+            )
+            logger.info('Migrated %s %s documents (up to %s)', modified, collection.name, last_id)
+            if self.pause:
+                # Leave room for foreground traffic between batches
+                time.sleep(self.pause)
+
+    def run(self, restart=False):
+        """Convert every remaining v1 document; returns {collection: migrated}"""
+        if restart:
+            self.state.delete_one({'_id': MIGRATION_ID})
+        last_ids = self.progress().get('last_ids', {})
+        self.state.update_one(
+            {'_id': MIGRATION_ID},
+            {'$set': {'started_at': datetime.utcnow(), 'finished_at': None}},
+            upsert=True
+        )
+
+        results = {}
+        for kind, collection in self.targets:
+            results[collection.name] = self._migrate_collection(kind, collection, last_ids.get(collection.name))
+
+        self.state.update_one({'_id': MIGRATION_ID}, {'$set': {'finished_at': datetime.utcnow()}})
+        return results
@@ -0,0 +1,211 @@
+"""
+MongoDB storage backend: the models in this package behind the
+LedgerRepository interface.
+"""
+from contextlib import contextmanager
+from app.models.repository import LedgerRepository
+from app.models.group import Group
+from app.models.friend import Friend
+from app.models.expense import Expense
+from app.models.settlement import Settlement
+from app.models.member import MemberTable, MemberNames
+from app.models.sync import SyncLog
+from app.models.archive import LedgerArchive
+from app.utils.debt_optimizer import (
+    calculate_net_balances, calculate_balance_vector, vector_to_balances, shared_edges
+)
+from app.utils.ledger_schema import balance_projection
+from app.utils.timing import span
+
+# Projections for the balance readers; documents are iterated straight off
+# the cursor so only these fields are ever decoded
+EXPENSE_BALANCE_FIELDS = balance_projection('expense')
+SETTLEMENT_BALANCE_FIELDS = balance_projection('settlement')
+
+
+class MongoRepository(LedgerRepository):
+    kind = 'mongo'
+    supports_history = True
+
+    def __init__(self, get_db, read_router=None, session=None):
+        # The client is opened per process after fork, so resolve it per call
+        self._get_db = get_db
+        self._read_router = read_router
+        # Causally consistent session of a routed read view (see reading())
+        self._session = session
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    @property
+    def available(self):
+        return self.db is not None
+
+    # Groups
+    def create_group(self, name):
+        return Group(self.db).create_group(name)
+
+    def get_group(self, group_id):
+        return Group(self.db).get_group_by_id(group_id)
+
+    def get_group_by_code(self, group_code):
+        return Group(self.db).get_group_by_code(group_code)
+
+    def list_groups(self):
+        return Group(self.db).get_all_groups(self._session)
+
+    def delete_group(self, group_id):
+        db = self.db
+        if not Group(db).delete_group(group_id):
+            return False
+
+        # Delete associated data
+        db.expenses.delete_many({'group_id': group_id})
+        db.friends.delete_many({'group_id': group_id})
+        db.settlements.delete_many({'group_id': group_id})
+        db.balance_checkpoints.delete_many({'group_id': group_id})
+        MemberTable(db).delete_group(group_id)
+        LedgerArchive(db).delete_group(group_id)
+        SyncLog(db).delete_group(group_id)
+        return True
+
+    # Friends
+    def add_friend(self, name, email, group_id=None):
+        # Unique (group_id, email) index makes this a single round trip
+        return Friend(self.db).add_friend(name, email, group_id)
+
+    def add_friends(self, friends, group_id=None):
+        return Friend(self.db).add_friends(friends, group_id)
+
+    def list_friends(self, group_id=None):
+        query = {'group_id': group_id} if group_id else {}
+        return list(self.db.friends.find(query, session=self._session).sort('name', 1))
+
+    # Expenses
+    def create_expense(self, description, amount, payer, participants, group_id=None):
+        return Expense(self.db).create_expense(description, amount, payer, participants, group_id)
+
+    def list_expenses(self, group_id=None):
+        return Expense(self.db).get_all_expenses(group_id, self._session)
+
+    def update_expense(self, expense_id, description, amount, payer, participants, group_id=None):
+        return Expense(self.db).update_expense(expense_id, description, amount, payer, participants, group_id)
+
+    def delete_expense(self, expense_id):
+        return Expense(self.db).delete_expense(expense_id)
+
+    # Settlements
+    def create_settlement(self, from_user, to_user, amount_paisa, group_id=None):
+        return Settlement(self.db).create_settlement(from_user, to_user, amount_paisa, group_id)
+
+    def list_settlements(self, group_id=None):
+        return Settlement(self.db).get_all_settlements(group_id, self._session)
+
+    # Balances
+    def group_balances(self, group_ids, with_edges=False):
+        """
+        One query per collection and integer member-ID balance vectors.
+        """
+        db = self.db
+        session = self._session
+        query = {'group_id': {'$in': group_ids}}
+        expenses_by_group = {group_id: [] for group_id in group_ids}
+        settlements_by_group = {group_id: [] for group_id in group_ids}
+
+        with span('mongo'):
+            for expense in db.expenses.find(query, EXPENSE_BALANCE_FIELDS, session=session):
+                expenses_by_group[expense['group_id']].append(expense)
+            for settlement in db.settlements.find(query, SETTLEMENT_BALANCE_FIELDS, session=session):
+                settlements_by_group[settlement['group_id']].append(settlement)
+            # Read members after the documents so every stored ID is covered
+            names_by_group = MemberTable(db).names_for_groups(group_ids, session)
+
+        results = {}
+        with span('balances'):
+            for group_id in group_ids:
+                names = names_by_group.get(group_id, [])
+                vector = calculate_balance_vector(expenses_by_group[group_id], settlements_by_group[group_id], names)
+                results[group_id] = vector_to_balances(vector, names)
+
+        if not with_edges:
+            return results
+        with span('mongo'):
+            # Edges are between names; ID-only documents need theirs filled
+            member_names = MemberNames(db, session)
+            member_names.load(group_ids)
+        with span('edges'):
+            edges = {
+                group_id: shared_edges(
+                    member_names.fill_each('expense', expenses_by_group[group_id]),
+                    member_names.fill_each('settlement', settlements_by_group[group_id])
+                )
+                for group_id in group_ids
+            }
+        return results, edges
+
+    def all_balances(self, until=None, with_edges=False):
+        db = self.db
+        session = self._session
+        # Balances are keyed by name: every group's member table, one query
+        member_names = MemberNames(db, session)
+        member_names.load()
+        if until is None:
+            # Archived blocks net to zero per member, so current balances
+            # only need the hot collections
+            def find(kind, projection):
+                return member_names.fill_each(kind, db[kind + 's'].find({}, projection, session=session))
+        else:
+            # Point in time may fall inside archived history
+            archive = LedgerArchive(db)
+
+            def find(kind, projection):
+                documents = archive.find_all(kind, {'date': {'$lte': until}}, projection, session=session)
+                return member_names.fill_each(kind, documents)
+
+        if not with_edges:
+            # Projected cursors are consumed lazily by the balance loop, so
+            # fetch and decode of the few balance fields land in its span
+            expenses = find('expense', EXPENSE_BALANCE_FIELDS)
+            settlements = find('settlement', SETTLEMENT_BALANCE_FIELDS)
+            with span('balances'):
+                return calculate_net_balances(expenses, settlements)
+
+        # The edge pass needs the documents a second time
+        with span('mongo'):
+            expenses = list(find('expense', EXPENSE_BALANCE_FIELDS))
+            settlements = list(find('settlement', SETTLEMENT_BALANCE_FIELDS))
+        with span('balances'):
+            balances = calculate_net_balances(expenses, settlements)
+        with span('edges'):
+            edges = shared_edges(expenses, settlements)
+        return balances, edges
+
+    # Conditional GET
+    def list_marker(self, collection_name, group_id=None):
+        sync_log = SyncLog(self.db)
+        if group_id:
+            # Every write to a group advances its change sequence
+            return sync_log.marker(group_id, self._session)
+        # Unfiltered listings show every group: newest document plus count
+        # (catches deletions) plus the sum of all change counters (catches
+        # in-place edits, grouped or not)
+        collection = self.db[collection_name]
+        latest = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)], session=self._session)
+        return f"{latest['_id'] if latest else ''}:{collection.estimated_document_count()}:{sync_log.total(self._session)}"
+
+    # Read routing
+    @contextmanager
+    def reading(self, token=None):
+        if self._read_router is None:
+            yield self
+            return
+        db = self.db
+        routed = self._read_router.routed(db)
+        with self._read_router.session(db, token) as session:
+            yield MongoRepository(lambda: routed, session=session)
+
+    def causal_token(self):
+        if self._read_router is None:
+            return None
+        return self._read_router.issue_token()
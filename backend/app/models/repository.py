@@ -0,0 +1,125 @@
+"""
+Storage backends behind one ledger interface.
+Routes go through app.repo for groups, friends, expenses, settlements,
+current balances and list ETag markers. MongoDB is the default; an
+embedded SQLite database (STORAGE_BACKEND=sqlite, SQLITE_PATH) runs small
+single-node deployments, tests and benchmarks without a database server.
+History features built on MongoDB (point-in-time debts, archival, delta
+sync, change streams, export) need supports_history.
+"""
+import os
+from contextlib import contextmanager
+
+
+class LedgerRepository:
+    """
+    Interface shared by the storage backends.
+    Documents come back in the API (v1) shape with `_id` and datetime
+    values; routes stringify them for JSON.
+    """
+    kind = None
+    supports_history = False
+
+    @property
+    def available(self):
+        """False while the backend cannot serve requests (e.g. no client yet)"""
+        return True
+
+    # Groups
+    def create_group(self, name):
+        """Returns (group_id, group_code); ValueError for an invalid name"""
+        raise NotImplementedError
+
+    def get_group(self, group_id):
+        raise NotImplementedError
+
+    def get_group_by_code(self, group_code):
+        raise NotImplementedError
+
+    def list_groups(self):
+        """Newest first"""
+        raise NotImplementedError
+
+    def delete_group(self, group_id):
+        """Delete the group and everything in it; False if it did not exist"""
+        raise NotImplementedError
+
+    # Friends
+    def add_friend(self, name, email, group_id=None):
+        """New friend ID, or None if the (group_id, email) pair exists"""
+        raise NotImplementedError
+
+    def add_friends(self, friends, group_id=None):
+        """(inserted [(index, id)], duplicate indexes) for [{'name', 'email'}]"""
+        raise NotImplementedError
+
+    def list_friends(self, group_id=None):
+        """Sorted by name; all friends without group_id"""
+        raise NotImplementedError
+
+    # Expenses
+    def create_expense(self, description, amount, payer, participants, group_id=None):
+        raise NotImplementedError
+
+    def list_expenses(self, group_id=None):
+        """Newest first; all expenses without group_id"""
+        raise NotImplementedError
+
+    def update_expense(self, expense_id, description, amount, payer, participants, group_id=None):
+        """Updated expense, or None if it does not exist"""
+        raise NotImplementedError
+
+    def delete_expense(self, expense_id):
+        raise NotImplementedError
+
+    # Settlements
+    def create_settlement(self, from_user, to_user, amount_paisa, group_id=None):
+        raise NotImplementedError
+
+    def list_settlements(self, group_id=None):
+        """Newest first; all settlements without group_id"""
+        raise NotImplementedError
+
+    # Balances
+    def group_balances(self, group_ids, with_edges=False):
+        """
+        {group_id: {name: balance_paisa}}; with `with_edges`, returns
+        (balances, {group_id: shared-expense edges}) as well.
+        """
+        raise NotImplementedError
+
+    def all_balances(self, until=None, with_edges=False):
+        """Balances over every expense and settlement dated <= until (plus edges)"""
+        raise NotImplementedError
+
+    # Conditional GET
+    def list_marker(self, collection_name, group_id=None):
+        """Value that changes whenever the listing could have changed"""
+        raise NotImplementedError
+
+    # Read routing
+    @contextmanager
+    def reading(self, token=None):
+        """
+        Repository for the read-only calls of one request. Replicated
+        backends may serve them from secondaries, after `token` (a decoded
+        causal token) when given.
+        """
+        yield self
+
+    def causal_token(self):
+        """Token for the client to send back after a write, or None"""
+        return None
+
+
+def create_repository(app):
+    """Storage backend selected by STORAGE_BACKEND (mongo or sqlite)"""
+    backend = os.getenv('STORAGE_BACKEND', 'mongo').lower()
+    if backend == 'mongo':
+        from app.models.mongo_repository import MongoRepository
+        from app.utils.read_routing import create_read_router
+        return MongoRepository(lambda: app.db, create_read_router())
+    if backend == 'sqlite':
+        from app.models.sqlite_repository import SQLiteRepository
+        return SQLiteRepository(os.getenv('SQLITE_PATH', 'easyxpense.db'))
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend} (use mongo or sqlite)')
@@ -0,0 +1,56 @@
+from datetime import datetime
+from app.utils.money import paisa_to_rupees
+from app.models.member import MemberTable, MemberNames
+from app.models.sync import SyncLog
+from app.utils.database import run_in_transaction
+from app.utils.ledger_schema import to_version, write_version, settlement_to_v1
+
+
+class Settlement:
+    # Index creation is a server round trip; do it once per process
+    _indexed = False
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.settlements
+        if not Settlement._indexed:
+            try:
+                # Group and point-in-time readers filter on group_id plus a date range
+                self.collection.create_index([('group_id', 1), ('date', 1)])
+                Settlement._indexed = True
+            except Exception:
+                pass
+
+    def create_settlement(self, from_user, to_user, amount_paisa, group_id=None):
+        """Record a payment from_user -> to_user; returns the new _id"""
+        settlement_data = {
+            'fromUser': from_user,
+            'toUser': to_user,
+            'amount_paisa': amount_paisa,  # Store as integer paisa
+            'amount': paisa_to_rupees(amount_paisa),  # Also store rupees for backward compatibility
+            'date': datetime.utcnow(),
+            'currency': 'INR'
+        }
+
+        # Add group_id if provided
+        if group_id:
+            settlement_data['group_id'] = group_id
+            member_ids = MemberTable(self.db).get_ids(group_id, [from_user, to_user])
+            settlement_data['from_id'] = member_ids[from_user]
+            settlement_data['to_id'] = member_ids[to_user]
+
+        def insert(session):
+            # The seq commits together with the settlement (see SyncLog)
+            if group_id:
+                SyncLog(self.db).stamp(group_id, [settlement_data], session)
+            # v1 until LEDGER_SCHEMA_VERSION=2 is set after the rollout
+            document = to_version('settlement', settlement_data, write_version())
+            return self.collection.insert_one(document, session=session).inserted_id
+
+        return run_in_transaction(self.db, insert)
+
+    def get_all_settlements(self, group_id=None, session=None):
+        """Settlements sorted by date (newest first), in the v1 shape"""
+        query = {'group_id': group_id} if group_id else {}
+        settlements = self.collection.find(query, session=session).sort('date', -1)
+        return [settlement_to_v1(doc) for doc in MemberNames(self.db, session).fill('settlement', settlements)]
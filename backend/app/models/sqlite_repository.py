@@ -0,0 +1,434 @@
+"""
+Embedded SQLite storage backend.
+One database file in WAL mode (readers never block the writer), one
+connection per thread and process. Expense shares live in their own table
+so balances and the shared-expense graph are computed in SQL, indexed by
+group_id. IDs are ObjectId hex strings so API responses and group_id
+validation look the same as with MongoDB.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from bson import ObjectId
+from app.models.repository import LedgerRepository
+from app.models.group import validate_group_name, new_group_code
+from app.models.expense import expense_fields
+from app.utils.money import paisa_to_rupees
+from app.utils.timing import span
+
+# Ungrouped rows use '' so (group_id, email) uniqueness also covers them
+NO_GROUP = ''
+# Marker scope advanced by every write (ungrouped listings show all rows)
+ALL_SCOPE = '*'
+# Fixed width keeps ISO timestamps in date order as text
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    group_code TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS groups_created_at ON groups (created_at);
+
+CREATE TABLE IF NOT EXISTS friends (
+    id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (group_id, email)
+);
+CREATE INDEX IF NOT EXISTS friends_group_name ON friends (group_id, name);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount_paisa INTEGER NOT NULL,
+    payer TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_group_date ON expenses (group_id, date);
+CREATE INDEX IF NOT EXISTS expenses_group_payer ON expenses (group_id, payer, amount_paisa);
+
+CREATE TABLE IF NOT EXISTS expense_shares (
+    expense_id TEXT NOT NULL REFERENCES expenses (id) ON DELETE CASCADE,
+    group_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    share_paisa INTEGER NOT NULL,
+    PRIMARY KEY (expense_id, position)
+);
+CREATE INDEX IF NOT EXISTS expense_shares_group_name ON expense_shares (group_id, name, share_paisa);
+
+CREATE TABLE IF NOT EXISTS settlements (
+    id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    from_user TEXT NOT NULL,
+    to_user TEXT NOT NULL,
+    amount_paisa INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS settlements_group_date ON settlements (group_id, date);
+
+CREATE TABLE IF NOT EXISTS markers (
+    scope TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+'''
+
+# Net balance contributions: payer +amount, participant -share,
+# settlement sender +amount and receiver -amount. {where} filters each leg.
+BALANCE_SQL = '''
+SELECT group_id, name, SUM(paisa) FROM (
+    SELECT group_id, payer AS name, amount_paisa AS paisa FROM expenses WHERE {where}
+    UNION ALL
+    SELECT s.group_id, s.name, -s.share_paisa FROM expense_shares s
+        JOIN expenses ON expenses.id = s.expense_id WHERE {shares_where}
+    UNION ALL
+    SELECT group_id, from_user, amount_paisa FROM settlements WHERE amount_paisa > 0 AND {where}
+    UNION ALL
+    SELECT group_id, to_user, -amount_paisa FROM settlements WHERE amount_paisa > 0 AND {where}
+) GROUP BY group_id, name
+'''
+
+# Undirected who-shared-with-whom pairs, ordered (lower, higher)
+EDGES_SQL = '''
+SELECT DISTINCT a.group_id, a.name, b.name FROM expense_shares a
+    JOIN expense_shares b ON b.expense_id = a.expense_id AND a.name < b.name
+    JOIN expenses ON expenses.id = a.expense_id
+    WHERE {shares_where}
+UNION
+SELECT group_id, MIN(from_user, to_user), MAX(from_user, to_user) FROM settlements
+    WHERE from_user != to_user AND {where}
+'''
+
+
+def _now():
+    return datetime.utcnow().strftime(DATE_FORMAT)
+
+
+def _date(value):
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+class SQLiteRepository(LedgerRepository):
+    kind = 'sqlite'
+    supports_history = False
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections cannot cross threads or fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; takes the write lock up front to avoid upgrade deadlocks"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _bump(connection, group_id):
+        """Advance the listing markers for a write to group_id"""
+        for scope in {group_id or NO_GROUP, ALL_SCOPE}:
+            connection.execute(
+                'INSERT INTO markers (scope, seq) VALUES (?, 1) '
+                'ON CONFLICT (scope) DO UPDATE SET seq = seq + 1',
+                (scope,)
+            )
+
+    def ping(self):
+        """Open the database (creating the schema) and run a trivial query"""
+        self._query('SELECT 1')
+
+    # Groups
+    @staticmethod
+    def _group(row):
+        return {
+            '_id': row['id'],
+            'name': row['name'],
+            'group_code': row['group_code'],
+            'created_at': _date(row['created_at'])
+        }
+
+    def create_group(self, name):
+        validate_group_name(name)
+        while True:
+            group_id, group_code = str(ObjectId()), new_group_code()
+            try:
+                with self._transaction() as connection:
+                    connection.execute(
+                        'INSERT INTO groups (id, name, group_code, created_at) VALUES (?, ?, ?, ?)',
+                        (group_id, name.strip(), group_code, _now())
+                    )
+                    self._bump(connection, None)
+                return group_id, group_code
+            except sqlite3.IntegrityError:
+                # group_code collision; draw another
+                continue
+
+    def get_group(self, group_id):
+        rows = self._query('SELECT * FROM groups WHERE id = ?', (group_id,))
+        return self._group(rows[0]) if rows else None
+
+    def get_group_by_code(self, group_code):
+        rows = self._query('SELECT * FROM groups WHERE group_code = ?', (group_code.upper(),))
+        return self._group(rows[0]) if rows else None
+
+    def list_groups(self):
+        return [self._group(row) for row in self._query('SELECT * FROM groups ORDER BY created_at DESC')]
+
+    def delete_group(self, group_id):
+        with self._transaction() as connection:
+            if connection.execute('DELETE FROM groups WHERE id = ?', (group_id,)).rowcount == 0:
+                return False
+            # Shares go with their expenses (ON DELETE CASCADE)
+            for table in ('expenses', 'friends', 'settlements'):
+                connection.execute(f'DELETE FROM {table} WHERE group_id = ?', (group_id,))
+            self._bump(connection, group_id)
+        return True
+
+    # Friends
+    @staticmethod
+    def _friend(row):
+        friend = {
+            '_id': row['id'],
+            'name': row['name'],
+            'email': row['email'],
+            'created_at': _date(row['created_at'])
+        }
+        if row['group_id']:
+            friend['group_id'] = row['group_id']
+        return friend
+
+    def add_friend(self, name, email, group_id=None):
+        friend_id = str(ObjectId())
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO friends (id, group_id, name, email, created_at) VALUES (?, ?, ?, ?, ?)',
+                (friend_id, group_id or NO_GROUP, name, email, _now())
+            )
+            if cursor.rowcount == 0:
+                return None
+            self._bump(connection, group_id)
+        return friend_id
+
+    def add_friends(self, friends, group_id=None):
+        inserted = []
+        duplicates = []
+        now = _now()
+        with self._transaction() as connection:
+            for index, friend in enumerate(friends):
+                friend_id = str(ObjectId())
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO friends (id, group_id, name, email, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (friend_id, group_id or NO_GROUP, friend['name'], friend['email'], now)
+                )
+                if cursor.rowcount:
+                    inserted.append((index, friend_id))
+                else:
+                    duplicates.append(index)
+            if inserted:
+                self._bump(connection, group_id)
+        return inserted, duplicates
+
+    def list_friends(self, group_id=None):
+        if group_id:
+            rows = self._query('SELECT * FROM friends WHERE group_id = ? ORDER BY name', (group_id,))
+        else:
+            rows = self._query('SELECT * FROM friends ORDER BY name')
+        return [self._friend(row) for row in rows]
+
+    # Expenses
+    @staticmethod
+    def _expense(row, shares):
+        expense = {
+            '_id': row['id'],
+            'description': row['description'],
+            'amount_paisa': row['amount_paisa'],
+            'amount': paisa_to_rupees(row['amount_paisa']),
+            'payer': row['payer'],
+            'participants': [name for name, _ in shares],
+            'participant_shares': [{'name': name, 'share_paisa': share} for name, share in shares],
+            'date': _date(row['date']),
+            'currency': 'INR'
+        }
+        if row['group_id']:
+            expense['group_id'] = row['group_id']
+        return expense
+
+    @staticmethod
+    def _write_shares(connection, expense_id, group_id, fields):
+        connection.executemany(
+            'INSERT INTO expense_shares (expense_id, group_id, position, name, share_paisa) VALUES (?, ?, ?, ?, ?)',
+            [
+                (expense_id, group_id or NO_GROUP, position, share['name'], share['share_paisa'])
+                for position, share in enumerate(fields['participant_shares'])
+            ]
+        )
+
+    def create_expense(self, description, amount, payer, participants, group_id=None):
+        fields = expense_fields(description, amount, payer, participants)
+        expense_id = str(ObjectId())
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO expenses (id, group_id, description, amount_paisa, payer, date) VALUES (?, ?, ?, ?, ?, ?)',
+                (expense_id, group_id or NO_GROUP, fields['description'], fields['amount_paisa'], fields['payer'], _now())
+            )
+            self._write_shares(connection, expense_id, group_id, fields)
+            self._bump(connection, group_id)
+        return expense_id
+
+    def list_expenses(self, group_id=None):
+        where, params = ('WHERE group_id = ?', (group_id,)) if group_id else ('', ())
+        rows = self._query(f'SELECT * FROM expenses {where} ORDER BY date DESC', params)
+        shares = {}
+        share_where = 'WHERE group_id = ?' if group_id else ''
+        for share in self._query(
+            f'SELECT expense_id, name, share_paisa FROM expense_shares {share_where} ORDER BY expense_id, position',
+            params
+        ):
+            shares.setdefault(share['expense_id'], []).append((share['name'], share['share_paisa']))
+        return [self._expense(row, shares.get(row['id'], [])) for row in rows]
+
+    def _get_expense(self, connection, expense_id):
+        row = connection.execute('SELECT * FROM expenses WHERE id = ?', (expense_id,)).fetchone()
+        if row is None:
+            return None
+        shares = connection.execute(
+            'SELECT name, share_paisa FROM expense_shares WHERE expense_id = ? ORDER BY position', (expense_id,)
+        ).fetchall()
+        return self._expense(row, [(share['name'], share['share_paisa']) for share in shares])
+
+    def update_expense(self, expense_id, description, amount, payer, participants, group_id=None):
+        fields = expense_fields(description, amount, payer, participants)
+        with self._transaction() as connection:
+            row = connection.execute('SELECT group_id FROM expenses WHERE id = ?', (expense_id,)).fetchone()
+            if row is None:
+                return None
+            if group_id and group_id != row['group_id']:
+                raise ValueError('Expenses cannot move between groups')
+            connection.execute(
+                'UPDATE expenses SET description = ?, amount_paisa = ?, payer = ? WHERE id = ?',
+                (fields['description'], fields['amount_paisa'], fields['payer'], expense_id)
+            )
+            connection.execute('DELETE FROM expense_shares WHERE expense_id = ?', (expense_id,))
+            self._write_shares(connection, expense_id, row['group_id'], fields)
+            self._bump(connection, row['group_id'])
+            return self._get_expense(connection, expense_id)
+
+    def delete_expense(self, expense_id):
+        with self._transaction() as connection:
+            row = connection.execute('SELECT group_id FROM expenses WHERE id = ?', (expense_id,)).fetchone()
+            if row is None:
+                return False
+            connection.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+            self._bump(connection, row['group_id'])
+        return True
+
+    # Settlements
+    def create_settlement(self, from_user, to_user, amount_paisa, group_id=None):
+        settlement_id = str(ObjectId())
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO settlements (id, group_id, from_user, to_user, amount_paisa, date) VALUES (?, ?, ?, ?, ?, ?)',
+                (settlement_id, group_id or NO_GROUP, from_user, to_user, amount_paisa, _now())
+            )
+            self._bump(connection, group_id)
+        return settlement_id
+
+    def list_settlements(self, group_id=None):
+        where, params = ('WHERE group_id = ?', (group_id,)) if group_id else ('', ())
+        settlements = []
+        for row in self._query(f'SELECT * FROM settlements {where} ORDER BY date DESC', params):
+            settlement = {
+                '_id': row['id'],
+                'fromUser': row['from_user'],
+                'toUser': row['to_user'],
+                'amount_paisa': row['amount_paisa'],
+                'amount': paisa_to_rupees(row['amount_paisa']),
+                'date': _date(row['date']),
+                'currency': 'INR'
+            }
+            if row['group_id']:
+                settlement['group_id'] = row['group_id']
+            settlements.append(settlement)
+        return settlements
+
+    # Balances
+    def _balances(self, where, shares_where, params, share_params, with_edges):
+        balance_sql = BALANCE_SQL.format(where=where, shares_where=shares_where)
+        with span('balances'):
+            # One parameter set per UNION leg, in statement order
+            rows = self._query(balance_sql, params + share_params + params + params)
+        if not with_edges:
+            return rows, None
+        edges_sql = EDGES_SQL.format(where=where, shares_where=shares_where)
+        with span('edges'):
+            edges = self._query(edges_sql, share_params + params)
+        return rows, edges
+
+    def group_balances(self, group_ids, with_edges=False):
+        group_ids = list(group_ids)
+        marks = _placeholders(group_ids)
+        rows, edge_rows = self._balances(
+            f'group_id IN ({marks})', f'expenses.group_id IN ({marks})',
+            tuple(group_ids), tuple(group_ids), with_edges
+        )
+        results = {group_id: {} for group_id in group_ids}
+        for group_id, name, paisa in rows:
+            results[group_id][name] = paisa
+        if not with_edges:
+            return results
+        edges = {group_id: set() for group_id in group_ids}
+        for group_id, first, second in edge_rows:
+            edges[group_id].add((first, second))
+        return results, edges
+
+    def all_balances(self, until=None, with_edges=False):
+        if until is None:
+            where, shares_where, params = '1', '1', ()
+        else:
+            where, shares_where, params = 'date <= ?', 'expenses.date <= ?', (until.strftime(DATE_FORMAT),)
+        rows, edge_rows = self._balances(where, shares_where, params, params, with_edges)
+        balances = {}
+        for _, name, paisa in rows:
+            balances[name] = balances.get(name, 0) + paisa
+        if not with_edges:
+            return balances
+        return balances, {(first, second) for _, first, second in edge_rows}
+
+    # Conditional GET
+    def list_marker(self, collection_name, group_id=None):
+        rows = self._query('SELECT seq FROM markers WHERE scope = ?', (group_id or ALL_SCOPE,))
+        return rows[0]['seq'] if rows else 0
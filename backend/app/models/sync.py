@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta
+import os
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.utils.database import supports_transactions
+
+# Collections whose documents carry a per-group change sequence
+SYNC_KINDS = ('expense', 'settlement', 'friend')
+
+# Counter key advanced by edits to documents outside any group (not an ObjectId)
+UNGROUPED = 'ungrouped'
+
+
+class SyncLog:
+    """
+    Per-group monotonic change sequence for delta sync.
+    Every write to a group's expenses, settlements or friends is stamped
+    with the next `seq` of that group (plus `changed_at`), and deletions
+    leave a tombstone with its own seq. A client keeps the highest seq it
+    has applied as an opaque token and asks only for what came after it.
+
+    Writers reserve the seq in the same transaction as the document, so the
+    counter's transaction serializes them: once a seq is committed every
+    lower one is committed or rolled back, and tokens are capped at the
+    counter read before the documents. Without transactions (standalone
+    mongod) the reserve lands before the document; tokens then only pass
+    seqs stamped more than SYNC_SETTLE_SECONDS ago, which assumes writes
+    finish within that window and app host clocks roughly agree.
+    """
+    _indexed = False
+
+    def __init__(self, db):
+        self.db = db
+        self.counters = db.sync_counters
+        self.tombstones = db.tombstones
+        self.sources = {
+            'expense': (db.expenses, db.expenses_archive),
+            'settlement': (db.settlements, db.settlements_archive),
+            'friend': (db.friends,)
+        }
+        self.page_size = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+        # Without transactions, entries newer than this may still have a
+        # lower-numbered sibling in flight
+        self.settle = timedelta(seconds=float(os.getenv('SYNC_SETTLE_SECONDS', '5')))
+        if not SyncLog._indexed:
+            try:
+                for collections in self.sources.values():
+                    for collection in collections:
+                        collection.create_index([('group_id', 1), ('seq', 1)])
+                self.tombstones.create_index([('group_id', 1), ('seq', 1)])
+                SyncLog._indexed = True
+            except Exception:
+                pass
+
+    def reserve(self, group_id, count=1, session=None):
+        """Reserve `count` consecutive sequence numbers; returns the first"""
+        counter = self.counters.find_one_and_update(
+            {'_id': group_id},
+            {'$inc': {'seq': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return counter['seq'] - count + 1
+
+    def stamp(self, group_id, documents, session=None):
+        """
+        Set `seq` and `changed_at` on documents about to be written; pass
+        the session of the transaction that writes them
+        """
+        if not documents:
+            return documents
+        first = self.reserve(group_id, len(documents), session)
+        now = datetime.utcnow()
+        for offset, document in enumerate(documents):
+            document['seq'] = first + offset
+            document['changed_at'] = now
+        return documents
+
+    def touch(self, group_id):
+        """Advance the write marker for changes that carry no seq (e.g. archival)"""
+        return self.reserve(group_id)
+
+    def marker(self, group_id, session=None):
+        """Latest reserved seq of the group (0 before its first stamped write)"""
+        counter = self.counters.find_one({'_id': group_id}, session=session)
+        return counter['seq'] if counter else 0
+
+    def total(self, session=None):
+        """Sum of every counter; advances with any stamped or touched write in any group"""
+        result = list(self.counters.aggregate([{'$group': {'_id': None, 'seq': {'$sum': '$seq'}}}], session=session))
+        return result[0]['seq'] if result else 0
+
+    def record_deletions(self, group_id, kind, ids, session=None):
+        """Leave a tombstone for each deleted document of `kind`"""
+        tombstones = [{'group_id': group_id, 'kind': kind, 'doc_id': str(doc_id)} for doc_id in ids]
+        if tombstones:
+            for tombstone in self.stamp(group_id, tombstones, session):
+                tombstone['deleted_at'] = tombstone['changed_at']
+            self.tombstones.insert_many(tombstones, session=session)
+        return len(tombstones)
+
+    def _find(self, collections, group_id, since, limit):
+        query = {'group_id': group_id, 'seq': {'$gt': since}}
+        documents = []
+        for collection in collections:
+            documents.extend(collection.find(query).sort('seq', 1).limit(limit))
+        documents.sort(key=lambda document: document['seq'])
+        return documents[:limit]
+
+    def _settled_seq(self, group_id, since, documents):
+        """Highest seq stamped before the settle window, among `documents` (since if none)"""
+        unsettled = datetime.utcnow() - self.settle
+        settled = since
+        for document in documents:
+            changed_at = document.get('changed_at')
+            if changed_at is not None and changed_at <= unsettled:
+                settled = max(settled, document['seq'])
+        return settled
+
+    def changes(self, group_id, since, limit=None):
+        """
+        Documents and tombstones of the group with seq > since.
+        Returns (changes {kind: [documents]} plus 'tombstones', token, has_more).
+        """
+        limit = limit or self.page_size
+        # Read first: every seq up to it is settled when writes are transactional
+        committed = self.marker(group_id)
+        changes = {kind: self._find(self.sources[kind], group_id, since, limit) for kind in SYNC_KINDS}
+        changes['tombstones'] = self._find((self.tombstones,), group_id, since, limit)
+
+        cap = committed
+        highest = since
+        has_more = False
+        for documents in changes.values():
+            if len(documents) >= limit:
+                # This kind was truncated; resume after its last entry
+                has_more = True
+                cap = min(cap, documents[-1]['seq'])
+            for document in documents:
+                highest = max(highest, document['seq'])
+        if not supports_transactions(self.db):
+            # A seq may be reserved with its document still in flight; a seq
+            # stamped before the settle window has every lower one written
+            cap = min(cap, self._settled_seq(group_id, since, (d for docs in changes.values() for d in docs)))
+
+        token = max(since, min(cap, highest))
+        return changes, token, has_more
+
+    def _snapshot_token(self, group_id):
+        """Token at which a full sync starts; later writes reach the client as deltas"""
+        committed = self.marker(group_id)
+        if supports_transactions(self.db):
+            return committed
+        unsettled = datetime.utcnow() - self.settle
+        settled = 0
+        for collection in [c for collections in self.sources.values() for c in collections] + [self.tombstones]:
+            latest = collection.find_one(
+                {'group_id': group_id, 'seq': {'$lte': committed}, 'changed_at': {'$lte': unsettled}},
+                {'seq': 1}, sort=[('seq', -1)]
+            )
+            if latest is not None:
+                settled = max(settled, latest['seq'])
+        return settled
+
+    def _page_by_id(self, collections, group_id, after, limit):
+        # Hot and archive copies of a kind are walked together by _id, so a
+        # document moved by compaction mid-sync is still seen once
+        query = {'group_id': group_id}
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        merged = {}
+        for collection in collections:
+            for document in collection.find(query).sort('_id', 1).limit(limit):
+                merged.setdefault(document['_id'], document)
+        return [merged[key] for key in sorted(merged)[:limit]]
+
+    def snapshot(self, group_id, cursor=None, limit=None):
+        """
+        One page of every document of the group (full sync), including ones
+        written before seq existed. Pass the returned cursor back until it
+        is None; the token is set on that last page.
+        Returns (changes {kind: [documents]} plus 'tombstones', token, next_cursor).
+        """
+        limit = limit or self.page_size
+        if cursor is None:
+            kind_index, after, token = 0, None, self._snapshot_token(group_id)
+        else:
+            kind_index, after, token = cursor
+        changes = {kind: [] for kind in SYNC_KINDS}
+        # A full sync starts from scratch, so there is nothing to delete
+        changes['tombstones'] = []
+
+        remaining = limit
+        while kind_index < len(SYNC_KINDS):
+            kind = SYNC_KINDS[kind_index]
+            changes[kind] = self._page_by_id(self.sources[kind], group_id, after, remaining)
+            remaining -= len(changes[kind])
+            if remaining == 0:
+                return changes, None, (kind_index, changes[kind][-1]['_id'], token)
+            kind_index += 1
+            after = None
+        return changes, token, None
+
+    @staticmethod
+    def encode_cursor(cursor):
+        kind_index, after, token = cursor
+        return f'{kind_index}.{after}.{token}'
+
+    @staticmethod
+    def decode_cursor(value):
+        """Parse a full-sync cursor; ValueError if malformed"""
+        parts = value.split('.')
+        if len(parts) != 3 or not parts[0].isdigit() or not parts[2].isdigit():
+            raise ValueError('Invalid sync cursor')
+        kind_index = int(parts[0])
+        if kind_index >= len(SYNC_KINDS) or not ObjectId.is_valid(parts[1]):
+            raise ValueError('Invalid sync cursor')
+        return kind_index, ObjectId(parts[1]), int(parts[2])
+
+    def delete_group(self, group_id):
+        # The counter stays: dropping it would move total() backwards, and
+        # later writes elsewhere could bring back an old listing marker
+        self.tombstones.delete_many({'group_id': group_id})
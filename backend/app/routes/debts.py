@@ -1,57 +1,179 @@
 from flask import Blueprint, request, jsonify, current_app
 from bson import ObjectId
 from app.utils.money import paisa_to_rupees
-from app.utils.debt_optimizer import calculate_optimized_debts
+from app.utils.debt_optimizer import STRATEGIES
+from app.utils.sanitize import sanitize_timestamp, sanitize_string
+from app.utils.timing import span
+from app.utils.read_routing import request_token
+from app.utils.ledger_schema import expense_shares, settlement_parties
+from app.models.checkpoint import BalanceCheckpoint
+from app.models.archive import LedgerArchive
+from app.models.member import MemberNames
+from app.models.mongo_repository import EXPENSE_BALANCE_FIELDS, SETTLEMENT_BALANCE_FIELDS
 
 debts_bp = Blueprint('debts', __name__)
 
+MAX_BATCH_GROUPS = 50
+
+
+def _optimize(balances, strategy='greedy', edges=None):
+    """
+    (settlements, strategy that ran), offloading large groups to the process
+    pool; a pool timeout or overload answers with greedy instead.
+    """
+    pool = current_app.optimizer_pool
+    with span('optimize'):
+        if pool is None:
+            return STRATEGIES[strategy](balances, edges), strategy
+        return pool.optimize(balances, strategy, edges)
+
+
+def _strategy_arg():
+    """Validated ?strategy= (greedy default), or None if unknown"""
+    strategy = request.args.get('strategy', 'greedy').strip().lower()
+    return strategy if strategy in STRATEGIES else None
+
+
+def _optimized_result(optimized_settlements, balances, strategy='greedy'):
+    """Response body for optimized debts (amounts in rupees)"""
+    debts = []
+    for settlement in optimized_settlements:
+        debts.append({
+            'debtor': settlement['from'],
+            'creditor': settlement['to'],
+            'amount': paisa_to_rupees(settlement['amount_paisa'])
+        })
+    
+    # Add balance summary
+    balance_summary = {}
+    for person, balance_paisa in balances.items():
+        balance_summary[person] = paisa_to_rupees(balance_paisa)
+    
+    return {
+        'debts': debts,
+        'balances': balance_summary,
+        'optimized': True,
+        'strategy': strategy
+    }
+
+
+def _current_balances(repo, group_id, until, strategy):
+    """(balances, edges) for one group or all expenses; edges only for non-greedy strategies"""
+    with_edges = strategy != 'greedy'
+    if group_id:
+        result = repo.group_balances([group_id], with_edges=with_edges)
+        if not with_edges:
+            return result[group_id], None
+        balances_by_group, edges = result
+        return balances_by_group[group_id], edges[group_id]
+    result = repo.all_balances(until=until, with_edges=with_edges)
+    return result if with_edges else (result, None)
+
+
 @debts_bp.route('/debts', methods=['GET'])
 def get_debts():
     group_id = request.args.get('group_id')  # Optional filter
     optimize = request.args.get('optimize', 'true').lower() == 'true'  # Default: optimized
+    as_of = None
+    if request.args.get('as_of'):
+        as_of = sanitize_timestamp(request.args.get('as_of'))
+        if as_of is None:
+            return jsonify({'error': 'Invalid as_of timestamp (use ISO 8601 or epoch seconds)'}), 400
+    strategy = _strategy_arg()
+    if strategy is None:
+        return jsonify({'error': f'Invalid strategy (use {", ".join(STRATEGIES)})'}), 400
+    if strategy != 'greedy' and (as_of is not None or not optimize):
+        return jsonify({'error': 'strategy applies to current optimized debts only'}), 400
+    
+    repo = current_app.repo
+    if not repo.supports_history and (not optimize or (as_of is not None and group_id)):
+        return jsonify({'error': 'Group history and legacy debts require the MongoDB storage backend'}), 501
     
     try:
-        if current_app.db is None:
+        if not repo.available:
             return jsonify({'error': 'Database not available'}), 503
-            
-        expenses_collection = current_app.db.expenses
-        settlements_collection = current_app.db.settlements
         
         # Build query for group filtering
         query = {'group_id': group_id} if group_id else {}
-        
-        expenses = list(expenses_collection.find(query))
-        settlements = list(settlements_collection.find(query))
+        if as_of is not None:
+            query['date'] = {'$lte': as_of}
         
         if optimize:
-            # Use optimized algorithm
-            optimized_settlements, balances = calculate_optimized_debts(expenses, settlements)
+            checkpoint_as_of = None
+            if as_of is not None and group_id:
+                # Point-in-time: nearest checkpoint plus the delta after it
+                with span('checkpoint'):
+                    balances, checkpoint_as_of = BalanceCheckpoint(current_app.db).balances_as_of(group_id, as_of)
+                optimized_settlements, strategy = _optimize(balances)
+            else:
+                # Current balances may be read from a secondary (see read_routing)
+                with repo.reading(request_token()) as reader:
+                    balances, edges = _current_balances(reader, group_id, as_of, strategy)
+                optimized_settlements, strategy = _optimize(balances, strategy, edges)
             
             # Convert to response format
-            debts = []
-            for settlement in optimized_settlements:
-                debts.append({
-                    'debtor': settlement['from'],
-                    'creditor': settlement['to'],
-                    'amount': paisa_to_rupees(settlement['amount_paisa'])
-                })
+            with span('format'):
+                result = _optimized_result(optimized_settlements, balances, strategy)
             
-            # Add balance summary
-            balance_summary = {}
-            for person, balance_paisa in balances.items():
-                balance_summary[person] = paisa_to_rupees(balance_paisa)
+            if as_of is not None:
+                result['as_of'] = as_of.isoformat()
+                result['checkpoint'] = checkpoint_as_of.isoformat() if checkpoint_as_of else None
             
-            return jsonify({
-                'debts': debts,
-                'balances': balance_summary,
-                'optimized': True
-            }), 200
+            with span('encode'):
+                response = jsonify(result)
+            return response, 200
         else:
             # Legacy pairwise debt calculation
             return get_debts_legacy(query)
         
     except Exception as e:
-        current_app.logger.error(f'Get debts error: {e}')
+        current_app.logger.error('Get debts error: %s', e)
+        return jsonify({'error': 'Failed to calculate debts'}), 500
+
+
+@debts_bp.route('/debts/batch', methods=['GET'])
+def get_debts_batch():
+    """Optimized debts for several groups with one query per collection"""
+    raw_ids = ','.join(request.args.getlist('group_ids'))
+    group_ids = []
+    for group_id in raw_ids.split(','):
+        group_id = sanitize_string(group_id, max_length=50)
+        if group_id and group_id not in group_ids:
+            group_ids.append(group_id)
+    
+    if not group_ids:
+        return jsonify({'error': 'group_ids is required (comma-separated)'}), 400
+    
+    if len(group_ids) > MAX_BATCH_GROUPS:
+        return jsonify({'error': f'Too many groups (max {MAX_BATCH_GROUPS})'}), 400
+    
+    strategy = _strategy_arg()
+    if strategy is None:
+        return jsonify({'error': f'Invalid strategy (use {", ".join(STRATEGIES)})'}), 400
+    
+    try:
+        if not current_app.repo.available:
+            return jsonify({'error': 'Database not available'}), 503
+        
+        edges_by_group = {}
+        with current_app.repo.reading(request_token()) as reader:
+            if strategy == 'greedy':
+                balances_by_group = reader.group_balances(group_ids)
+            else:
+                balances_by_group, edges_by_group = reader.group_balances(group_ids, with_edges=True)
+        
+        results = {}
+        for group_id in group_ids:
+            optimized_settlements, used = _optimize(balances_by_group[group_id], strategy, edges_by_group.get(group_id))
+            with span('format'):
+                results[group_id] = _optimized_result(optimized_settlements, balances_by_group[group_id], used)
+        
+        with span('encode'):
+            response = jsonify({'groups': results})
+        return response, 200
+        
+    except Exception as e:
+        current_app.logger.error('Get batch debts error: %s', e)
         return jsonify({'error': 'Failed to calculate debts'}), 500
 
 
@@ -59,12 +181,19 @@ def get_debts_legacy(query):
     """Legacy debt calculation (pairwise)"""
     try:
         friends_collection = current_app.db.friends
-        expenses_collection = current_app.db.expenses
-        settlements_collection = current_app.db.settlements
+        ledger = LedgerArchive(current_app.db)
+        
+        with span('mongo'):
+            # Friends carry no ledger date; as_of only filters expenses/settlements
+            friends_query = {key: value for key, value in query.items() if key != 'date'}
+            friends = list(friends_collection.find(friends_query, {'name': 1, '_id': 0}))
+            member_names = MemberNames(current_app.db)
+            member_names.load([query['group_id']] if 'group_id' in query else None)
         
-        friends = list(friends_collection.find(query))
-        expenses = list(expenses_collection.find(query))
-        settlements = list(settlements_collection.find(query))
+        # Iterated once below; only the balance fields are decoded. Pairwise
+        # debts do not net to zero per block, so archived history is included
+        expenses = member_names.fill_each('expense', ledger.find_all('expense', query, EXPENSE_BALANCE_FIELDS))
+        settlements = member_names.fill_each('settlement', ledger.find_all('settlement', query, SETTLEMENT_BALANCE_FIELDS))
         
         # Calculate debts using integer paisa
         debt_matrix_paisa = {}
@@ -77,26 +206,20 @@ def get_debts_legacy(query):
                 if friend_name != other_friend['name']:
                     debt_matrix_paisa[friend_name][other_friend['name']] = 0
         
-        # Process expenses
+        # Process expenses (v1 and v2 documents)
         for expense in expenses:
-            payer = expense.get('payer')
-            participant_shares = expense.get('participant_shares', [])
+            payer, shares = expense_shares(expense)
             
-            if payer and participant_shares:
+            if payer and shares:
                 # Use exact shares from expense
-                for share in participant_shares:
-                    participant = share['name']
-                    share_paisa = share['share_paisa']
-                    
+                for participant, share_paisa in shares:
                     if participant != payer and participant in debt_matrix_paisa:
                         if payer in debt_matrix_paisa[participant]:
                             debt_matrix_paisa[participant][payer] += share_paisa
         
         # Process settlements (subtract payments in paisa)
         for settlement in settlements:
-            from_user = settlement.get('fromUser')
-            to_user = settlement.get('toUser')
-            amount_paisa = settlement.get('amount_paisa', 0)
+            from_user, to_user, amount_paisa = settlement_parties(settlement)
             
             if from_user and to_user and amount_paisa > 0:
                 if from_user in debt_matrix_paisa and to_user in debt_matrix_paisa[from_user]:
@@ -105,18 +228,20 @@ def get_debts_legacy(query):
                         debt_matrix_paisa[from_user][to_user] = 0
         
         # Convert to response format (rupees)
-        debts = []
-        for debtor, creditors in debt_matrix_paisa.items():
-            for creditor, amount_paisa in creditors.items():
-                if amount_paisa > 0:  # Any positive debt
-                    debts.append({
-                        'debtor': debtor,
-                        'creditor': creditor,
-                        'amount': paisa_to_rupees(amount_paisa)
-                    })
-        
-        return jsonify(debts), 200
+        with span('encode'):
+            debts = []
+            for debtor, creditors in debt_matrix_paisa.items():
+                for creditor, amount_paisa in creditors.items():
+                    if amount_paisa > 0:  # Any positive debt
+                        debts.append({
+                            'debtor': debtor,
+                            'creditor': creditor,
+                            'amount': paisa_to_rupees(amount_paisa)
+                        })
+            
+            response = jsonify(debts)
+        return response, 200
         
     except Exception as e:
-        current_app.logger.error(f'Get debts legacy error: {e}')
-        return jsonify({'error': 'Failed to calculate debts'}), 500
\ No newline at end of file
+        current_app.logger.error('Get debts legacy error: %s', e)
+        return jsonify({'error': 'Failed to calculate debts'}), 500
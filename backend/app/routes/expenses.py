@@ -1,48 +1,47 @@
 from flask import Blueprint, request, jsonify, current_app
-from app.models.expense import Expense
-from app.utils.sanitize import sanitize_string, sanitize_amount, sanitize_list
+from app.models.expense import ExpenseConflict
+from app.utils.sanitize import sanitize_string
+from app.utils.schema import Schema, String, Amount, StringList, error_response
+from app.utils.timing import span
+from app.utils.conditional import list_etag, not_modified, with_etag
+from app.utils.read_routing import request_token
+from app.utils.change_feed import serialize_document
 from bson import ObjectId
 
 expenses_bp = Blueprint('expenses', __name__)
 
+EXPENSE_SCHEMA = Schema(
+    description=String(max_length=200, message='Description is required'),
+    amount=Amount(message='Valid amount is required (max 1 crore)'),
+    payer=String(max_length=100, message='Payer is required'),
+    participants=StringList(max_items=50, item_max_length=100, message='At least one participant is required'),
+    group_id=String(max_length=50, required=False)
+)
+
 @expenses_bp.route('/expenses', methods=['POST'])
 def create_expense():
-    current_app.logger.info('Creating new expense')
+    current_app.logger.debug('Creating new expense')
     data = request.get_json()
     
     if not data:
         return jsonify({'success': False, 'error': 'Request body is required'}), 400
     
-    # Sanitize inputs
-    description = sanitize_string(data.get('description', ''), max_length=200)
-    amount = sanitize_amount(data.get('amount'))
-    payer = sanitize_string(data.get('payer', ''), max_length=100)
-    participants = sanitize_list(data.get('participants', []), max_items=50)
-    group_id = sanitize_string(data.get('group_id', ''), max_length=50) if data.get('group_id') else None
-    
-    # Validation
-    if not description:
-        return jsonify({'success': False, 'error': 'Description is required'}), 400
-    
-    if amount is None:
-        return jsonify({'success': False, 'error': 'Valid amount is required (max 1 crore)'}), 400
-    
-    if not payer:
-        return jsonify({'success': False, 'error': 'Payer is required'}), 400
+    body, errors = EXPENSE_SCHEMA.validate(data)
+    if errors:
+        return jsonify(error_response(errors)), 400
     
-    if not participants or len(participants) == 0:
-        return jsonify({'success': False, 'error': 'At least one participant is required'}), 400
-    
-    # Sanitize participant names
-    participants = [sanitize_string(p, max_length=100) for p in participants if p]
+    description = body['description']
+    amount = body['amount']
+    payer = body['payer']
+    participants = body['participants']
+    group_id = body['group_id']
     
     try:
-        if current_app.db is None:
+        if not current_app.repo.available:
             current_app.logger.error('Database connection not available')
             return jsonify({'success': False, 'error': 'Database not available'}), 503
             
-        expense_model = Expense(current_app.db)
-        expense_id = expense_model.create_expense(
+        expense_id = current_app.repo.create_expense(
             description=description,
             amount=amount,
             payer=payer,
@@ -50,7 +49,7 @@ def create_expense():
             group_id=group_id
         )
         
-        current_app.logger.info(f'Expense created successfully with ID: {expense_id}')
+        current_app.logger.info('Expense created successfully with ID: %s', expense_id)
         
         return jsonify({
             'success': True,
@@ -65,10 +64,10 @@ def create_expense():
         }), 201
         
     except ValueError as e:
-        current_app.logger.error(f'Validation error: {e}')
+        current_app.logger.error('Validation error: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        current_app.logger.error(f'Create expense error: {e}')
+        current_app.logger.error('Create expense error: %s', e)
         return jsonify({'success': False, 'error': 'Failed to create expense'}), 500
 
 @expenses_bp.route('/expenses', methods=['GET'])
@@ -76,20 +75,104 @@ def get_expenses():
     group_id = sanitize_string(request.args.get('group_id', ''), max_length=50) if request.args.get('group_id') else None
     
     try:
-        if current_app.db is None:
+        repo = current_app.repo
+        if not repo.available:
             return jsonify({'error': 'Database not available'}), 503
             
-        expense_model = Expense(current_app.db)
-        expenses = expense_model.get_all_expenses(group_id)
+        with repo.reading(request_token()) as reader:
+            with span('mongo'):
+                etag = list_etag(reader, 'expenses', group_id)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+        
+            with span('mongo'):
+                expenses = reader.list_expenses(group_id)
+        
+        with span('encode'):
+            # Convert ObjectIds to strings
+            for expense in expenses:
+                expense['_id'] = str(expense['_id'])
+                if 'date' in expense:
+                    expense['date'] = expense['date'].isoformat()
+            
+            response = jsonify(expenses)
+        return with_etag(response, etag), 200
+        
+    except Exception as e:
+        current_app.logger.error('Get expenses error: %s', e)
+        return jsonify({'error': 'Failed to fetch expenses'}), 500
+
+@expenses_bp.route('/expenses/<expense_id>', methods=['PUT'])
+def update_expense(expense_id):
+    """Edit an expense in place; stored balances shift by the difference only"""
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'success': False, 'error': 'Request body is required'}), 400
+    if not ObjectId.is_valid(expense_id):
+        return jsonify({'success': False, 'error': 'Invalid expense ID'}), 400
+    
+    body, errors = EXPENSE_SCHEMA.validate(data)
+    if errors:
+        return jsonify(error_response(errors)), 400
+    
+    try:
+        if not current_app.repo.available:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        with span('mongo'):
+            expense = current_app.repo.update_expense(
+                expense_id,
+                description=body['description'],
+                amount=body['amount'],
+                payer=body['payer'],
+                participants=body['participants'],
+                group_id=body['group_id']
+            )
+        
+        if expense is None:
+            return jsonify({'success': False, 'error': 'Expense not found'}), 404
+        
+        current_app.logger.info('Expense updated: %s', expense_id)
+        with span('encode'):
+            response = jsonify({
+                'success': True,
+                'message': 'Expense updated successfully',
+                'data': serialize_document(expense)
+            })
+        return response, 200
+        
+    except ExpenseConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except ValueError as e:
+        current_app.logger.error('Validation error: %s', e)
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error('Update expense error: %s', e)
+        return jsonify({'success': False, 'error': 'Failed to update expense'}), 500
+
+@expenses_bp.route('/expenses/<expense_id>', methods=['DELETE'])
+def delete_expense(expense_id):
+    """Delete an expense; its shares are backed out of stored balances"""
+    if not ObjectId.is_valid(expense_id):
+        return jsonify({'success': False, 'error': 'Invalid expense ID'}), 400
+    
+    try:
+        if not current_app.repo.available:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        with span('mongo'):
+            deleted = current_app.repo.delete_expense(expense_id)
         
-        # Convert ObjectIds to strings
-        for expense in expenses:
-            expense['_id'] = str(expense['_id'])
-            if 'date' in expense:
-                expense['date'] = expense['date'].isoformat()
+        if not deleted:
+            return jsonify({'success': False, 'error': 'Expense not found'}), 404
         
-        return jsonify(expenses), 200
+        current_app.logger.info('Expense deleted: %s', expense_id)
+        return jsonify({'success': True, 'message': 'Expense deleted successfully'}), 200
         
+    except ExpenseConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
-        current_app.logger.error(f'Get expenses error: {e}')
-        return jsonify({'error': 'Failed to fetch expenses'}), 500
\ No newline at end of file
+        current_app.logger.error('Delete expense error: %s', e)
+        return jsonify({'success': False, 'error': 'Failed to delete expense'}), 500
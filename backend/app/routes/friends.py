@@ -1,88 +1,138 @@
 from flask import Blueprint, request, jsonify, current_app
-from app.utils.sanitize import sanitize_string, sanitize_email
-from bson import ObjectId
+from app.utils.sanitize import sanitize_string
+from app.utils.schema import Schema, String, Email, error_response
+from app.utils.timing import span
+from app.utils.conditional import list_etag, not_modified, with_etag
+from app.utils.read_routing import request_token
 
 friends_bp = Blueprint('friends', __name__)
 
+MAX_BULK_FRIENDS = 500
+
+FRIEND_ROW_SCHEMA = Schema(
+    name=String(max_length=100, message='Valid name and email are required'),
+    email=Email(message='Valid name and email are required')
+)
+
+FRIEND_SCHEMA = Schema(
+    name=String(max_length=100, message='Valid name and email are required'),
+    email=Email(message='Valid name and email are required'),
+    group_id=String(max_length=50, required=False)
+)
+
 @friends_bp.route('/friends', methods=['POST'])
 def add_friend():
-    current_app.logger.info('Adding new friend')
+    current_app.logger.debug('Adding new friend')
     data = request.get_json()
     
     if not data:
         return jsonify({'success': False, 'error': 'Request body is required'}), 400
     
-    # Sanitize inputs
-    name = sanitize_string(data.get('name', ''), max_length=100)
-    email = sanitize_email(data.get('email', ''))
-    group_id = sanitize_string(data.get('group_id', ''), max_length=50) if data.get('group_id') else None
+    body, errors = FRIEND_SCHEMA.validate(data)
+    if errors:
+        return jsonify(error_response(errors)), 400
     
-    if not name or not email:
-        return jsonify({'success': False, 'error': 'Valid name and email are required'}), 400
+    name = body['name']
+    email = body['email']
+    group_id = body['group_id']
     
     try:
-        if current_app.db is None:
+        if not current_app.repo.available:
             current_app.logger.error('Database connection not available for friends')
             return jsonify({'success': False, 'error': 'Database not available'}), 503
             
-        friends_collection = current_app.db.friends
-        
-        # Check if friend already exists in this group
-        query = {'email': email}
-        if group_id:
-            query['group_id'] = group_id
-        
-        existing_friend = friends_collection.find_one(query)
-        if existing_friend:
+        friend_id = current_app.repo.add_friend(name, email, group_id)
+        if friend_id is None:
             return jsonify({'success': False, 'error': 'Friend already exists'}), 400
         
-        # Add friend
-        friend_data = {
-            'name': name,
-            'email': email,
-            'created_at': ObjectId().generation_time
-        }
-        
-        if group_id:
-            friend_data['group_id'] = group_id
-        
-        result = friends_collection.insert_one(friend_data)
-        current_app.logger.info(f'Friend inserted with ID: {result.inserted_id}')
+        current_app.logger.info('Friend inserted with ID: %s', friend_id)
         
         return jsonify({
             'success': True,
             'message': 'Friend added successfully',
             'data': {
-                '_id': str(result.inserted_id),
+                '_id': str(friend_id),
                 'name': name,
                 'email': email
             }
         }), 201
         
     except Exception as e:
-        current_app.logger.error(f'Add friend error: {e}')
+        current_app.logger.error('Add friend error: %s', e)
         return jsonify({'success': False, 'error': 'Failed to add friend'}), 500
 
+@friends_bp.route('/friends/bulk', methods=['POST'])
+def add_friends_bulk():
+    """Add many members to a group with one unordered insert_many"""
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('friends'), list):
+        return jsonify({'success': False, 'error': 'A list of friends is required'}), 400
+    
+    rows = data['friends']
+    if len(rows) > MAX_BULK_FRIENDS:
+        return jsonify({'success': False, 'error': f'Too many friends (max {MAX_BULK_FRIENDS})'}), 400
+    
+    group_id = sanitize_string(data.get('group_id', ''), max_length=50) if data.get('group_id') else None
+    
+    # One pass over all rows with the same compiled row schema
+    valid_rows, invalid = FRIEND_ROW_SCHEMA.validate_many(rows)
+    valid = [{'index': index, 'name': row['name'], 'email': row['email']} for index, row in valid_rows]
+    
+    try:
+        if not current_app.repo.available:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        inserted, duplicates = current_app.repo.add_friends(valid, group_id)
+        current_app.logger.info('Bulk friend add: %s inserted, %s duplicates, %s invalid',
+                                len(inserted), len(duplicates), len(invalid))
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(inserted)} friends added',
+            'data': {
+                'inserted': [
+                    {'_id': str(friend_id), 'name': valid[i]['name'], 'email': valid[i]['email']}
+                    for i, friend_id in inserted
+                ],
+                'duplicates': [{'index': valid[i]['index'], 'email': valid[i]['email']} for i in duplicates],
+                'invalid': invalid
+            }
+        }), 201 if inserted else 200
+        
+    except Exception as e:
+        current_app.logger.error('Bulk add friends error: %s', e)
+        return jsonify({'success': False, 'error': 'Failed to add friends'}), 500
+
 @friends_bp.route('/friends', methods=['GET'])
 def get_friends():
     group_id = sanitize_string(request.args.get('group_id', ''), max_length=50) if request.args.get('group_id') else None
     
     try:
-        if current_app.db is None:
+        repo = current_app.repo
+        if not repo.available:
             return jsonify({'error': 'Database not available'}), 503
             
-        friends_collection = current_app.db.friends
-        query = {'group_id': group_id} if group_id else {}
-        friends = list(friends_collection.find(query).sort('name', 1))
+        with repo.reading(request_token()) as reader:
+            with span('mongo'):
+                etag = list_etag(reader, 'friends', group_id)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
         
-        # Convert ObjectIds to strings
-        for friend in friends:
-            friend['_id'] = str(friend['_id'])
-            if 'created_at' in friend:
-                friend['created_at'] = friend['created_at'].isoformat()
+            with span('mongo'):
+                friends = reader.list_friends(group_id)
         
-        return jsonify(friends), 200
+        with span('encode'):
+            # Convert ObjectIds to strings
+            for friend in friends:
+                friend['_id'] = str(friend['_id'])
+                if 'created_at' in friend:
+                    friend['created_at'] = friend['created_at'].isoformat()
+            
+            response = jsonify(friends)
+        return with_etag(response, etag), 200
         
     except Exception as e:
-        current_app.logger.error(f'Get friends error: {e}')
+        current_app.logger.error('Get friends error: %s', e)
         return jsonify({'error': 'Failed to fetch friends'}), 500
\ No newline at end of file
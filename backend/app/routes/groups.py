@@ -1,9 +1,24 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.models.group import Group
+from flask import Blueprint, request, jsonify, current_app, Response
+from app.utils.timing import span
+from app.utils.conditional import list_etag, not_modified, with_etag
+from app.utils.read_routing import request_token
+from app.utils.money import paisa_to_rupees
+from app.utils.change_feed import get_change_feed, format_sse, ChangeFeedUnavailable
+from app.utils.export import export_ledger
+from app.utils.sanitize import sanitize_string
+from app.utils.schema import Schema, String, error_response
 from bson import ObjectId
+import queue
+import time
+import os
 
 groups_bp = Blueprint('groups', __name__)
 
+# Length is enforced by the Group model (max 50 characters)
+GROUP_SCHEMA = Schema(
+    name=String(max_length=None, message='Group name is required')
+)
+
 @groups_bp.route('/groups', methods=['POST'])
 def create_group():
     """Create new group"""
@@ -12,17 +27,17 @@ def create_group():
     if not data:
         return jsonify({'success': False, 'error': 'Request body is required'}), 400
     
-    name = data.get('name', '').strip()
+    body, errors = GROUP_SCHEMA.validate(data)
+    if errors:
+        return jsonify(error_response(errors)), 400
     
-    if not name:
-        return jsonify({'success': False, 'error': 'Group name is required'}), 400
+    name = body['name']
     
     try:
-        if current_app.db is None:
+        if not current_app.repo.available:
             return jsonify({'error': 'Database not available'}), 503
         
-        group_model = Group(current_app.db)
-        group_id, group_code = group_model.create_group(name)
+        group_id, group_code = current_app.repo.create_group(name)
         
         return jsonify({
             'success': True,
@@ -37,7 +52,7 @@ def create_group():
     except ValueError as e:
         return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        current_app.logger.error(f'Create group error: {e}')
+        current_app.logger.error('Create group error: %s', e)
         return jsonify({'success': False, 'error': 'Failed to create group'}), 500
 
 
@@ -47,14 +62,13 @@ def get_groups():
     group_code = request.args.get('code')
     
     try:
-        if current_app.db is None:
+        repo = current_app.repo
+        if not repo.available:
             return jsonify({'error': 'Database not available'}), 503
         
-        group_model = Group(current_app.db)
-        
         if group_code:
             # Find specific group by code
-            group = group_model.get_group_by_code(group_code)
+            group = repo.get_group_by_code(group_code)
             if not group:
                 return jsonify({'error': 'Group not found'}), 404
             
@@ -63,16 +77,26 @@ def get_groups():
             return jsonify(group), 200
         else:
             # Get all groups
-            groups = group_model.get_all_groups()
+            with repo.reading(request_token()) as reader:
+                with span('mongo'):
+                    etag = list_etag(reader, 'groups')
+                cached = not_modified(etag)
+                if cached is not None:
+                    return cached
             
-            for group in groups:
-                group['_id'] = str(group['_id'])
-                group['created_at'] = group['created_at'].isoformat()
+                with span('mongo'):
+                    groups = reader.list_groups()
             
-            return jsonify(groups), 200
+            with span('encode'):
+                for group in groups:
+                    group['_id'] = str(group['_id'])
+                    group['created_at'] = group['created_at'].isoformat()
+                
+                response = jsonify(groups)
+            return with_etag(response, etag), 200
         
     except Exception as e:
-        current_app.logger.error(f'Get groups error: {e}')
+        current_app.logger.error('Get groups error: %s', e)
         return jsonify({'error': 'Failed to fetch groups'}), 500
 
 
@@ -80,26 +104,120 @@ def get_groups():
 def delete_group(group_id):
     """Delete group and all associated data"""
     try:
-        if current_app.db is None:
+        if not current_app.repo.available:
             return jsonify({'error': 'Database not available'}), 503
         
-        # Delete group
-        group_model = Group(current_app.db)
-        deleted = group_model.delete_group(group_id)
+        # Deletes the group and all associated data
+        deleted = current_app.repo.delete_group(group_id)
         
         if not deleted:
             return jsonify({'error': 'Group not found'}), 404
         
-        # Delete associated data
-        current_app.db.expenses.delete_many({'group_id': group_id})
-        current_app.db.friends.delete_many({'group_id': group_id})
-        current_app.db.settlements.delete_many({'group_id': group_id})
-        
         return jsonify({
             'success': True,
             'message': 'Group and associated data deleted successfully'
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f'Delete group error: {e}')
+        current_app.logger.error('Delete group error: %s', e)
         return jsonify({'error': 'Failed to delete group'}), 500
+
+
+@groups_bp.route('/groups/<group_id>/events', methods=['GET'])
+def group_events(group_id):
+    """Server-Sent Events stream of new expenses, settlements and balances"""
+    if not current_app.repo.supports_history:
+        return jsonify({'error': 'Live updates require the MongoDB storage backend'}), 501
+    if not request.environ.get('wsgi.multithread'):
+        # A long-lived stream would block every other request on this worker
+        current_app.logger.warning('Refusing event stream on a single-threaded worker')
+        return jsonify({'error': 'Live updates need threaded workers (GUNICORN_WORKER_CLASS=gthread, GUNICORN_THREADS>1)'}), 503
+    
+    try:
+        if current_app.db is None:
+            return jsonify({'error': 'Database not available'}), 503
+        
+        repo = current_app.repo
+        
+        def current_balances(gid):
+            # Current balances are read straight from the ledger (archived
+            # history nets to zero); nothing is written
+            return repo.group_balances([gid])[gid]
+        
+        feed = get_change_feed(current_app._get_current_object(), current_balances)
+        subscriber = feed.subscribe(group_id)
+        initial = current_balances(group_id)
+        
+    except ChangeFeedUnavailable as e:
+        current_app.logger.warning('Change streams unavailable: %s', e)
+        return jsonify({'error': 'Live updates unavailable (MongoDB replica set required)'}), 503
+    except Exception as e:
+        current_app.logger.error('Group events error: %s', e)
+        return jsonify({'error': 'Failed to open event stream'}), 500
+    
+    # Bounded stream lifetime keeps streams under the gunicorn timeout;
+    # EventSource reconnects automatically after `retry` ms
+    max_seconds = int(os.getenv('SSE_MAX_STREAM_SECONDS', '90'))
+    heartbeat_seconds = 15
+    
+    def stream():
+        try:
+            yield 'retry: 2000\n\n'
+            yield format_sse('balances', {
+                person: paisa_to_rupees(balance) for person, balance in initial.items()
+            })
+            deadline = time.monotonic() + max_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event, data = subscriber.get(timeout=min(heartbeat_seconds, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event, data)
+        finally:
+            feed.unsubscribe(group_id, subscriber)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@groups_bp.route('/groups/<group_id>/export', methods=['GET'])
+def export_group(group_id):
+    """Stream the group's merged expense/settlement ledger as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv').lower()
+    use_gzip = request.args.get('gzip', 'false').lower() == 'true'
+    group_id = sanitize_string(group_id, max_length=50)
+    
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Unsupported format (use csv or ndjson)'}), 400
+    if not current_app.repo.supports_history:
+        return jsonify({'error': 'Export requires the MongoDB storage backend'}), 501
+    
+    if current_app.db is None:
+        return jsonify({'error': 'Database not available'}), 503
+    
+    filename = f'easyxpense-{group_id}.{fmt}'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if use_gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    db = current_app.db
+    logger = current_app.logger
+    
+    def stream():
+        try:
+            yield from export_ledger(db, group_id, fmt=fmt, gzip=use_gzip)
+        except Exception as e:
+            # Headers are already sent; log and end the (truncated) stream
+            logger.error('Export stream error for group %s: %s', group_id, e)
+    
+    return Response(stream(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store'
+    })
@@ -1,42 +1,61 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, abort
 from datetime import datetime
+import hmac
 import os
 
 health_bp = Blueprint('health', __name__)
 
-@health_bp.route('/health', methods=['GET', 'HEAD'])
-def health_check():
-    """Comprehensive health check for Render monitoring"""
-    try:
-        # Check database connection
-        db_status = 'connected' if current_app.db is not None else 'disconnected'
-        
-        # Basic app info
-        health_data = {
-            'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat(),
-            'database': db_status,
-            'environment': os.getenv('FLASK_ENV', 'unknown'),
-            'version': '1.0.0'
+def _readiness():
+    """(ready, body) from the probe cache, or from db_status when the probe is off"""
+    probe = current_app.health_probe
+    if probe is not None:
+        return probe.readiness()
+    ready = current_app.db_status['state'] == 'ready'
+    return ready, {
+        'ready': ready,
+        'database': {
+            'state': current_app.db_status['state'],
+            'ping_ms': current_app.db_status['ping_ms'],
+            'error': current_app.db_status['error']
         }
-        
-        # If database is available, test a simple query
-        if current_app.db is not None:
-            try:
-                current_app.db.command('ping')
-                health_data['database_ping'] = 'success'
-            except Exception as e:
-                health_data['database_ping'] = 'failed'
-                health_data['database_error'] = str(e)
-        
-        return jsonify(health_data), 200
-        
-    except Exception as e:
-        return jsonify({
-            'status': 'healthy',
-            'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        }), 200
+    }
+
+
+@health_bp.route('/health/live', methods=['GET', 'HEAD'])
+def liveness():
+    """The worker is up and serving; no database access"""
+    probe = current_app.health_probe
+    if probe is None:
+        return jsonify({'status': 'alive', 'pid': os.getpid()}), 200
+    return jsonify(probe.liveness()), 200
+
+@health_bp.route('/health', methods=['GET', 'HEAD'])
+@health_bp.route('/health/ready', methods=['GET', 'HEAD'])
+def readiness():
+    """503 until the last background ping succeeded recently"""
+    ready, body = _readiness()
+    return jsonify(body), 200 if ready else 503
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Per-endpoint request phase timings for this worker process.
+    Needs `Authorization: Bearer <METRICS_TOKEN>`; without a configured
+    token (or with a wrong one) the endpoint does not exist.
+    """
+    token = os.getenv('METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        abort(404)
+    if current_app.phase_stats is None:
+        return jsonify({'error': 'Phase metrics disabled'}), 404
+    
+    return jsonify({
+        'pid': os.getpid(),
+        'phases': current_app.phase_stats.snapshot(),
+        'optimizer_pool': current_app.optimizer_pool.snapshot() if current_app.optimizer_pool else None,
+        'startup': current_app.startup_metrics
+    }), 200
 
 @health_bp.route('/', methods=['GET'])
 def root():
@@ -45,4 +64,4 @@ def root():
         'message': 'EasyXpense Backend API',
         'status': 'running',
         'timestamp': datetime.utcnow().isoformat()
-    }), 200
\ No newline at end of file
+    }), 200
@@ -1,64 +1,51 @@
 from flask import Blueprint, request, jsonify, current_app
-from bson import ObjectId
-from datetime import datetime
-from app.utils.money import rupees_to_paisa, paisa_to_rupees, validate_amount_paisa
+from app.utils.money import paisa_to_rupees
+from app.utils.schema import Schema, String, Paisa, error_response
+from app.utils.timing import span
+from app.utils.conditional import list_etag, not_modified, with_etag
+from app.utils.read_routing import request_token
 
 settlements_bp = Blueprint('settlements', __name__)
 
+SETTLEMENT_SCHEMA = Schema(
+    # Names must match members exactly, so over-long ones are rejected, not cut
+    fromUser=String(max_length=100, truncate=False, message='From user and to user are required'),
+    toUser=String(max_length=100, truncate=False, message='From user and to user are required'),
+    amount=Paisa(),
+    group_id=String(max_length=50, required=False)
+)
+
 @settlements_bp.route('/settlements', methods=['POST'])
 def create_settlement():
-    current_app.logger.info('Creating new settlement')
+    current_app.logger.debug('Creating new settlement')
     data = request.get_json()
-    current_app.logger.info(f'Settlement data received: {data}')
     
     if not data:
         return jsonify({'success': False, 'error': 'Request body is required'}), 400
         
-    from_user = data.get('fromUser', '').strip()
-    to_user = data.get('toUser', '').strip()
-    amount = data.get('amount')
-    group_id = data.get('group_id')  # Optional group_id
+    body, errors = SETTLEMENT_SCHEMA.validate(data)
+    if errors:
+        return jsonify(error_response(errors)), 400
     
-    # Validation
-    if not from_user or not to_user:
-        return jsonify({'success': False, 'error': 'From user and to user are required'}), 400
+    from_user = body['fromUser']
+    to_user = body['toUser']
+    amount_paisa = body['amount']
+    group_id = body['group_id']  # Optional group_id
     
     if from_user == to_user:
         return jsonify({'success': False, 'error': 'Cannot settle with yourself'}), 400
     
     try:
-        # Convert and validate amount
-        amount_paisa = rupees_to_paisa(amount)
-        validate_amount_paisa(amount_paisa)
-    except (TypeError, ValueError) as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
-    
-    try:
-        if current_app.db is None:
+        if not current_app.repo.available:
             return jsonify({'error': 'Database not available'}), 503
-            
-        settlements_collection = current_app.db.settlements
         
-        settlement_data = {
-            'fromUser': from_user,
-            'toUser': to_user,
-            'amount_paisa': amount_paisa,  # Store as integer paisa
-            'amount': paisa_to_rupees(amount_paisa),  # Also store rupees for backward compatibility
-            'date': datetime.utcnow(),
-            'currency': 'INR'
-        }
-        
-        # Add group_id if provided
-        if group_id:
-            settlement_data['group_id'] = group_id
-        
-        result = settlements_collection.insert_one(settlement_data)
+        settlement_id = current_app.repo.create_settlement(from_user, to_user, amount_paisa, group_id)
         
         return jsonify({
             'success': True,
             'message': 'Settlement created successfully',
             'data': {
-                '_id': str(result.inserted_id),
+                '_id': str(settlement_id),
                 'fromUser': from_user,
                 'toUser': to_user,
                 'amount': paisa_to_rupees(amount_paisa)
@@ -66,7 +53,7 @@ def create_settlement():
         }), 201
         
     except Exception as e:
-        current_app.logger.error(f'Create settlement error: {e}')
+        current_app.logger.error('Create settlement error: %s', e)
         return jsonify({'success': False, 'error': 'Failed to create settlement'}), 500
 
 @settlements_bp.route('/settlements', methods=['GET'])
@@ -74,21 +61,30 @@ def get_settlements():
     group_id = request.args.get('group_id')  # Optional filter
     
     try:
-        if current_app.db is None:
+        repo = current_app.repo
+        if not repo.available:
             return jsonify({'error': 'Database not available'}), 503
             
-        settlements_collection = current_app.db.settlements
-        query = {'group_id': group_id} if group_id else {}
-        settlements = list(settlements_collection.find(query).sort('date', -1))
+        with repo.reading(request_token()) as reader:
+            with span('mongo'):
+                etag = list_etag(reader, 'settlements', group_id)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
         
-        # Convert ObjectIds to strings and format dates
-        for settlement in settlements:
-            settlement['_id'] = str(settlement['_id'])
-            if 'date' in settlement:
-                settlement['date'] = settlement['date'].isoformat()
+            with span('mongo'):
+                settlements = reader.list_settlements(group_id)
         
-        return jsonify(settlements), 200
+        with span('encode'):
+            # Convert ObjectIds to strings and format dates
+            for settlement in settlements:
+                settlement['_id'] = str(settlement['_id'])
+                if 'date' in settlement:
+                    settlement['date'] = settlement['date'].isoformat()
+            
+            response = jsonify(settlements)
+        return with_etag(response, etag), 200
         
     except Exception as e:
-        current_app.logger.error(f'Get settlements error: {e}')
+        current_app.logger.error('Get settlements error: %s', e)
         return jsonify({'error': 'Failed to fetch settlements'}), 500
\ No newline at end of file
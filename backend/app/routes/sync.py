@@ -0,0 +1,85 @@
+from flask import Blueprint, request, jsonify, current_app
+from bson import ObjectId
+from app.models.group import Group
+from app.models.sync import SyncLog
+from app.models.member import MemberNames
+from app.utils.change_feed import serialize_document
+from app.utils.ledger_schema import to_v1
+from app.utils.sanitize import sanitize_string
+from app.utils.timing import span
+
+sync_bp = Blueprint('sync', __name__)
+
+# Response keys for each synced kind
+SYNC_KEYS = {'expense': 'expenses', 'settlement': 'settlements', 'friend': 'friends'}
+
+# Largest page a client may ask for with `limit`
+MAX_SYNC_LIMIT = 1000
+
+
+@sync_bp.route('/sync', methods=['GET'])
+def sync_group():
+    """
+    Changes to a group since a sync token, or a full snapshot without one.
+    A full snapshot is paged: follow `next` as `cursor` until it is null;
+    that last page carries the token for later delta requests.
+    """
+    group_id = sanitize_string(request.args.get('group_id', ''), max_length=50)
+    since = request.args.get('since', '').strip()
+    limit = request.args.get('limit', '').strip()
+    cursor = request.args.get('cursor', '').strip()
+
+    if not group_id or not ObjectId.is_valid(group_id):
+        return jsonify({'success': False, 'error': 'Valid group_id is required'}), 400
+    if since and not since.isdigit():
+        return jsonify({'success': False, 'error': 'Invalid sync token'}), 400
+    if limit and (not limit.isdigit() or not 1 <= int(limit) <= MAX_SYNC_LIMIT):
+        return jsonify({'success': False, 'error': f'limit must be between 1 and {MAX_SYNC_LIMIT}'}), 400
+    if cursor and since:
+        return jsonify({'success': False, 'error': 'cursor only applies to a full sync (no since)'}), 400
+    try:
+        cursor = SyncLog.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid sync cursor'}), 400
+    if not current_app.repo.supports_history:
+        return jsonify({'error': 'Delta sync requires the MongoDB storage backend'}), 501
+
+    try:
+        if current_app.db is None:
+            return jsonify({'error': 'Database not available'}), 503
+
+        with span('mongo'):
+            # A deleted group tells the client to drop its local copy
+            if Group(current_app.db).get_group_by_id(group_id) is None:
+                return jsonify({'error': 'Group not found'}), 404
+            sync_log = SyncLog(current_app.db)
+            limit = int(limit) if limit else None
+            if since:
+                changes, token, has_more = sync_log.changes(group_id, int(since), limit)
+                next_cursor = None
+            else:
+                changes, token, next_cursor = sync_log.snapshot(group_id, cursor, limit)
+                has_more = next_cursor is not None
+            member_names = MemberNames(current_app.db)
+            for kind in ('expense', 'settlement'):
+                changes[kind] = member_names.fill(kind, changes[kind])
+
+        with span('encode'):
+            body = {
+                SYNC_KEYS[kind]: [serialize_document(to_v1(kind, doc)) for doc in changes[kind]]
+                for kind in SYNC_KEYS
+            }
+            body['tombstones'] = [
+                {'kind': t['kind'], '_id': t['doc_id'], 'deleted_at': t['deleted_at'].isoformat()}
+                for t in changes['tombstones']
+            ]
+            body['token'] = str(token) if token is not None else None
+            body['full'] = not since
+            body['has_more'] = has_more
+            body['next'] = SyncLog.encode_cursor(next_cursor) if next_cursor is not None else None
+            response = jsonify(body)
+        return response, 200
+
+    except Exception as e:
+        current_app.logger.error('Sync error: %s', e)
+        return jsonify({'error': 'Failed to sync group'}), 500
@@ -0,0 +1,188 @@
+"""
+Per-process fan-out of MongoDB change stream events to SSE subscribers.
+One database-level change stream cursor per worker watches expenses and
+settlements; events are routed to subscriber queues by group_id, and
+balances of each affected group are recomputed at most once per
+BALANCE_FLUSH_SECONDS. Only inserts and replaces (the app's create and edit
+writes) are watched: in-place updates such as the schema migration's do not
+change what a client shows. Deletions are picked up from the sync
+tombstones (a delete event itself only carries the document key, not its
+group) and sent as `deleted` events.
+Change streams require a replica set (a single-node one works locally).
+"""
+import os
+import json
+import queue
+import time
+import threading
+import logging
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from app.utils.money import paisa_to_rupees
+from app.utils.ledger_schema import to_v1
+from app.models.member import MemberNames
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = {'expenses': 'expense', 'settlements': 'settlement'}
+TOMBSTONE_COLLECTION = 'tombstones'
+
+# Events buffered per subscriber before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Longest a changed group waits for its balances during a steady stream of changes
+BALANCE_FLUSH_SECONDS = 1.0
+
+
+class ChangeFeedUnavailable(Exception):
+    """Raised when the deployment does not support change streams"""
+
+
+def serialize_document(doc):
+    """Make a stored document JSON-safe (same shape as the list endpoints)"""
+    doc = dict(doc)
+    doc['_id'] = str(doc['_id'])
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = value.isoformat()
+    return doc
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event frame"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+class ChangeFeed:
+    def __init__(self, db, balance_fn):
+        self.db = db
+        self.balance_fn = balance_fn      # group_id -> {name: paisa}
+        self.member_names = MemberNames(db)
+        self._subscribers = {}            # group_id -> set of queues
+        self._lock = threading.Lock()
+        self._thread = None
+        self._resume_token = None
+        self._stream = None
+
+    def _pipeline(self):
+        return [{'$match': {'$or': [
+            {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}, 'operationType': {'$in': ['insert', 'replace']}},
+            {'ns.coll': TOMBSTONE_COLLECTION, 'operationType': 'insert'}
+        ]}}]
+
+    def _open_stream(self):
+        # Insert and replace events carry the full document
+        return self.db.watch(
+            self._pipeline(),
+            resume_after=self._resume_token,
+            max_await_time_ms=500
+        )
+
+    def start(self):
+        """Open the change stream (once per process) and start the fan-out thread"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            try:
+                self._stream = self._open_stream()
+            except PyMongoError as e:
+                raise ChangeFeedUnavailable(str(e))
+            self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, group_id):
+        self.start()
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(group_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, group_id, subscriber):
+        with self._lock:
+            group_subscribers = self._subscribers.get(group_id)
+            if group_subscribers is not None:
+                group_subscribers.discard(subscriber)
+                if not group_subscribers:
+                    del self._subscribers[group_id]
+
+    def _publish(self, group_id, event, data):
+        with self._lock:
+            targets = list(self._subscribers.get(group_id, ()))
+        for subscriber in targets:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Slow client: drop its backlog and ask it to refetch
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(('resync', {}))
+
+    def _flush_balances(self, dirty_groups):
+        for group_id in dirty_groups:
+            with self._lock:
+                if group_id not in self._subscribers:
+                    continue
+            try:
+                balances = self.balance_fn(group_id)
+            except PyMongoError as e:
+                logger.warning('Balance refresh failed for group %s: %s', group_id, e)
+                continue
+            self._publish(group_id, 'balances', {
+                person: paisa_to_rupees(balance) for person, balance in balances.items()
+            })
+        dirty_groups.clear()
+
+    def _run(self):
+        dirty_groups = set()
+        flush_at = None
+        while True:
+            try:
+                if self._stream is None:
+                    self._stream = self._open_stream()
+                change = self._stream.try_next()
+                # Recompute once per touched group when a burst ends, or on
+                # a timer while changes keep arriving
+                if dirty_groups and (change is None or time.monotonic() >= flush_at):
+                    self._flush_balances(dirty_groups)
+                if change is None:
+                    continue
+
+                self._resume_token = self._stream.resume_token
+                doc = change.get('fullDocument')
+                group_id = doc.get('group_id') if doc else None
+                if not group_id:
+                    continue
+
+                with self._lock:
+                    watched = group_id in self._subscribers
+                if not watched:
+                    continue
+                collection = change['ns']['coll']
+                if collection == TOMBSTONE_COLLECTION:
+                    self._publish(group_id, 'deleted', {'kind': doc['kind'], '_id': doc['doc_id']})
+                else:
+                    event = WATCHED_COLLECTIONS[collection]
+                    doc = self.member_names.fill(event, [doc])[0]
+                    self._publish(group_id, event, serialize_document(to_v1(event, doc)))
+                if not dirty_groups:
+                    flush_at = time.monotonic() + BALANCE_FLUSH_SECONDS
+                dirty_groups.add(group_id)
+            except PyMongoError as e:
+                logger.warning('Change stream interrupted, resuming: %s', e)
+                try:
+                    self._stream.close()
+                except Exception:
+                    pass
+                self._stream = None
+                threading.Event().wait(1.0)
+
+
+def get_change_feed(app, balance_fn):
+    """Process-local ChangeFeed for the app (recreated after fork)"""
+    with app.db_lock:
+        feed = getattr(app, 'change_feed', None)
+        if feed is None or app.change_feed_pid != os.getpid():
+            feed = ChangeFeed(app.db, balance_fn)
+            app.change_feed = feed
+            app.change_feed_pid = os.getpid()
+        return feed
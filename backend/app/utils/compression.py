@@ -0,0 +1,65 @@
+"""
+Negotiated response compression.
+JSON and text responses above a size threshold are compressed with brotli
+(when the optional `Brotli` package is installed) or gzip, whichever the
+client prefers. Streamed responses (exports, SSE) are left alone.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html'}
+
+
+class Compressor:
+    def __init__(self, min_size, gzip_level, brotli_quality):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def _eligible(self, response):
+        return (
+            200 <= response.status_code < 300
+            and response.status_code != 204
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype in COMPRESSIBLE_TYPES
+        )
+
+    def compress(self, response, accept_encodings):
+        """Compress `response` in place if eligible and the client accepts it"""
+        if not self._eligible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        encoding = accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=self.brotli_quality))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=self.gzip_level, mtime=0))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def create_compressor():
+    """Build the compressor from environment settings, or None when disabled"""
+    if os.getenv('COMPRESSION_ENABLED', 'true').lower() != 'true':
+        return None
+
+    return Compressor(
+        min_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),
+        gzip_level=int(os.getenv('COMPRESSION_LEVEL', '6')),
+        brotli_quality=int(os.getenv('BROTLI_QUALITY', '4'))
+    )
@@ -0,0 +1,31 @@
+"""
+Conditional GET for listing endpoints.
+A weak ETag is derived from the collection, group, the storage backend's
+latest write marker and the query string, so an unchanged list is answered
+with 304 before any documents are read or serialized.
+"""
+import hashlib
+from flask import request, current_app
+
+
+def list_etag(repo, collection_name, group_id=None):
+    """Weak ETag value for the current request's listing"""
+    marker = repo.list_marker(collection_name, group_id)
+    params = sorted(request.args.items(multi=True))
+    key = repr((collection_name, group_id, marker, params)).encode()
+    return hashlib.blake2b(key, digest_size=12).hexdigest()
+
+
+def not_modified(etag):
+    """304 response when the client already holds `etag`, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    # Let browsers keep the body but revalidate on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
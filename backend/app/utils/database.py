@@ -0,0 +1,189 @@
+"""
+MongoDB connection management.
+The client is opened lazily once per process so the app can be preloaded by
+gunicorn before forking; pings run in the background (the health probe, or
+a single initial ping when it is disabled) and their outcome is kept in
+app.db_status for readiness reporting.
+"""
+import os
+import threading
+import time
+import logging
+from pymongo import MongoClient, monitoring
+from pymongo.errors import OperationFailure
+from app.utils.read_routing import client_options
+
+DB_NAME = 'EasyXpense'
+# IllegalOperation: a standalone mongod refuses transactions
+ILLEGAL_OPERATION = 20
+MAX_POOL_SIZE = 10
+# Deployments that run multi-document transactions
+TRANSACTION_TOPOLOGIES = ('ReplicaSetWithPrimary', 'Sharded', 'LoadBalanced')
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage for load shedding and health reporting"""
+
+    def __init__(self, max_size=MAX_POOL_SIZE):
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.waiting = 0       # threads queued for a connection
+        self.checked_out = 0   # connections currently in use
+        self.open = 0          # connections open in the pool
+
+    def _add(self, field, delta):
+        with self._lock:
+            setattr(self, field, max(0, getattr(self, field) + delta))
+
+    def connection_check_out_started(self, event):
+        self._add('waiting', 1)
+
+    def connection_checked_out(self, event):
+        self._add('waiting', -1)
+        self._add('checked_out', 1)
+
+    def connection_check_out_failed(self, event):
+        self._add('waiting', -1)
+
+    def connection_checked_in(self, event):
+        self._add('checked_out', -1)
+
+    def connection_created(self, event):
+        self._add('open', 1)
+
+    def connection_closed(self, event):
+        self._add('open', -1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+def init_db(app, mongo_uri):
+    """Record connection settings without opening any sockets"""
+    app.config['MONGO_URI'] = mongo_uri
+    app.db = None
+    app.db_client = None
+    app.db_pid = None
+    app.db_lock = threading.Lock()
+    app.db_pool = PoolMonitor()
+    app.db_status = {
+        'state': 'pending',
+        'error': None,
+        'ping_ms': None,
+        'connected_at': None
+    }
+
+
+def connect_db(app):
+    """Open a MongoClient for the current process and ping it in the background"""
+    with app.db_lock:
+        if app.db_pid == os.getpid():
+            return app.db
+        if not app.config['MONGO_URI']:
+            # Another storage backend is in use (see app.models.repository)
+            app.db_pid = os.getpid()
+            return None
+
+        app.db_status.update(state='connecting', error=None, ping_ms=None, connected_at=None)
+        # Pool counters from a parent process are meaningless after fork
+        app.db_pool = PoolMonitor()
+        try:
+            options = client_options()
+            listeners = [app.db_pool] + options.pop('event_listeners', [])
+            client = MongoClient(
+                app.config['MONGO_URI'],
+                serverSelectionTimeoutMS=10000,
+                connectTimeoutMS=10000,
+                socketTimeoutMS=10000,
+                maxPoolSize=MAX_POOL_SIZE,
+                minPoolSize=1,
+                event_listeners=listeners,
+                **options
+            )
+        except Exception as e:
+            logger.error('✗ MongoDB client creation failed: %s', e)
+            app.db = None
+            app.db_client = None
+            app.db_status.update(state='failed', error=str(e))
+            app.db_pid = os.getpid()
+            return None
+
+        app.db_client = client
+        app.db = client[DB_NAME]
+        app.db_pid = os.getpid()
+
+    probe = getattr(app, 'health_probe', None)
+    if probe is not None:
+        probe.start()
+    else:
+        thread = threading.Thread(target=_initial_ping, args=(app,), name='mongo-initial-ping', daemon=True)
+        thread.start()
+    return app.db
+
+
+def ensure_db(app):
+    """Connect if this process has no client yet (e.g. first request after fork)"""
+    if app.db_pid != os.getpid():
+        connect_db(app)
+    return app.db
+
+
+def run_in_transaction(db, write):
+    """
+    Run write(session) in a transaction, or write(None) on deployments
+    without transaction support. Returns write's result.
+    """
+    try:
+        with db.client.start_session() as session:
+            return session.with_transaction(write)
+    except OperationFailure as e:
+        if e.code != ILLEGAL_OPERATION:
+            raise
+        logger.debug('Transactions unsupported, writing without one: %s', e)
+    return write(None)
+
+
+def supports_transactions(db):
+    """Whether writes through run_in_transaction really run in a transaction"""
+    description = getattr(db.client, 'topology_description', None)
+    return description is not None and description.topology_type_name in TRANSACTION_TOPOLOGIES
+
+
+def db_state_label(app):
+    """Short database status used by the health endpoints"""
+    state = app.db_status['state']
+    if state == 'ready':
+        return 'connected'
+    if state in ('pending', 'connecting'):
+        return 'connecting'
+    return 'disconnected'
+
+
+def _initial_ping(app):
+    db = app.db
+    start = time.perf_counter()
+    try:
+        db.command('ping')
+        app.db_status.update(
+            state='ready',
+            ping_ms=round((time.perf_counter() - start) * 1000, 2),
+            connected_at=time.time()
+        )
+        logger.info('✓ MongoDB connected successfully to database: %s', db.name)
+    except Exception as e:
+        app.db_status.update(state='failed', error=str(e))
+        logger.error('✗ MongoDB connection failed: %s', e)
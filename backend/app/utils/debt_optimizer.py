@@ -2,48 +2,108 @@
 Optimized debt settlement algorithm.
 Minimizes number of transactions using net balance approach.
 """
+from array import array
+from app.utils.min_cost_flow import MinCostFlow
+from app.utils.ledger_schema import (
+    amount_paisa, expense_shares, expense_member_shares, settlement_parties, settlement_member_ids
+)
 
-def calculate_net_balances(expenses, settlements):
+def calculate_net_balances(expenses, settlements, initial_balances=None):
     """
     Calculate net balance for each person in paisa.
     Positive = person is owed money
     Negative = person owes money
+    
+    initial_balances lets a caller continue from a stored checkpoint.
     """
-    balances = {}
+    balances = dict(initial_balances) if initial_balances else {}
     
-    # Process expenses
+    # Process expenses (v1 and v2 documents)
     for expense in expenses:
-        payer = expense.get('payer')
-        participant_shares = expense.get('participant_shares', [])
+        payer, shares = expense_shares(expense)
         
-        if not payer or not participant_shares:
+        if not payer or not shares:
             continue
         
         # Payer paid the full amount
-        amount_paisa = expense.get('amount_paisa', 0)
-        balances[payer] = balances.get(payer, 0) + amount_paisa
+        balances[payer] = balances.get(payer, 0) + amount_paisa(expense)
         
         # Each participant owes their share
-        for share in participant_shares:
-            participant = share['name']
-            share_paisa = share['share_paisa']
+        for participant, share_paisa in shares:
             balances[participant] = balances.get(participant, 0) - share_paisa
     
     # Process settlements (reduce debts)
     for settlement in settlements:
-        from_user = settlement.get('fromUser')
-        to_user = settlement.get('toUser')
-        amount_paisa = settlement.get('amount_paisa', 0)
+        from_user, to_user, settled_paisa = settlement_parties(settlement)
         
-        if from_user and to_user and amount_paisa > 0:
+        if from_user and to_user and settled_paisa > 0:
             # from_user paid to_user, so from_user's debt decreases
-            balances[from_user] = balances.get(from_user, 0) + amount_paisa
+            balances[from_user] = balances.get(from_user, 0) + settled_paisa
             # to_user received payment, so what they're owed decreases
-            balances[to_user] = balances.get(to_user, 0) - amount_paisa
+            balances[to_user] = balances.get(to_user, 0) - settled_paisa
     
     return balances
 
 
+def calculate_balance_vector(expenses, settlements, names):
+    """
+    Net balances in paisa as an array('q') indexed by member ID.
+    
+    Expenses/settlements carrying integer member IDs (payer_id, member_ids,
+    shares / from_id, to_id, or the v2 pi / mi / fi / ti) are folded without
+    touching names. Older name-only documents are mapped through `names`; unknown names get
+    temporary IDs appended to `names`, which is extended in place.
+    """
+    vector = array('q', bytes(8 * len(names)))
+    name_ids = None
+    
+    def id_for(name):
+        nonlocal name_ids
+        if name_ids is None:
+            name_ids = {n: i for i, n in enumerate(names) if n is not None}
+        member_id = name_ids.get(name)
+        if member_id is None:
+            member_id = name_ids[name] = len(names)
+            names.append(name)
+            vector.append(0)
+        return member_id
+    
+    for expense in expenses:
+        member_shares = expense_member_shares(expense)
+        if member_shares is not None:
+            payer_id, member_ids, shares = member_shares
+            vector[payer_id] += amount_paisa(expense)
+            for member_id, share_paisa in zip(member_ids, shares):
+                vector[member_id] -= share_paisa
+            continue
+        
+        payer, shares = expense_shares(expense)
+        if not payer or not shares:
+            continue
+        vector[id_for(payer)] += amount_paisa(expense)
+        for name, share_paisa in shares:
+            vector[id_for(name)] -= share_paisa
+    
+    for settlement in settlements:
+        from_user, to_user, settled_paisa = settlement_parties(settlement)
+        if settled_paisa <= 0:
+            continue
+        from_id, to_id = settlement_member_ids(settlement)
+        if from_id is None or to_id is None:
+            if not from_user or not to_user:
+                continue
+            from_id, to_id = id_for(from_user), id_for(to_user)
+        vector[from_id] += settled_paisa
+        vector[to_id] -= settled_paisa
+    
+    return vector
+
+
+def vector_to_balances(vector, names):
+    """Name-keyed balances for API responses"""
+    return {names[i]: balance for i, balance in enumerate(vector) if names[i] is not None}
+
+
 def optimize_settlements(balances):
     """
     Generate minimum number of settlements using greedy algorithm.
@@ -102,6 +162,179 @@ def optimize_settlements(balances):
     return settlements
 
 
+def shared_edges(expenses, settlements):
+    """
+    Who-shared-with-whom graph: an undirected edge between every two people
+    on the same expense (payer and participants) or settlement.
+    Returns a set of (name, name) pairs.
+    """
+    edges = set()
+    for expense in expenses:
+        payer, shares = expense_shares(expense)
+        people = sorted({payer, *(name for name, _ in shares)} - {None})
+        for i, first in enumerate(people):
+            for second in people[i + 1:]:
+                edges.add((first, second))
+    for settlement in settlements:
+        from_user, to_user, _ = settlement_parties(settlement)
+        if from_user and to_user and from_user != to_user:
+            edges.add((min(from_user, to_user), max(from_user, to_user)))
+    return edges
+
+
+def _forest_path(forest, start, goal):
+    """Node path start..goal in the transfer forest, or None if not connected"""
+    parents = {start: None}
+    frontier = [start]
+    while frontier and goal not in parents:
+        next_frontier = []
+        for node in frontier:
+            for neighbour in forest.get(node, ()):
+                if neighbour not in parents:
+                    parents[neighbour] = node
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+    if goal not in parents:
+        return None
+    path = [goal]
+    while path[-1] != start:
+        path.append(parents[path[-1]])
+    return path[::-1]
+
+
+def _set_transfer(forest, a, b, amount):
+    """Signed transfer a -> b (negative means b pays a); zero removes it"""
+    if amount:
+        forest.setdefault(a, {})[b] = amount
+        forest.setdefault(b, {})[a] = -amount
+    else:
+        forest[a].pop(b, None)
+        forest[b].pop(a, None)
+
+
+def _cancel_cycles(transfers):
+    """
+    Reshape transfers so they form a forest, which bounds the count at
+    (people - connected components). Each transfer that would close a cycle
+    shifts money around that cycle until one of its transfers drops to zero,
+    choosing the direction that moves less money in total.
+    """
+    forest = {}
+    for u, v, amount in transfers:
+        path = _forest_path(forest, v, u)
+        if path is None:
+            _set_transfer(forest, u, v, amount)
+            continue
+
+        # Cycle u -> v -> ... -> u; flows measured along that direction
+        cycle = [(u, v, amount)] + [(a, b, forest[a][b]) for a, b in zip(path, path[1:])]
+        aligned = [flow for _, _, flow in cycle if flow > 0]
+        opposing = [-flow for _, _, flow in cycle if flow < 0]
+        imbalance = len(aligned) - len(opposing)
+        # Shifting by `shift` changes total money moved by shift * imbalance
+        shift = -min(aligned)
+        if opposing and min(opposing) * imbalance < shift * imbalance:
+            shift = min(opposing)
+
+        for a, b, flow in cycle[1:]:
+            _set_transfer(forest, a, b, flow + shift)
+        # One transfer on the cycle is now zero, so adding this one keeps a forest
+        if amount + shift:
+            _set_transfer(forest, u, v, amount + shift)
+
+    result = []
+    for a, neighbours in forest.items():
+        for b, amount in neighbours.items():
+            if amount > 0:
+                result.append((a, b, amount))
+    return result
+
+
+def optimize_constrained(balances, edges):
+    """
+    Settlements that only pay along shared-expense edges.
+    Min-cost flow from debtors to creditors over the shared graph (unit cost
+    per paisa per hop) finds the least money moved, possibly relayed through
+    a common friend; cycle canceling then caps transfers at one fewer than
+    the people in each connected group. This is a heuristic: it minimizes
+    money moved first and only bounds the transaction count, which is not
+    minimized (that problem is NP-hard). Balances the graph cannot route
+    (inconsistent data) fall back to greedy pairing.
+    """
+    people = list(balances)
+    index = {person: i for i, person in enumerate(people)}
+    source, sink = len(people), len(people) + 1
+    network = MinCostFlow(len(people) + 2)
+
+    owed = 0
+    for i, person in enumerate(people):
+        balance = balances[person]
+        if balance < 0:
+            network.add_edge(source, i, -balance, 0)
+            owed -= balance
+        elif balance > 0:
+            network.add_edge(i, sink, balance, 0)
+
+    arcs = []
+    for first, second in edges:
+        u, v = index.get(first), index.get(second)
+        if u is None or v is None or u == v:
+            continue
+        arcs.append((u, v, network.add_edge(u, v, owed, 1)))
+        arcs.append((v, u, network.add_edge(v, u, owed, 1)))
+
+    routed, _ = network.flow(source, sink)
+
+    net = {}
+    for u, v, edge in arcs:
+        flow = network.flow_on(edge)
+        if flow:
+            key = (u, v) if u < v else (v, u)
+            net[key] = net.get(key, 0) + (flow if u < v else -flow)
+    transfers = [(u, v, amount) if amount > 0 else (v, u, -amount) for (u, v), amount in sorted(net.items()) if amount]
+
+    settlements = [
+        {'from': people[u], 'to': people[v], 'amount_paisa': amount}
+        for u, v, amount in _cancel_cycles(transfers)
+    ]
+    settlements.sort(key=lambda s: s['amount_paisa'], reverse=True)
+
+    if routed < owed:
+        remaining = dict(balances)
+        for settlement in settlements:
+            remaining[settlement['from']] += settlement['amount_paisa']
+            remaining[settlement['to']] -= settlement['amount_paisa']
+        settlements.extend(optimize_settlements(remaining))
+    return settlements
+
+
+def _greedy(balances, edges=None):
+    return optimize_settlements(balances)
+
+
+# Settlement strategies by name: (balances {key: paisa}, edges) -> [{'from', 'to', 'amount_paisa'}]
+STRATEGIES = {
+    'greedy': _greedy,
+    'constrained': optimize_constrained
+}
+
+
+def optimize_balance_vector(vector, strategy='greedy', edges=None):
+    """
+    Run a strategy on a balance vector indexed by position.
+    Entry point for optimizer worker processes: takes and returns only
+    integers, so jobs pickle compactly and never carry names or documents.
+    `edges` is a flat sequence of position pairs (a0, b0, a1, b1, ...).
+    Returns [(from_index, to_index, amount_paisa), ...].
+    """
+    balances = {index: balance for index, balance in enumerate(vector)}
+    pairs = list(zip(edges[::2], edges[1::2])) if edges is not None else None
+    return [
+        (settlement['from'], settlement['to'], settlement['amount_paisa'])
+        for settlement in STRATEGIES[strategy](balances, pairs)
+    ]
+
+
 def calculate_optimized_debts(expenses, settlements):
     """
     Main function: Calculate optimized debt settlements.
@@ -0,0 +1,128 @@
+"""
+Streaming ledger export.
+Merges the expenses and settlements cursors of a group by date and encodes
+rows as CSV or NDJSON in fixed-size chunks, optionally gzip-compressed, so
+memory use stays constant regardless of ledger size.
+"""
+import io
+import csv
+import json
+import heapq
+import zlib
+from app.utils.money import paisa_to_rupees, format_paisa
+from app.models.archive import LedgerArchive
+from app.models.member import MemberNames
+from app.utils.ledger_schema import to_v1
+
+CSV_COLUMNS = ['date', 'type', 'id', 'description', 'paid_by', 'paid_to', 'amount_inr', 'shares']
+
+# Rows are buffered until a chunk reaches this size before being yielded
+CHUNK_SIZE = 64 * 1024
+
+
+def merged_ledger(db, group_id):
+    """Yield (kind, document) for a group's expenses and settlements in date order"""
+    # Archived history first, then the hot collections
+    ledger = LedgerArchive(db)
+    archived_until = ledger.archived_until(group_id)
+    member_names = MemberNames(db)
+    member_names.load([group_id])
+    expenses = member_names.fill_each(
+        'expense', ledger.find('expense', group_id, sort=1, archived_until=archived_until, lookup=False)
+    )
+    settlements = member_names.fill_each(
+        'settlement', ledger.find('settlement', group_id, sort=1, archived_until=archived_until, lookup=False)
+    )
+    return heapq.merge(
+        (('expense', doc) for doc in expenses),
+        (('settlement', doc) for doc in settlements),
+        key=lambda item: item[1]['date']
+    )
+
+
+def _ledger_record(kind, doc):
+    doc = to_v1(kind, doc)
+    if kind == 'expense':
+        return {
+            'date': doc['date'].isoformat(),
+            'type': kind,
+            'id': str(doc['_id']),
+            'description': doc.get('description', ''),
+            'paid_by': doc.get('payer', ''),
+            'paid_to': None,
+            'amount_paisa': doc.get('amount_paisa', 0),
+            'shares': [
+                {'name': share['name'], 'amount_paisa': share['share_paisa']}
+                for share in doc.get('participant_shares', [])
+            ]
+        }
+    return {
+        'date': doc['date'].isoformat(),
+        'type': kind,
+        'id': str(doc['_id']),
+        'description': '',
+        'paid_by': doc.get('fromUser', ''),
+        'paid_to': doc.get('toUser', ''),
+        'amount_paisa': doc.get('amount_paisa', 0),
+        'shares': []
+    }
+
+
+def _csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for record in records:
+        writer.writerow([
+            record['date'],
+            record['type'],
+            record['id'],
+            record['description'],
+            record['paid_by'],
+            record['paid_to'] or '',
+            format_paisa(record['amount_paisa']),
+            ';'.join(f"{s['name']}={format_paisa(s['amount_paisa'])}" for s in record['shares'])
+        ])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_lines(records):
+    parts = []
+    size = 0
+    for record in records:
+        record['amount'] = paisa_to_rupees(record['amount_paisa'])
+        for share in record['shares']:
+            share['amount'] = paisa_to_rupees(share['amount_paisa'])
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_ledger(db, group_id, fmt='csv', gzip=False):
+    """Generator of encoded export chunks (bytes)"""
+    records = (_ledger_record(kind, doc) for kind, doc in merged_ledger(db, group_id))
+    lines = _csv_lines(records) if fmt == 'csv' else _ndjson_lines(records)
+    chunks = (text.encode('utf-8') for text in lines)
+    if gzip:
+        return _gzip_chunks(chunks)
+    return chunks
@@ -0,0 +1,133 @@
+"""
+Background health probe.
+One daemon thread per worker pings MongoDB on an interval and keeps the
+result in memory, so liveness and readiness checks answer without touching
+the database or waiting on the connection pool. The first cycle also
+bootstraps indexes. Readiness turns false when the last successful ping is
+older than HEALTH_PROBE_STALE_SECONDS.
+"""
+import os
+import time
+import threading
+import logging
+from app.models.indexes import bootstrap_indexes
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProbe:
+    def __init__(self, app, interval, stale_after):
+        self.app = app
+        self.interval = interval          # seconds between pings
+        self.stale_after = stale_after    # seconds without a good ping before not ready
+        self.started_at = time.time()
+        self.state = {
+            'checked_at': None,
+            'last_ok_at': None,
+            'ping_ms': None,
+            'failures': 0,
+            'error': None
+        }
+        self.indexes = {'state': 'pending', 'duration_ms': None, 'pending': [], 'errors': {}, 'error': None}
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the probe thread for this process (threads do not survive fork)"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self.indexes = {'state': 'pending', 'duration_ms': None, 'pending': [], 'errors': {}, 'error': None}
+            self._thread = threading.Thread(target=self._run, name='health-probe', daemon=True)
+            self._thread.start()
+
+    def _ping(self, db):
+        start = time.perf_counter()
+        try:
+            db.command('ping')
+        except Exception as e:
+            with self._lock:
+                self.state.update(checked_at=time.time(), error=str(e), failures=self.state['failures'] + 1)
+            self.app.db_status.update(state='failed', error=str(e))
+            return False
+
+        ping_ms = round((time.perf_counter() - start) * 1000, 2)
+        now = time.time()
+        with self._lock:
+            self.state.update(checked_at=now, last_ok_at=now, ping_ms=ping_ms, failures=0, error=None)
+        if self.app.db_status['state'] != 'ready':
+            logger.info('✓ MongoDB connected successfully to database: %s', db.name)
+            self.app.db_status.update(state='ready', error=None, ping_ms=ping_ms, connected_at=now)
+        return True
+
+    def _bootstrap(self, db):
+        try:
+            result = bootstrap_indexes(db)
+            result['error'] = None
+        except Exception as e:
+            logger.warning('Index bootstrap failed: %s', e)
+            result = {'state': 'failed', 'duration_ms': None, 'pending': [], 'errors': {}, 'error': str(e)}
+        with self._lock:
+            self.indexes = result
+        if result['state'] == 'ready':
+            logger.info('Indexes ready in %sms', result['duration_ms'])
+
+    def _run(self):
+        while True:
+            db = self.app.db
+            if db is not None and self._ping(db) and self.indexes['state'] != 'ready':
+                self._bootstrap(db)
+            time.sleep(self.interval)
+
+    def liveness(self):
+        """Process-local facts only; never blocks on the database"""
+        return {
+            'status': 'alive',
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'probe_running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+        }
+
+    def readiness(self):
+        """(ready, body) from the last probe cycle and live pool counters"""
+        now = time.time()
+        with self._lock:
+            state = dict(self.state)
+            indexes = dict(self.indexes)
+        last_ok_at = state['last_ok_at']
+        ready = last_ok_at is not None and now - last_ok_at <= self.stale_after
+        pool = self.app.db_pool
+        checked_out, max_size = pool.checked_out, pool.max_size
+        return ready, {
+            'ready': ready,
+            'database': {
+                'state': self.app.db_status['state'],
+                'ping_ms': state['ping_ms'],
+                'checked_s_ago': round(now - state['checked_at'], 1) if state['checked_at'] else None,
+                'consecutive_failures': state['failures'],
+                'error': state['error']
+            },
+            'pool': {
+                'checked_out': checked_out,
+                'open': pool.open,
+                'waiting': pool.waiting,
+                'max_size': max_size,
+                'utilization': round(checked_out / max_size, 2) if max_size else None
+            },
+            'indexes': indexes
+        }
+
+
+def create_health_probe(app):
+    """Build the probe from environment settings, or None when disabled"""
+    if os.getenv('HEALTH_PROBE_ENABLED', 'true').lower() != 'true':
+        return None
+
+    interval = float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', '10'))
+    return HealthProbe(
+        app,
+        interval=interval,
+        stale_after=float(os.getenv('HEALTH_PROBE_STALE_SECONDS', str(3 * interval)))
+    )
@@ -0,0 +1,245 @@
+"""
+Versioned expense and settlement documents.
+
+v1 (original) stores amount_paisa plus a float `amount`, `participants`
+and `participant_shares` repeating the same names, and `currency: 'INR'`;
+grouped documents also carry payer_id / member_ids / shares or
+from_id / to_id.
+
+v2 (compact) is marked with `v: 2`:
+    expense     d  description      a  amount_paisa     p  payer
+                n  participant names
+                s  shares in paisa, parallel to n (omitted for an equal split)
+                pi payer member ID  mi member IDs, parallel to n
+    settlement  f  fromUser  t  toUser  a  amount_paisa  fi / ti  member IDs
+
+Grouped v2 documents that carry member IDs store no names (p / n, f / t);
+readers fill them back from the group's member table (MemberNames) before
+using the accessors. Ungrouped rows have no member table and keep names.
+
+Query and index keys (_id, group_id, date, seq, changed_at) keep their
+names so both versions share indexes and range queries during rollout.
+Readers go through the accessors below; API responses use to_v1().
+"""
+import os
+from app.utils.money import paisa_to_rupees, split_equally
+
+SCHEMA_VERSION = 2
+CURRENCY = 'INR'
+
+V1_EXPENSE_FIELDS = {
+    'description', 'amount_paisa', 'amount', 'payer', 'participants',
+    'participant_shares', 'currency', 'payer_id', 'member_ids', 'shares'
+}
+V1_SETTLEMENT_FIELDS = {'fromUser', 'toUser', 'amount_paisa', 'amount', 'currency', 'from_id', 'to_id'}
+V2_EXPENSE_FIELDS = {'v', 'd', 'a', 'p', 'n', 's', 'pi', 'mi'}
+V2_SETTLEMENT_FIELDS = {'v', 'f', 't', 'a', 'fi', 'ti'}
+
+# Only what the balance readers touch (member-ID and name forms, v1 and v2,
+# plus group_id to find the member table of ID-only v2 documents);
+# description, participants, float amounts and currency are never decoded
+BALANCE_FIELDS = {
+    'expense': (
+        'group_id', 'amount_paisa', 'payer_id', 'member_ids', 'shares', 'payer', 'participant_shares',
+        'v', 'a', 'p', 'n', 's', 'pi', 'mi'
+    ),
+    'settlement': (
+        'group_id', 'amount_paisa', 'from_id', 'to_id', 'fromUser', 'toUser',
+        'v', 'a', 'f', 't', 'fi', 'ti'
+    )
+}
+
+
+def balance_projection(kind, *extra):
+    """Find projection for balance computation, plus `extra` fields"""
+    projection = {field: 1 for field in BALANCE_FIELDS[kind] + extra}
+    projection['_id'] = 0
+    return projection
+
+
+def write_version():
+    """
+    Schema version new documents are written in (LEDGER_SCHEMA_VERSION).
+    Stays 1 until every deployed worker can read v2; set it to 2 after the
+    rollout, then run migrate_ledger.py.
+    """
+    return int(os.getenv('LEDGER_SCHEMA_VERSION', '1'))
+
+
+def is_v2(doc):
+    return doc.get('v') == SCHEMA_VERSION
+
+
+def amount_paisa(doc):
+    return doc.get('a', 0) if is_v2(doc) else doc.get('amount_paisa', 0)
+
+
+def _v2_shares(doc, count):
+    shares = doc.get('s')
+    if shares is None and count:
+        shares = split_equally(doc.get('a', 0), count)
+    return shares or []
+
+
+def expense_shares(doc):
+    """(payer, [(name, share_paisa), ...]) of an expense in either version"""
+    if is_v2(doc):
+        names = doc.get('n') or []
+        return doc.get('p'), list(zip(names, _v2_shares(doc, len(names))))
+    return doc.get('payer'), [
+        (share['name'], share['share_paisa']) for share in doc.get('participant_shares', [])
+    ]
+
+
+def expense_member_shares(doc):
+    """(payer_id, member_ids, shares) when the expense carries member IDs, else None"""
+    if is_v2(doc):
+        if doc.get('pi') is None:
+            return None
+        member_ids = doc['mi']
+        return doc['pi'], member_ids, _v2_shares(doc, len(member_ids))
+    if doc.get('payer_id') is None:
+        return None
+    return doc['payer_id'], doc['member_ids'], doc['shares']
+
+
+def settlement_parties(doc):
+    """(from_user, to_user, amount_paisa) of a settlement in either version"""
+    if is_v2(doc):
+        return doc.get('f'), doc.get('t'), doc.get('a', 0)
+    return doc.get('fromUser'), doc.get('toUser'), doc.get('amount_paisa', 0)
+
+
+def settlement_member_ids(doc):
+    """(from_id, to_id), either of which may be None"""
+    if is_v2(doc):
+        return doc.get('fi'), doc.get('ti')
+    return doc.get('from_id'), doc.get('to_id')
+
+
+def unnamed_member_ids(kind, doc):
+    """Member IDs of a v2 document stored without names, else None"""
+    if not is_v2(doc):
+        return None
+    if kind == 'expense' and 'pi' in doc and 'n' not in doc:
+        return [doc['pi']] + doc['mi']
+    if kind == 'settlement' and 'fi' in doc and 'f' not in doc:
+        return [doc['fi'], doc['ti']]
+    return None
+
+
+def add_member_names(kind, doc, names):
+    """Fill the names of an ID-only v2 document in place from `names` (indexed by member ID)"""
+    if kind == 'expense':
+        doc['p'] = names[doc['pi']]
+        doc['n'] = [names[member_id] for member_id in doc['mi']]
+    else:
+        doc['f'] = names[doc['fi']]
+        doc['t'] = names[doc['ti']]
+    return doc
+
+
+def _extra_fields(doc, known):
+    """Fields outside the versioned payload, carried over unchanged"""
+    return {key: value for key, value in doc.items() if key not in known}
+
+
+def expense_to_v2(doc):
+    if is_v2(doc):
+        return doc
+    compact = _extra_fields(doc, V1_EXPENSE_FIELDS)
+    payer, shares = expense_shares(doc)
+    names = [name for name, _ in shares]
+    share_amounts = [share for _, share in shares]
+    compact.update({
+        'v': SCHEMA_VERSION,
+        'd': doc.get('description', ''),
+        'a': doc.get('amount_paisa', 0)
+    })
+    if doc.get('payer_id') is not None:
+        # Names live in the group's member table
+        compact['pi'] = doc['payer_id']
+        compact['mi'] = doc['member_ids']
+    else:
+        compact['p'] = payer
+        compact['n'] = names
+    if names and share_amounts != split_equally(compact['a'], len(names)):
+        compact['s'] = share_amounts
+    return compact
+
+
+def settlement_to_v2(doc):
+    if is_v2(doc):
+        return doc
+    compact = _extra_fields(doc, V1_SETTLEMENT_FIELDS)
+    compact.update({
+        'v': SCHEMA_VERSION,
+        'a': doc.get('amount_paisa', 0)
+    })
+    if doc.get('from_id') is not None:
+        compact['fi'] = doc['from_id']
+        compact['ti'] = doc['to_id']
+    else:
+        compact['f'] = doc.get('fromUser')
+        compact['t'] = doc.get('toUser')
+    return compact
+
+
+def expense_to_v1(doc):
+    """API-facing shape of an expense (v1 documents pass through; names must be filled)"""
+    if not is_v2(doc):
+        return doc
+    expanded = _extra_fields(doc, V2_EXPENSE_FIELDS)
+    payer, shares = expense_shares(doc)
+    expanded.update({
+        'description': doc.get('d', ''),
+        'amount_paisa': doc.get('a', 0),
+        'amount': paisa_to_rupees(doc.get('a', 0)),
+        'payer': payer,
+        'participants': [name for name, _ in shares],
+        'participant_shares': [{'name': name, 'share_paisa': share} for name, share in shares],
+        'currency': CURRENCY
+    })
+    member_shares = expense_member_shares(doc)
+    if member_shares is not None:
+        expanded['payer_id'], expanded['member_ids'], expanded['shares'] = member_shares
+    return expanded
+
+
+def settlement_to_v1(doc):
+    """API-facing shape of a settlement (v1 documents pass through; names must be filled)"""
+    if not is_v2(doc):
+        return doc
+    expanded = _extra_fields(doc, V2_SETTLEMENT_FIELDS)
+    from_user, to_user, amount = settlement_parties(doc)
+    expanded.update({
+        'fromUser': from_user,
+        'toUser': to_user,
+        'amount_paisa': amount,
+        'amount': paisa_to_rupees(amount),
+        'currency': CURRENCY
+    })
+    if doc.get('fi') is not None:
+        expanded['from_id'] = doc['fi']
+        expanded['to_id'] = doc['ti']
+    return expanded
+
+
+def to_v1(kind, doc):
+    """API-facing shape of a ledger document; other kinds pass through"""
+    if kind == 'expense':
+        return expense_to_v1(doc)
+    if kind == 'settlement':
+        return settlement_to_v1(doc)
+    return doc
+
+
+def to_version(kind, doc, version):
+    """Encode a v1-shaped document for writing in `version`"""
+    if version != SCHEMA_VERSION:
+        return doc
+    if kind == 'expense':
+        return expense_to_v2(doc)
+    if kind == 'settlement':
+        return settlement_to_v2(doc)
+    return doc
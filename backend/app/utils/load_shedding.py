@@ -0,0 +1,70 @@
+"""
+Load shedding for overload protection.
+When the MongoDB pool wait queue or the number of in-flight requests passes
+its threshold, expensive endpoints get 503 + Retry-After so cheap requests
+keep flowing; past twice the threshold every non-health request is shed.
+
+Both counts are per worker process, so the defaults come from the worker's
+thread count and pool size: an expensive request is shed when it would take
+the worker's last free thread, or when every connection is taken and the
+threads the pool cannot serve are all queued for one.
+"""
+import os
+import threading
+from app.utils.database import MAX_POOL_SIZE
+
+# Endpoints that read whole collections and are shed first
+EXPENSIVE_PATHS = {'/api/debts', '/api/debts/batch'}
+
+
+class LoadShedder:
+    def __init__(self, max_in_flight, max_pool_waiting, retry_after):
+        self.max_in_flight = max_in_flight
+        self.max_pool_waiting = max_pool_waiting
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def should_shed(self, path, pool_waiting):
+        """Decide whether to reject a request given current pressure"""
+        # This request is already counted in in_flight
+        in_flight = self.in_flight - 1
+        if not self._past(in_flight, pool_waiting, 1):
+            return False
+        if path in EXPENSIVE_PATHS:
+            return True
+        return self._past(in_flight, pool_waiting, 2)
+
+    def _past(self, in_flight, pool_waiting, factor):
+        # A threshold of 0 turns that signal off
+        if self.max_in_flight and in_flight >= factor * self.max_in_flight:
+            return True
+        return bool(self.max_pool_waiting) and pool_waiting >= factor * self.max_pool_waiting
+
+
+def worker_threads():
+    """Request threads per gunicorn worker (see gunicorn.conf.py)"""
+    if os.getenv('GUNICORN_WORKER_CLASS', 'gthread') != 'gthread':
+        return 1
+    return int(os.getenv('GUNICORN_THREADS', '4'))
+
+
+def create_load_shedder():
+    """Build the shedder from environment settings, or None when disabled"""
+    if os.getenv('LOAD_SHEDDING_ENABLED', 'true').lower() != 'true':
+        return None
+
+    threads = worker_threads()
+    return LoadShedder(
+        max_in_flight=int(os.getenv('SHED_MAX_IN_FLIGHT', str(threads - 1))),
+        max_pool_waiting=int(os.getenv('SHED_MAX_POOL_WAITING', str(max(0, threads - MAX_POOL_SIZE)))),
+        retry_after=int(os.getenv('SHED_RETRY_AFTER', '5'))
+    )
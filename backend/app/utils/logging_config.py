@@ -0,0 +1,173 @@
+"""
+Logging setup that keeps log I/O off the request thread.
+Request threads only enqueue LogRecords; a QueueListener thread formats
+them (JSON in production) and writes to stdout. The queue is bounded
+(LOG_QUEUE_SIZE); when stdout cannot keep up, records are dropped and
+counted rather than growing memory. High-volume request logs can be
+sampled with LOG_REQUEST_SAMPLE_RATE.
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import random
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+REQUEST_LOGGER = 'easyxpense.requests'
+
+# Seconds a warning or error waits for room in a full queue before it is
+# dropped; lower levels are dropped at once
+FULL_QUEUE_WAIT_SECONDS = 0.05
+
+# Renders tracebacks on the calling thread, while the exception is alive
+_traceback_formatter = logging.Formatter()
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; runs on the listener thread"""
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that snapshots each record like the stock prepare() (the
+    message is merged and the traceback rendered on the calling thread, so
+    later changes to mutable args cannot leak in) but leaves the formatter
+    to the listener thread. A full queue drops records; the count is
+    reported in a warning once there is room again.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._reported = 0
+
+    def prepare(self, record):
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # Runs under the handler lock, so the counters need no lock of their own
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=FULL_QUEUE_WAIT_SECONDS)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self._reported:
+            self._report_drops()
+
+    def _report_drops(self):
+        missed = self.dropped - self._reported
+        record = logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': f'Dropped {missed} log records: log queue full'
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return
+        self._reported += missed
+
+
+class SamplingFilter(logging.Filter):
+    """Passes a fraction of INFO/DEBUG records; warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+def _start_listener(formatter):
+    global _listener, _queue_handler
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    if _queue_handler is None:
+        _queue_handler = DeferredQueueHandler(log_queue)
+    else:
+        _queue_handler.queue = log_queue
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(); give each child its own
+    if _queue_handler is not None:
+        _start_listener(_listener.handlers[0].formatter)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Route all logging through a background listener; safe to call more than once"""
+    if _listener is not None:
+        return
+
+    production = os.getenv('FLASK_ENV') == 'production'
+    level = logging.INFO if production else logging.DEBUG
+    log_format = os.getenv('LOG_FORMAT', 'json' if production else 'text')
+
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
+
+    _start_listener(formatter)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+
+    sample_rate = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', '1.0'))
+    request_logger = logging.getLogger(REQUEST_LOGGER)
+    request_logger.filters = [SamplingFilter(sample_rate)]
+
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
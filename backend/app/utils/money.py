@@ -25,6 +25,15 @@ def paisa_to_rupees(paisa):
     return round(paisa / 100, 2)
 
 
+def format_paisa(paisa):
+    """Format paisa as an exact rupee string with two decimals (e.g. '1234.50')"""
+    if paisa is None:
+        paisa = 0
+    sign = '-' if paisa < 0 else ''
+    rupees, remainder = divmod(abs(paisa), 100)
+    return f'{sign}{rupees}.{remainder:02d}'
+
+
 def validate_amount_paisa(amount_paisa):
     """Validate amount in paisa"""
     if not isinstance(amount_paisa, int):
@@ -0,0 +1,170 @@
+"""
+Process-pool offload for debt optimization.
+Groups with many non-zero balances are optimized in a small, bounded pool
+of worker processes so a slow strategy cannot stall the serving worker.
+Jobs carry only an integer balance vector (plus index pairs for the
+constrained strategy); names stay in the caller. A job
+that misses its deadline, a full pool, or a broken pool falls back to the
+greedy optimizer inline, and the caller is told which strategy ran. A job past its deadline cannot be cancelled once it
+runs, so the pool is torn down (its processes terminated) and rebuilt on the
+next submit; the pending count follows job completion, not the caller.
+"""
+import os
+import atexit
+import threading
+import logging
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from app.utils.debt_optimizer import optimize_balance_vector, optimize_settlements
+
+logger = logging.getLogger(__name__)
+
+
+class OptimizerPool:
+    def __init__(self, max_workers, threshold, timeout, max_pending):
+        self.max_workers = max_workers
+        self.threshold = threshold      # non-zero balances before offloading
+        self.timeout = timeout          # seconds per job
+        self.max_pending = max_pending  # queued + running jobs
+        self.stats = {'inline': 0, 'offloaded': 0, 'full': 0, 'timeouts': 0, 'broken': 0, 'fallbacks': 0}
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Never reuse a pool inherited across fork
+        if self._executor is None or self._pid != os.getpid():
+            # spawn: forking a threaded worker could copy held locks
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _discard(self, executor, terminate=False):
+        """Drop `executor` (if still current); `terminate` kills its running jobs"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            owned = self._pid == os.getpid()
+        if executor is None or not owned:
+            return
+        if terminate:
+            # Killing the workers breaks the pool, which fails every queued
+            # or running future and so releases their pending slots
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reset(self):
+        self._discard(self._executor)
+
+    def _job_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _fallback(self, balances, key):
+        self._count(key)
+        self._count('fallbacks')
+        return optimize_settlements(balances), 'greedy'
+
+    def optimize(self, balances, strategy='greedy', edges=None):
+        """
+        Settlements for {name: paisa}; offloaded above the size threshold.
+        `edges` (name pairs) is only used by graph-aware strategies, which
+        keep settled members in the vector so payments can route through them.
+        Returns (settlements, strategy that ran): 'greedy' after a fallback.
+        """
+        if edges is None:
+            names = [name for name, balance in balances.items() if balance]
+        else:
+            names = list(balances)
+        vector = array('q', (balances[name] for name in names))
+        edge_vector = None
+        if edges is not None:
+            index = {name: i for i, name in enumerate(names)}
+            edge_vector = array('i')
+            for first, second in edges:
+                if first in index and second in index:
+                    edge_vector.append(index[first])
+                    edge_vector.append(index[second])
+        if len(names) < self.threshold:
+            self._count('inline')
+            return _named(names, optimize_balance_vector(vector, strategy, edge_vector)), strategy
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                full = True
+            else:
+                full = False
+                self._pending += 1
+        if full:
+            logger.warning('Optimizer pool full (%s pending); using greedy inline', self.max_pending)
+            return self._fallback(balances, 'full')
+
+        executor = None
+        try:
+            with self._lock:
+                executor = self._get_executor()
+            future = executor.submit(optimize_balance_vector, vector, strategy, edge_vector)
+        except BrokenProcessPool as e:
+            self._job_done(None)
+            logger.error('Optimizer pool broken, recreating: %s', e)
+            self._discard(executor)
+            return self._fallback(balances, 'broken')
+        # The slot is released when the job really finishes (or its pool dies)
+        future.add_done_callback(self._job_done)
+        self._count('offloaded')
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            logger.warning('Optimizer job for %s balances timed out after %ss; terminating the pool and using greedy', len(names), self.timeout)
+            self._discard(executor, terminate=True)
+            return self._fallback(balances, 'timeouts')
+        except BrokenProcessPool as e:
+            logger.error('Optimizer pool broken, recreating: %s', e)
+            self._discard(executor)
+            return self._fallback(balances, 'broken')
+
+        return _named(names, result), strategy
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, pending=self._pending, max_workers=self.max_workers)
+
+    def shutdown(self):
+        self._reset()
+
+
+def _named(names, result):
+    """Map (from_index, to_index, amount) tuples back to names"""
+    return [
+        {'from': names[debtor], 'to': names[creditor], 'amount_paisa': amount}
+        for debtor, creditor, amount in result
+    ]
+
+
+def create_optimizer_pool():
+    """Build the pool from environment settings, or None when disabled"""
+    if os.getenv('OPTIMIZER_POOL_ENABLED', 'true').lower() != 'true':
+        return None
+
+    max_workers = int(os.getenv('OPTIMIZER_POOL_WORKERS', '1'))
+    pool = OptimizerPool(
+        max_workers=max_workers,
+        threshold=int(os.getenv('OPTIMIZER_POOL_THRESHOLD', '200')),
+        timeout=float(os.getenv('OPTIMIZER_TIMEOUT_SECONDS', '2')),
+        max_pending=int(os.getenv('OPTIMIZER_MAX_PENDING', str(4 * max_workers)))
+    )
+    atexit.register(pool.shutdown)
+    return pool
@@ -0,0 +1,129 @@
+"""
+Token bucket rate limiting shared across gunicorn workers.
+Buckets live in a small SQLite file so every worker process of one instance
+draws from the same budget per client IP and per group. The file is local to
+the instance: with several instances each enforces its own budget.
+"""
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Request cost in tokens; endpoints that scan whole collections cost more
+DEFAULT_COST = 1
+PATH_COSTS = {
+    '/api/debts': 5,
+    '/api/debts/batch': 20
+}
+
+# Purge buckets idle for longer than this (seconds)
+STALE_AFTER = 3600
+
+
+class TokenBucketStore:
+    """File-backed token buckets, safe to share between processes"""
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate      # tokens refilled per second
+        self.burst = burst    # bucket capacity
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        # One connection per thread and per process (never reused after fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key, cost=1, rate=None, burst=None):
+        """
+        Take `cost` tokens from the bucket for `key`.
+        Returns (allowed, retry_after_seconds).
+        """
+        rate = rate or self.rate
+        burst = burst or self.burst
+        now = time.time()
+        conn = self._connection()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                tokens = float(burst)
+            else:
+                tokens = min(float(burst), row[0] + (now - row[1]) * rate)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+
+            conn.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - STALE_AFTER,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if allowed:
+            return True, 0
+        return False, max(1, int((cost - tokens) / rate + 0.999))
+
+
+class RateLimiter:
+    """Applies per-IP and per-group buckets to incoming requests"""
+
+    def __init__(self, store, group_rate, group_burst):
+        self.store = store
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+
+    def check(self, remote_addr, group_id, path):
+        """Returns (allowed, retry_after_seconds); fails open on store errors"""
+        cost = PATH_COSTS.get(path, DEFAULT_COST)
+        try:
+            allowed, retry_after = self.store.consume(f'ip:{remote_addr}', cost)
+            if allowed and group_id:
+                allowed, retry_after = self.store.consume(
+                    f'group:{group_id}', cost, rate=self.group_rate, burst=self.group_burst
+                )
+            return allowed, retry_after
+        except Exception as e:
+            logger.warning('Rate limiter unavailable, allowing request: %s', e)
+            return True, 0
+
+
+def create_rate_limiter():
+    """Build the limiter from environment settings, or None when disabled"""
+    if os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'true':
+        return None
+
+    path = os.getenv('RATE_LIMIT_DB', 'easyxpense-ratelimit.db')
+    store = TokenBucketStore(
+        path,
+        rate=float(os.getenv('RATE_LIMIT_RATE', '5')),
+        burst=float(os.getenv('RATE_LIMIT_BURST', '30'))
+    )
+    return RateLimiter(
+        store,
+        group_rate=float(os.getenv('RATE_LIMIT_GROUP_RATE', '10')),
+        group_burst=float(os.getenv('RATE_LIMIT_GROUP_BURST', '60'))
+    )
@@ -0,0 +1,147 @@
+"""
+Read routing for MongoDB replica sets.
+Listing and debts reads can be sent to secondaries (READ_PREFERENCE, e.g.
+secondaryPreferred, with READ_MAX_STALENESS_SECONDS bounding how far behind
+a secondary may be) to take read load off the primary. Successful writes
+answer with an X-Causal-Token holding the operation and cluster time the
+server returned for the request's own writes; a client that sends the
+token back has its reads run in a causally consistent session, so
+whichever member serves them waits until it has applied that point first
+(read-your-writes). While reads are routed, writes and reads use majority
+concerns, so no member serves, and no token points at, a write that could
+still be rolled back.
+"""
+import base64
+import os
+from contextlib import contextmanager
+import bson
+from bson.timestamp import Timestamp
+from flask import g, has_app_context
+from pymongo import monitoring
+from pymongo.read_preferences import PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+CAUSAL_TOKEN_HEADER = 'X-Causal-Token'
+READ_PREFERENCES = {
+    'primarypreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondarypreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+# Smallest maxStalenessSeconds servers accept; -1 means no bound
+MIN_MAX_STALENESS_SECONDS = 90
+MAX_TOKEN_LENGTH = 512
+# Commands whose reply times a causal token must cover
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify', 'commitTransaction'}
+
+
+def encode_token(operation_time, cluster_time):
+    """Opaque header value for a session's operation and (signed) cluster time"""
+    raw = bson.encode({'o': operation_time, 'c': cluster_time})
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(value):
+    """{'o': Timestamp, 'c': $clusterTime document}; ValueError if malformed"""
+    if not value or len(value) > MAX_TOKEN_LENGTH:
+        raise ValueError('Invalid causal token')
+    try:
+        token = bson.decode(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    except Exception:
+        raise ValueError('Invalid causal token')
+    operation_time = token.get('o')
+    cluster_time = token.get('c')
+    if not isinstance(operation_time, Timestamp) or not isinstance(cluster_time, dict):
+        raise ValueError('Invalid causal token')
+    # Servers reject an afterClusterTime beyond the gossiped cluster time
+    if not isinstance(cluster_time.get('clusterTime'), Timestamp) or operation_time > cluster_time['clusterTime']:
+        raise ValueError('Invalid causal token')
+    return token
+
+
+def request_token():
+    """Decoded causal token sent with the current request, or None"""
+    return g.get('causal_token')
+
+
+def routing_enabled():
+    return os.getenv('READ_PREFERENCE', 'primary').strip().lower() != 'primary'
+
+
+class WriteTimes(monitoring.CommandListener):
+    """
+    Keeps the latest operationTime and $clusterTime the server returned for
+    the current request's writes (the values its sessions advance to).
+    Listeners run on the thread that issued the command.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name not in WRITE_COMMANDS or not has_app_context():
+            return
+        operation_time = event.reply.get('operationTime')
+        cluster_time = event.reply.get('$clusterTime')
+        if operation_time is None or cluster_time is None:
+            return
+        latest = g.get('causal_write')
+        if latest is None or operation_time >= latest[0]:
+            g.causal_write = (operation_time, cluster_time)
+
+    def failed(self, event):
+        pass
+
+
+def client_options():
+    """Extra MongoClient options while reads are routed to secondaries"""
+    if not routing_enabled():
+        return {}
+    return {'w': 'majority', 'readConcernLevel': 'majority', 'event_listeners': [WriteTimes()]}
+
+
+class ReadRouter:
+    """Read preference for routed reads plus causal token issue and replay"""
+
+    def __init__(self, read_preference):
+        self.read_preference = read_preference
+
+    def routed(self, db):
+        """`db` with reads going to the configured members"""
+        return db.with_options(read_preference=self.read_preference)
+
+    def issue_token(self):
+        """
+        Token covering the current request's writes, from the times the
+        server returned for them. None if nothing was written or the
+        deployment has no cluster times (standalone servers).
+        """
+        latest = g.get('causal_write')
+        if latest is None:
+            return None
+        return encode_token(*latest)
+
+    @contextmanager
+    def session(self, db, token):
+        """Causally consistent session that starts after `token`, or None"""
+        if token is None:
+            yield None
+            return
+        with db.client.start_session(causal_consistency=True) as session:
+            session.advance_cluster_time(token['c'])
+            session.advance_operation_time(token['o'])
+            yield session
+
+
+def create_read_router():
+    """ReadRouter from READ_PREFERENCE, or None when reads stay on the primary"""
+    if not routing_enabled():
+        return None
+    name = os.getenv('READ_PREFERENCE').strip()
+    mode = READ_PREFERENCES.get(name.lower())
+    if mode is None:
+        raise ValueError(f'Unknown READ_PREFERENCE: {name}')
+
+    max_staleness = int(os.getenv('READ_MAX_STALENESS_SECONDS', str(MIN_MAX_STALENESS_SECONDS)))
+    if max_staleness != -1 and max_staleness < MIN_MAX_STALENESS_SECONDS:
+        raise ValueError(f'READ_MAX_STALENESS_SECONDS must be -1 or at least {MIN_MAX_STALENESS_SECONDS}')
+    return ReadRouter(mode(max_staleness=max_staleness))
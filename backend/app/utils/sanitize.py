@@ -1,7 +1,13 @@
 """Input sanitization utilities for security"""
 import re
+from datetime import datetime, timezone
 from typing import Any, Optional
 
+# Patterns are compiled once at import, not on every call
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+GROUP_CODE_PATTERN = re.compile(r'^[a-f0-9]{6}$')
+EPOCH_PATTERN = re.compile(r'^\d+(\.\d+)?$')
+
 def sanitize_string(value: Any, max_length: int = 500) -> str:
     """Sanitize string input by stripping whitespace and limiting length"""
     if not isinstance(value, str):
@@ -24,8 +30,7 @@ def sanitize_email(email: Any) -> Optional[str]:
     email = email.strip().lower()
     
     # Basic email validation
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(email_pattern, email) or len(email) > 254:
+    if len(email) > 254 or not EMAIL_PATTERN.match(email):
         return None
     
     return email
@@ -53,4 +58,21 @@ def validate_group_code(code: Any) -> bool:
     if not isinstance(code, str):
         return False
     
-    return bool(re.match(r'^[a-f0-9]{6}$', code))
+    return bool(GROUP_CODE_PATTERN.match(code))
+
+def sanitize_timestamp(value: Any) -> Optional[datetime]:
+    """Parse ISO 8601 or epoch seconds into a naive UTC datetime"""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    
+    value = value.strip()
+    try:
+        if EPOCH_PATTERN.match(value):
+            return datetime.fromtimestamp(float(value), tz=timezone.utc).replace(tzinfo=None)
+        parsed = datetime.fromisoformat(value)
+    except (ValueError, OverflowError, OSError):
+        return None
+    
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
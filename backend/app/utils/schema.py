@@ -0,0 +1,190 @@
+"""
+Declarative request body schemas.
+Each endpoint declares its body shape once at import time; the schema is
+compiled into a tuple of per-field checkers (closures over precompiled
+patterns and limits) that return cleaned values plus structured field
+errors. validate_many() checks a list of rows in one pass for bulk
+endpoints.
+"""
+import re
+from app.utils.sanitize import sanitize_string, sanitize_email, sanitize_amount, sanitize_list
+from app.utils.money import rupees_to_paisa, validate_amount_paisa
+
+
+class Field:
+    """Base field: `message` is the error reported when the value is invalid"""
+
+    def __init__(self, required=True, message=None):
+        self.required = required
+        self.message = message
+
+    def compile(self, name):
+        """Return check(raw) -> (value, error_message_or_None)"""
+        raise NotImplementedError
+
+
+class String(Field):
+    """Stripped string; longer than max_length is cut, or rejected with truncate=False"""
+
+    def __init__(self, max_length=500, pattern=None, truncate=True, **kwargs):
+        super().__init__(**kwargs)
+        self.max_length = max_length
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.truncate = truncate
+
+    def compile(self, name):
+        max_length = self.max_length
+        truncate = self.truncate
+        match = self.pattern.match if self.pattern is not None else None
+        required = self.required
+        message = self.message or f'{name} is required'
+        too_long = f'{name} must be at most {max_length} characters'
+
+        def check(raw):
+            if raw is None or raw == '':
+                return None, (message if required else None)
+            if max_length and not truncate:
+                value = raw.strip() if isinstance(raw, str) else str(raw)
+                if len(value) > max_length:
+                    return None, too_long
+            elif max_length:
+                value = sanitize_string(raw, max_length=max_length)
+            else:
+                value = raw.strip() if isinstance(raw, str) else str(raw)
+            if not value:
+                return None, (message if required else None)
+            if match is not None and not match(value):
+                return None, message
+            return value, None
+        return check
+
+
+class Email(Field):
+    def compile(self, name):
+        required = self.required
+        message = self.message or f'Valid {name} is required'
+
+        def check(raw):
+            value = sanitize_email(raw)
+            if value is None and (required or raw):
+                return None, message
+            return value, None
+        return check
+
+
+class Amount(Field):
+    """Positive rupee amount as float, rounded to paisa"""
+
+    def compile(self, name):
+        message = self.message or f'Valid {name} is required'
+
+        def check(raw):
+            value = sanitize_amount(raw)
+            if value is None:
+                return None, message
+            return value, None
+        return check
+
+
+class Paisa(Field):
+    """Rupee amount converted to validated integer paisa"""
+
+    def compile(self, name):
+        message = self.message
+
+        def check(raw):
+            try:
+                value = rupees_to_paisa(raw)
+                validate_amount_paisa(value)
+            except (TypeError, ValueError) as e:
+                return None, message or str(e)
+            return value, None
+        return check
+
+
+class StringList(Field):
+    def __init__(self, max_items=100, item_max_length=500, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+        self.item_max_length = item_max_length
+
+    def compile(self, name):
+        max_items = self.max_items
+        item_max_length = self.item_max_length
+        required = self.required
+        message = self.message or f'At least one {name} item is required'
+
+        def check(raw):
+            items = [
+                sanitize_string(item, max_length=item_max_length)
+                for item in sanitize_list(raw, max_items=max_items) if item
+            ]
+            items = [item for item in items if item]
+            if not items and required:
+                return None, message
+            return items, None
+        return check
+
+
+class Schema:
+    def __init__(self, **fields):
+        self.fields = fields
+        self._checks = tuple((name, field.compile(name)) for name, field in fields.items())
+
+    def validate(self, data):
+        """
+        Returns (clean, errors). `clean` holds every declared field (None when
+        absent and optional); `errors` maps field name to message.
+        """
+        if not isinstance(data, dict):
+            return None, {'_body': 'Request body is required'}
+        clean = {}
+        errors = {}
+        get = data.get
+        for name, check in self._checks:
+            value, error = check(get(name))
+            if error is not None:
+                errors[name] = error
+            else:
+                clean[name] = value
+        return clean, errors
+
+    def validate_many(self, rows):
+        """
+        Validate a list of rows in one pass.
+        Returns (valid, invalid): valid is a list of (index, clean) and
+        invalid a list of {'index', 'error', 'fields'} dicts.
+        """
+        checks = self._checks
+        valid = []
+        invalid = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                invalid.append({'index': index, 'error': 'Row must be an object', 'fields': {}})
+                continue
+            clean = {}
+            errors = None
+            get = row.get
+            for name, check in checks:
+                value, error = check(get(name))
+                if error is not None:
+                    if errors is None:
+                        errors = {}
+                    errors[name] = error
+                else:
+                    clean[name] = value
+            if errors:
+                invalid.append({'index': index, 'error': first_error(errors), 'fields': errors})
+            else:
+                valid.append((index, clean))
+        return valid, invalid
+
+
+def first_error(errors):
+    """First error message in declaration order"""
+    return next(iter(errors.values()))
+
+
+def error_response(errors):
+    """Standard 400 body for schema failures"""
+    return {'success': False, 'error': first_error(errors), 'fields': errors}
@@ -0,0 +1,76 @@
+"""
+Lightweight request phase timing.
+Code wraps phases in `with span('name'):`; durations are collected per
+request and emitted as a Server-Timing header. Outside a timed request
+span() is a no-op, so utilities can use it unconditionally.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_spans = ContextVar('easyxpense_spans', default=None)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block under `name` (repeated names accumulate)"""
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def start_timing():
+    """Begin collecting spans for the current request"""
+    _spans.set({})
+
+
+def finish_timing():
+    """Stop collecting and return {phase: duration_ms} (empty if not started)"""
+    spans = _spans.get()
+    _spans.set(None)
+    return spans or {}
+
+
+def server_timing_header(spans, total_ms):
+    """Format spans as a Server-Timing header value"""
+    parts = [f'{name};dur={duration:.2f}' for name, duration in spans.items()]
+    parts.append(f'total;dur={total_ms:.2f}')
+    return ', '.join(parts)
+
+
+class PhaseStats:
+    """Process-wide aggregates of phase durations per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint, spans, total_ms):
+        with self._lock:
+            for name, duration in list(spans.items()) + [('total', total_ms)]:
+                key = (endpoint, name)
+                stat = self._stats.get(key)
+                if stat is None:
+                    stat = self._stats[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+                stat['count'] += 1
+                stat['total_ms'] += duration
+                if duration > stat['max_ms']:
+                    stat['max_ms'] = duration
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for (endpoint, name), stat in self._stats.items():
+                result.setdefault(endpoint, {})[name] = {
+                    'count': stat['count'],
+                    'avg_ms': round(stat['total_ms'] / stat['count'], 3),
+                    'max_ms': round(stat['max_ms'], 3)
+                }
+            return result
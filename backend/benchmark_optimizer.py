@@ -0,0 +1,71 @@
+"""
+Settlement optimizer benchmark.
+
+Builds synthetic groups where people split expenses within small circles
+of friends (a sparse who-shared-with-whom graph) and compares the greedy
+and constrained strategies on run time, number of transfers, total money
+moved and transfers between people who never shared an expense.
+
+Usage: python benchmark_optimizer.py [--sizes 50,500,2000] [--seed 7]
+"""
+import argparse
+import random
+import time
+from app.utils.money import split_equally
+from app.utils.debt_optimizer import calculate_net_balances, shared_edges, STRATEGIES
+
+
+def synthetic_group(size, rng, circle_size=8, expenses_per_person=4):
+    """Expenses among overlapping circles of friends"""
+    people = [f'member{i}' for i in range(size)]
+    expenses = []
+    for _ in range(size * expenses_per_person):
+        start = rng.randrange(size)
+        circle = [people[(start + offset) % size] for offset in range(circle_size)]
+        group = rng.sample(circle, rng.randint(2, min(5, circle_size)))
+        amount_paisa = rng.randint(100, 500000)
+        shares = split_equally(amount_paisa, len(group))
+        expenses.append({
+            'payer': group[0],
+            'amount_paisa': amount_paisa,
+            'participant_shares': [{'name': name, 'share_paisa': share} for name, share in zip(group, shares)]
+        })
+    return expenses
+
+
+def measure(strategy, balances, edges):
+    started = time.perf_counter()
+    settlements = STRATEGIES[strategy](balances, edges)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    off_graph = sum(
+        1 for s in settlements
+        if (s['from'], s['to']) not in edges and (s['to'], s['from']) not in edges
+    )
+    return {
+        'ms': elapsed_ms,
+        'transfers': len(settlements),
+        'moved': sum(s['amount_paisa'] for s in settlements) / 100,
+        'off_graph': off_graph
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense settlement optimizer benchmark')
+    parser.add_argument('--sizes', default='50,500,2000', help='comma-separated group sizes')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'members':>8} {'edges':>7} {'strategy':>12} {'ms':>9} {'transfers':>10} {'moved (INR)':>14} {'off-graph':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        expenses = synthetic_group(size, rng)
+        balances = calculate_net_balances(expenses, [])
+        edges = shared_edges(expenses, [])
+        for strategy in ('greedy', 'constrained'):
+            result = measure(strategy, balances, edges)
+            print(f"{size:>8} {len(edges):>7} {strategy:>12} {result['ms']:>9.1f} {result['transfers']:>10} "
+                  f"{result['moved']:>14,.2f} {result['off_graph']:>10}")
+
+
+if __name__ == '__main__':
+    main()
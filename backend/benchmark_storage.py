@@ -0,0 +1,164 @@
+"""
+Storage backend check and benchmark.
+
+Runs the same workload through the HTTP API against a storage backend
+(create a group, add members, record expenses and settlements, list,
+compute debts, edit and delete) and times each step. Every step also
+checks its result: balances must net to zero and match a recomputation
+from the listed documents, list ETags must answer 304 until a write, and
+edits and deletes must show up in balances. A failed check exits non-zero.
+
+Usage: python benchmark_storage.py [--backend sqlite|mongo] [--expenses 2000] [--seed 7]
+(mongo uses MONGO_URI; sqlite uses a temporary database file)
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from app.utils.debt_optimizer import calculate_net_balances
+from app.utils.money import rupees_to_paisa
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def build_client(backend):
+    os.environ['STORAGE_BACKEND'] = backend
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('LOAD_SHEDDING_ENABLED', 'false')
+    if backend == 'sqlite':
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='easyxpense-'), 'bench.db')
+    from app import create_app
+    from app.utils.database import connect_db
+    app = create_app()
+    if backend == 'mongo':
+        connect_db(app)
+    return app.test_client()
+
+
+def listed_balances(client, group_id):
+    """Balances recomputed from the listing endpoints"""
+    expenses = client.get(f'/api/expenses?group_id={group_id}').get_json()
+    settlements = client.get(f'/api/settlements?group_id={group_id}').get_json()
+    return {
+        name: paisa
+        for name, paisa in calculate_net_balances(expenses, settlements).items()
+        if paisa
+    }
+
+
+def debt_balances(client, group_id):
+    body = client.get(f'/api/debts?group_id={group_id}').get_json()
+    return {name: rupees_to_paisa(amount) for name, amount in body['balances'].items() if amount}
+
+
+def run(client, expense_count, rng):
+    timings = {}
+
+    def timed(step, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[step] = (time.perf_counter() - start) * 1000
+        return result
+
+    response = client.post('/api/groups', json={'name': 'Benchmark'})
+    check(response.status_code == 201, f'create group: {response.status_code}')
+    group_id = response.get_json()['data']['_id']
+
+    people = [f'member{i}' for i in range(40)]
+    response = timed('add members (bulk)', lambda: client.post('/api/friends/bulk', json={
+        'group_id': group_id,
+        'friends': [{'name': name, 'email': f'{name}@example.com'} for name in people]
+    }))
+    check(len(response.get_json()['data']['inserted']) == len(people), 'bulk insert count')
+    response = client.post('/api/friends', json={'name': 'member0', 'email': 'member0@example.com', 'group_id': group_id})
+    check(response.status_code == 400, 'duplicate friend rejected')
+
+    def add_expenses():
+        ids = []
+        for _ in range(expense_count):
+            participants = rng.sample(people, rng.randint(2, 6))
+            response = client.post('/api/expenses', json={
+                'description': 'Dinner',
+                'amount': round(rng.uniform(10, 5000), 2),
+                'payer': participants[0],
+                'participants': participants,
+                'group_id': group_id
+            })
+            check(response.status_code == 201, f'create expense: {response.status_code}')
+            ids.append(response.get_json()['data']['_id'])
+        return ids
+    expense_ids = timed(f'create {expense_count} expenses', add_expenses)
+
+    def add_settlements():
+        for _ in range(expense_count // 10):
+            from_user, to_user = rng.sample(people, 2)
+            response = client.post('/api/settlements', json={
+                'fromUser': from_user, 'toUser': to_user, 'amount': rng.randint(1, 100000), 'group_id': group_id
+            })
+            check(response.status_code == 201, f'create settlement: {response.status_code}')
+    timed(f'create {expense_count // 10} settlements', add_settlements)
+
+    expenses = timed('list expenses', lambda: client.get(f'/api/expenses?group_id={group_id}'))
+    check(len(expenses.get_json()) == expense_count, 'listed expense count')
+    etag = expenses.headers['ETag']
+    response = timed('list expenses (304)', lambda: client.get(
+        f'/api/expenses?group_id={group_id}', headers={'If-None-Match': etag}
+    ))
+    check(response.status_code == 304, 'unchanged list answers 304')
+
+    balances = timed('debts (group)', lambda: debt_balances(client, group_id))
+    check(sum(balances.values()) == 0, 'balances net to zero')
+    check(balances == listed_balances(client, group_id), 'debts match the listed documents')
+    timed('debts (constrained)', lambda: client.get(f'/api/debts?group_id={group_id}&strategy=constrained'))
+    timed('debts (all groups)', lambda: client.get('/api/debts'))
+
+    target = rng.choice(expense_ids)
+    response = timed('edit expense', lambda: client.put(f'/api/expenses/{target}', json={
+        'description': 'Corrected', 'amount': 123.45, 'payer': people[0], 'participants': people[:3]
+    }))
+    check(response.status_code == 200, f'edit expense: {response.status_code}')
+    response = client.get(f'/api/expenses?group_id={group_id}', headers={'If-None-Match': etag})
+    check(response.status_code == 200, 'edit changes the list ETag')
+    check(debt_balances(client, group_id) == listed_balances(client, group_id), 'balances after edit')
+
+    response = timed('delete expense', lambda: client.delete(f'/api/expenses/{target}'))
+    check(response.status_code == 200, f'delete expense: {response.status_code}')
+    check(client.delete(f'/api/expenses/{target}').status_code == 404, 'second delete is 404')
+    check(debt_balances(client, group_id) == listed_balances(client, group_id), 'balances after delete')
+
+    response = timed('delete group', lambda: client.delete(f'/api/groups/{group_id}'))
+    check(response.status_code == 200, 'delete group')
+    check(client.get(f'/api/expenses?group_id={group_id}').get_json() == [], 'group data removed')
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense storage backend benchmark')
+    parser.add_argument('--backend', default='sqlite', choices=['sqlite', 'mongo'])
+    parser.add_argument('--expenses', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    client = build_client(args.backend)
+    try:
+        timings = run(client, args.expenses, random.Random(args.seed))
+    except CheckFailed as e:
+        print(f'FAILED ({args.backend}): {e}')
+        sys.exit(1)
+
+    print(f'{"step":>32} {"ms":>10}   backend={args.backend}')
+    for step, ms in timings.items():
+        print(f'{step:>32} {ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Balance checkpoint job.
+
+Writes the periodic balance snapshots that point-in-time debts
+(`/api/debts?as_of=`) start from. Requests only read checkpoints; expense
+edits and deletes drop the ones they affect, so run this periodically.
+A group written to while its checkpoints are built keeps none of the new
+ones and is picked up by the next run.
+
+Usage: python build_checkpoints.py [--group GROUP_ID]
+"""
+import argparse
+from app import create_app
+from app.utils.database import connect_db
+from app.models.checkpoint import BalanceCheckpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense balance checkpoints')
+    parser.add_argument('--group', help='build checkpoints for a single group (default: all groups)')
+    args = parser.parse_args()
+
+    app = create_app()
+    db = connect_db(app)
+    checkpoints = BalanceCheckpoint(db)
+
+    if args.group:
+        results = {args.group: checkpoints.ensure_checkpoints(args.group)}
+    else:
+        results = checkpoints.ensure_all()
+
+    for group_id, created in results.items():
+        if created is None:
+            print(f'{group_id}: changed during the build, skipped (run again)')
+        else:
+            print(f'{group_id}: {created} checkpoints created')
+
+
+if __name__ == '__main__':
+    main()
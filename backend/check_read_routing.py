@@ -0,0 +1,116 @@
+"""
+Read routing check for a MongoDB replica set.
+
+Writes through the HTTP API and reads straight back with the returned
+X-Causal-Token while reads are routed by READ_PREFERENCE (secondaryPreferred
+unless set). Every read must include the write just before it
+(read-your-writes), and the report shows how many read commands the primary
+served compared with the secondaries. With --no-token reads are sent
+without the token; stale reads are then counted instead of failing.
+
+Local three-member replica set:
+    mkdir -p /tmp/rs0-0 /tmp/rs0-1 /tmp/rs0-2
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 --fork --logpath /tmp/rs0-0.log
+    (likewise on ports 27018 and 27019)
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"},
+        {_id: 2, host: "localhost:27019"}]})'
+    MONGO_URI='mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0' \\
+        python check_read_routing.py
+
+Usage: python check_read_routing.py [--rounds 200] [--no-token]
+"""
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+from pymongo import monitoring
+
+READ_COMMANDS = {'find', 'aggregate', 'count', 'getMore'}
+
+
+class ReadCounter(monitoring.CommandListener):
+    """Read commands per server address"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_address = Counter()
+
+    def started(self, event):
+        if event.command_name in READ_COMMANDS:
+            with self._lock:
+                self.by_address[event.connection_id] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def build_app():
+    os.environ['STORAGE_BACKEND'] = 'mongo'
+    os.environ.setdefault('READ_PREFERENCE', 'secondaryPreferred')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('LOAD_SHEDDING_ENABLED', 'false')
+    from app import create_app
+    from app.utils.database import connect_db
+    app = create_app()
+    connect_db(app)
+    return app
+
+
+def run(app, rounds, send_token):
+    client = app.test_client()
+    response = client.post('/api/groups', json={'name': 'Read routing check'})
+    group_id = response.get_json()['data']['_id']
+    token = response.headers.get('X-Causal-Token')
+    if send_token and token is None:
+        print('No causal token issued: READ_PREFERENCE is primary or the server is not a replica set')
+        return False
+
+    client.post('/api/friends/bulk', json={'group_id': group_id, 'friends': [
+        {'name': 'A', 'email': 'a@example.com'}, {'name': 'B', 'email': 'b@example.com'}
+    ]})
+    stale = 0
+    try:
+        for i in range(rounds):
+            response = client.post('/api/expenses', json={
+                'description': f'Round {i}', 'amount': 10, 'payer': 'A',
+                'participants': ['A', 'B'], 'group_id': group_id
+            })
+            headers = {'X-Causal-Token': response.headers['X-Causal-Token']} if send_token else {}
+            expenses = client.get(f'/api/expenses?group_id={group_id}', headers=headers).get_json()
+            debts = client.get(f'/api/debts?group_id={group_id}', headers=headers).get_json()
+            if len(expenses) != i + 1 or debts['balances'].get('A') != 5.0 * (i + 1):
+                stale += 1
+    finally:
+        client.delete(f'/api/groups/{group_id}')
+
+    print(f'rounds: {rounds}, reads missing the preceding write: {stale}')
+    return stale == 0 or not send_token
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense read routing check')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--no-token', action='store_true', help='read without the causal token')
+    args = parser.parse_args()
+
+    counter = ReadCounter()
+    monitoring.register(counter)
+    app = build_app()
+    ok = run(app, args.rounds, not args.no_token)
+
+    primary = app.db_client.primary
+    total = sum(counter.by_address.values()) or 1
+    print(f'read preference: {os.environ["READ_PREFERENCE"]}')
+    for address, count in counter.by_address.most_common():
+        role = 'primary' if address == primary else 'secondary'
+        print(f'{address[0]}:{address[1]:<6} {role:<10} {count:>6} reads ({count * 100 / total:.0f}%)')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
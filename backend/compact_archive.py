@@ -0,0 +1,40 @@
+"""
+Archival compaction job.
+
+Moves fully settled history (everything up to the latest point where all
+balances in a group were zero) into the archive collections.
+
+Usage: python compact_archive.py [--group GROUP_ID] [--min-age-days 30]
+"""
+import argparse
+from app import create_app
+from app.utils.database import connect_db
+from app.models.archive import LedgerArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense archival compaction')
+    parser.add_argument('--group', help='compact a single group (default: all groups)')
+    parser.add_argument('--min-age-days', type=int, default=30,
+                        help='only archive history older than this many days')
+    args = parser.parse_args()
+
+    app = create_app()
+    db = connect_db(app)
+    archive = LedgerArchive(db)
+
+    if args.group:
+        results = {args.group: archive.compact(args.group, args.min_age_days)}
+    else:
+        results = archive.compact_all(args.min_age_days)
+
+    for group_id, summary in results.items():
+        if summary is None:
+            print(f'{group_id}: nothing to archive')
+        else:
+            print(f"{group_id}: archived until {summary['archived_until'].isoformat()} "
+                  f"({summary['expense_count']} expenses, {summary['settlement_count']} settlements in archive)")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,11 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.getenv('GUNICORN_WORKERS', '2'))
-worker_class = 'sync'
+# Threaded workers so SSE streams (/api/groups/<id>/events, held open for up
+# to SSE_MAX_STREAM_SECONDS) do not tie up a whole worker; the events route
+# answers 503 on single-threaded workers (sync, or gthread with 1 thread)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
@@ -16,6 +20,10 @@ timeout = 120
 graceful_timeout = 30
 keepalive = 5
 
+# Import Flask, pymongo and all blueprints once in the master and share the
+# loaded code with workers via fork; MongoDB clients are opened after fork
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
 # Logging
 accesslog = '-'
 errorlog = '-'
@@ -37,3 +45,16 @@ tmp_upload_dir = None
 limit_request_line = 4096
 limit_request_fields = 100
 limit_request_field_size = 8190
+
+# Server hooks
+def post_fork(server, worker):
+    """Open this worker's MongoDB client before it accepts requests"""
+    from app import reset_startup_clock
+    from app.utils.database import connect_db
+    app = worker.app.wsgi()
+    # The preloaded app's clock started in the master, before the fork
+    reset_startup_clock(app)
+    connect_db(app)
+
+def when_ready(server):
+    server.log.info('Master ready, spawning workers (preload_app=%s)', preload_app)
@@ -0,0 +1,39 @@
+"""
+Ledger schema migration (v1 -> compact v2).
+
+Converts expenses and settlements, including archived ones, in batches
+while the app keeps running. Safe to interrupt and rerun; progress is kept
+in the `migrations` collection. Deploy the v2-aware readers everywhere and
+set LEDGER_SCHEMA_VERSION=2 before running it, so no new v1 documents appear
+behind it.
+
+Usage: python migrate_ledger.py [--batch-size 500] [--pause 0.05] [--restart] [--status]
+"""
+import argparse
+from app import create_app
+from app.utils.database import connect_db
+from app.models.migration import LedgerMigration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense ledger schema migration')
+    parser.add_argument('--batch-size', type=int, default=500, help='documents per bulk write')
+    parser.add_argument('--pause', type=float, default=0.05, help='seconds to sleep between batches')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and rescan from the start')
+    parser.add_argument('--status', action='store_true', help='only report documents still in v1')
+    args = parser.parse_args()
+
+    app = create_app()
+    db = connect_db(app)
+    migration = LedgerMigration(db, batch_size=args.batch_size, pause=args.pause)
+
+    if not args.status:
+        for collection, migrated in migration.run(restart=args.restart).items():
+            print(f'{collection}: migrated {migrated}')
+
+    for collection, remaining in migration.remaining().items():
+        print(f'{collection}: {remaining} documents still in v1')
+
+
+if __name__ == '__main__':
+    main()
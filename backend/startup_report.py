@@ -0,0 +1,75 @@
+"""
+Startup report: where does cold-start time go?
+
+Runs app creation in a fresh interpreter with `python -X importtime` and
+prints the slowest imports plus the measured create_app() duration.
+
+Usage: python startup_report.py [--top 25]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+PROBE = (
+    'import time; t = time.perf_counter(); '
+    'from app import create_app; app = create_app(); '
+    'print("create_app_ms=%.2f" % ((time.perf_counter() - t) * 1000)); '
+    'print("app_ready_ms=%s" % app.startup_metrics["app_ready_ms"])'
+)
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (self_us, cumulative_us, module) tuples"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            _, fields = line.split(':', 1)
+            self_us, cumulative_us, module = fields.split('|', 2)
+            rows.append((int(self_us), int(cumulative_us), module.rstrip()))
+        except ValueError:
+            continue
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EasyXpense startup report')
+    parser.add_argument('--top', type=int, default=25, help='number of imports to show')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The connection is deferred, so any URI lets create_app() run offline
+    env.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+    env['DB_CONNECT_ON_START'] = 'false'
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        sys.exit(result.returncode)
+
+    rows = parse_importtime(result.stderr)
+    top_level = [r for r in rows if len(r[2]) - len(r[2].lstrip()) == 1]
+    total_us = sum(r[1] for r in top_level)
+
+    print(f'Imports: {len(rows)} modules, {total_us / 1000:.1f}ms cumulative')
+    for line in result.stdout.splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            print(f'{key}: {value}')
+
+    print(f'\nTop {args.top} imports by cumulative time:')
+    print(f'{"cumulative ms":>14} {"self ms":>9}  module')
+    for self_us, cumulative_us, module in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f'{cumulative_us / 1000:14.2f} {self_us / 1000:9.2f}  {module.strip()}')
+
+
+if __name__ == '__main__':
+    main()
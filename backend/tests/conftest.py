@@ -0,0 +1,78 @@
+"""
+Shared fixtures: every repository contract test runs against each storage
+backend (MongoDB through mongomock writing v1 or compact v2 documents, and
+embedded SQLite); route tests use an app on embedded SQLite.
+"""
+import os
+import sys
+import pytest
+from pymongo.errors import OperationFailure
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Apps created outside the fixtures below must not share a rate limit budget
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+from app import create_app
+from app.models.friend import Friend
+from app.models.indexes import MODELS
+from app.models.mongo_repository import MongoRepository
+from app.models.sqlite_repository import SQLiteRepository
+from app.utils.database import ILLEGAL_OPERATION
+
+
+def _standalone_session(*args, **kwargs):
+    # mongomock has no sessions; answer like a standalone mongod
+    raise OperationFailure('Transaction numbers are only allowed on a replica set member or mongos', ILLEGAL_OPERATION)
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    monkeypatch.setattr(mongomock.MongoClient, 'start_session', _standalone_session, raising=False)
+    # Each test gets a fresh database, so indexes must be created again
+    for model in MODELS:
+        monkeypatch.setattr(model, '_indexed', False)
+    monkeypatch.setattr(Friend, 'index_error', None)
+    return mongomock.MongoClient()['EasyXpense']
+
+
+@pytest.fixture(params=['mongo', 'mongo-v2', 'sqlite'])
+def repo(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        return SQLiteRepository(str(tmp_path / 'ledger.db'))
+    if request.param == 'mongo-v2':
+        monkeypatch.setenv('LEDGER_SCHEMA_VERSION', '2')
+    db = request.getfixturevalue('mongo_db')
+    return MongoRepository(lambda: db)
+
+
+def _app_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    monkeypatch.setenv('RATE_LIMIT_DB', str(tmp_path / 'ratelimit.db'))
+    monkeypatch.setenv('OPTIMIZER_POOL_ENABLED', 'false')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    _app_env(tmp_path, monkeypatch)
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'app.db'))
+    return create_app()
+
+
+@pytest.fixture
+def mongo_app(mongo_db, tmp_path, monkeypatch):
+    """App on MongoDB (mongomock), as a worker that has already connected"""
+    _app_env(tmp_path, monkeypatch)
+    monkeypatch.setenv('STORAGE_BACKEND', 'mongo')
+    monkeypatch.setenv('MONGO_URI', 'mongodb://localhost:27017')
+    app = create_app()
+    app.db = mongo_db
+    app.db_pid = os.getpid()
+    app.db_status['state'] = 'ready'
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,88 @@
+"""
+Route-level behaviour: request admission and HTTP caching.
+"""
+from app.utils.rate_limit import create_rate_limiter
+
+
+def test_rate_limit_keys_on_forwarded_client(app, client, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'true')
+    monkeypatch.setenv('RATE_LIMIT_BURST', '1')
+    app.rate_limiter = create_rate_limiter()
+
+    first = client.get('/api/friends', headers={'X-Forwarded-For': '203.0.113.1'})
+    other = client.get('/api/friends', headers={'X-Forwarded-For': '203.0.113.2'})
+    again = client.get('/api/friends', headers={'X-Forwarded-For': '203.0.113.1'})
+
+    assert first.status_code == 200
+    assert other.status_code == 200
+    assert again.status_code == 429
+    assert again.headers['Retry-After']
+
+
+def test_expensive_request_shed_on_last_free_thread(app, client):
+    shedder = app.load_shedder
+    assert shedder.max_in_flight == 3    # 4 gthread threads by default
+    for _ in range(shedder.max_in_flight):
+        shedder.enter()
+
+    shed = client.get('/api/debts')
+    served = client.get('/api/friends')
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == str(shedder.retry_after)
+    assert shed.get_json() == {'error': 'Service overloaded, please retry shortly'}
+    assert served.status_code == 200
+    # Answered requests leave nothing behind
+    assert shedder.in_flight == shedder.max_in_flight
+
+
+def test_legacy_probe_paths_alias_liveness_and_readiness(client):
+    for path in ('/', '/health'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'alive'
+
+    # SQLite is ready as soon as the app starts
+    assert client.get('/api/health').get_json() == client.get('/api/health/ready').get_json()
+
+
+def test_metrics_need_bearer_token(client, monkeypatch):
+    assert client.get('/api/metrics').status_code == 404
+
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    assert client.get('/api/metrics').status_code == 404
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'phases' in response.get_json()
+
+
+def _edit_invalidates_list_etag(client, group_id=None):
+    body = {'description': 'Dinner', 'amount': 90, 'payer': 'Asha', 'participants': ['Asha', 'Ravi']}
+    if group_id:
+        body['group_id'] = group_id
+    url = f'/api/expenses?group_id={group_id}' if group_id else '/api/expenses'
+    expense_id = client.post('/api/expenses', json=body).get_json()['data']['_id']
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.put(f'/api/expenses/{expense_id}', json=dict(body, description='Edited')).status_code == 200
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]['description'] == 'Edited'
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_edit_invalidates_list_etag(client):
+    _edit_invalidates_list_etag(client)
+
+
+def test_edit_invalidates_list_etag_on_mongo(mongo_app):
+    client = mongo_app.test_client()
+    group_id = client.post('/api/groups', json={'name': 'Trip'}).get_json()['data']['_id']
+    for name in ('Asha', 'Ravi'):
+        client.post('/api/friends', json={'name': name, 'email': f'{name.lower()}@example.com', 'group_id': group_id})
+
+    _edit_invalidates_list_etag(client, group_id)
+    _edit_invalidates_list_etag(client)
@@ -0,0 +1,99 @@
+"""
+Ledger compaction on MongoDB: settled history moves to the archive
+collections without changing balances or losing concurrent edits.
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.archive import LedgerArchive
+from app.models.mongo_repository import MongoRepository
+
+
+@pytest.fixture
+def repo(mongo_db):
+    return MongoRepository(lambda: mongo_db)
+
+
+def _settled_group(repo, days_ago=40):
+    group_id = str(repo.create_group('Trip')[0])
+    for name in ('Asha', 'Ravi'):
+        repo.add_friend(name, f'{name.lower()}@example.com', group_id)
+    repo.create_expense('Dinner', 90, 'Asha', ['Asha', 'Ravi'], group_id)
+    repo.create_settlement('Ravi', 'Asha', 4500, group_id)
+    old = datetime.utcnow() - timedelta(days=days_ago)
+    repo.db.expenses.update_many({'group_id': group_id}, {'$set': {'date': old}})
+    repo.db.settlements.update_many({'group_id': group_id}, {'$set': {'date': old + timedelta(hours=1)}})
+    return group_id
+
+
+def test_compaction_moves_settled_history(repo):
+    group_id = _settled_group(repo)
+    repo.create_expense('Taxi', 40, 'Ravi', ['Asha', 'Ravi'], group_id)
+    before = repo.group_balances([group_id])
+
+    summary = LedgerArchive(repo.db).compact(group_id)
+
+    assert summary['expense_count'] == 1 and summary['settlement_count'] == 1
+    assert repo.db.expenses.count_documents({'group_id': group_id}) == 1
+    assert repo.db.expenses_archive.count_documents({'group_id': group_id}) == 1
+    assert repo.db.settlements.count_documents({'group_id': group_id}) == 0
+    assert repo.group_balances([group_id]) == before
+
+
+def test_compaction_skips_unsettled_history(repo):
+    group_id = _settled_group(repo)
+    repo.db.settlements.delete_many({'group_id': group_id})
+
+    assert LedgerArchive(repo.db).compact(group_id) is None
+    assert repo.db.expenses_archive.count_documents({}) == 0
+
+
+def test_edit_during_compaction_is_archived(repo, monkeypatch):
+    group_id = _settled_group(repo)
+    copy = LedgerArchive._copy
+
+    def copy_then_edit(self, kind, query, session):
+        copied = copy(self, kind, query, session)
+        if kind == 'expense':
+            # Lands after the copy, before the hot document is deleted
+            repo.db.expenses.update_one({'group_id': group_id}, {'$set': {'description': 'Edited'}})
+        return copied
+    monkeypatch.setattr(LedgerArchive, '_copy', copy_then_edit)
+
+    LedgerArchive(repo.db).compact(group_id)
+
+    assert repo.db.expenses.count_documents({'group_id': group_id}) == 0
+    archived = repo.db.expenses_archive.find_one({'group_id': group_id})
+    assert archived['description'] == 'Edited'
+
+
+def test_expense_moved_out_of_block_during_compaction_stays_hot(repo, monkeypatch):
+    group_id = _settled_group(repo)
+    copy = LedgerArchive._copy
+
+    def copy_then_redate(self, kind, query, session):
+        copied = copy(self, kind, query, session)
+        if kind == 'expense':
+            repo.db.expenses.update_one({'group_id': group_id}, {'$set': {'date': datetime.utcnow()}})
+        return copied
+    monkeypatch.setattr(LedgerArchive, '_copy', copy_then_redate)
+
+    LedgerArchive(repo.db).compact(group_id)
+
+    assert repo.db.expenses.count_documents({'group_id': group_id}) == 1
+    assert repo.db.expenses_archive.count_documents({'group_id': group_id}) == 0
+
+
+def test_delete_during_compaction_drops_archive_copy(repo, monkeypatch):
+    group_id = _settled_group(repo)
+    copy = LedgerArchive._copy
+
+    def copy_then_delete(self, kind, query, session):
+        copied = copy(self, kind, query, session)
+        if kind == 'expense':
+            repo.db.expenses.delete_one({'group_id': group_id})
+        return copied
+    monkeypatch.setattr(LedgerArchive, '_copy', copy_then_delete)
+
+    LedgerArchive(repo.db).compact(group_id)
+
+    assert repo.db.expenses_archive.count_documents({'group_id': group_id}) == 0
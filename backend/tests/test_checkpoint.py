@@ -0,0 +1,65 @@
+"""
+Balance checkpoints on MongoDB: built offline, dropped by expense edits,
+never written by point-in-time reads.
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.checkpoint import BalanceCheckpoint
+from app.models.mongo_repository import MongoRepository
+from app.models.sync import SyncLog
+
+
+@pytest.fixture
+def repo(mongo_db):
+    return MongoRepository(lambda: mongo_db)
+
+
+def _group_with_old_expense(repo, days_ago=20):
+    group_id = str(repo.create_group('Trip')[0])
+    for name in ('Asha', 'Ravi'):
+        repo.add_friend(name, f'{name.lower()}@example.com', group_id)
+    expense_id = repo.create_expense('Dinner', 90, 'Asha', ['Asha', 'Ravi'], group_id)
+    old = datetime.utcnow() - timedelta(days=days_ago)
+    repo.db.expenses.update_many({'group_id': group_id}, {'$set': {'date': old}})
+    return group_id, str(expense_id)
+
+
+def test_balances_as_of_does_not_write_checkpoints(repo):
+    group_id, _ = _group_with_old_expense(repo)
+
+    balances, checkpoint_as_of = BalanceCheckpoint(repo.db).balances_as_of(group_id, datetime.utcnow())
+
+    assert balances == {'Asha': 4500, 'Ravi': -4500}
+    assert checkpoint_as_of is None
+    assert repo.db.balance_checkpoints.count_documents({}) == 0
+
+
+def test_built_checkpoints_serve_reads_until_an_edit_drops_them(repo):
+    group_id, expense_id = _group_with_old_expense(repo)
+    checkpoints = BalanceCheckpoint(repo.db)
+
+    assert checkpoints.ensure_checkpoints(group_id) >= 1
+    balances, checkpoint_as_of = checkpoints.balances_as_of(group_id, datetime.utcnow())
+    assert checkpoint_as_of is not None
+    assert balances == {'Asha': 4500, 'Ravi': -4500}
+
+    repo.update_expense(expense_id, 'Dinner', 60, 'Asha', ['Asha', 'Ravi'], group_id)
+
+    assert repo.db.balance_checkpoints.count_documents({'group_id': group_id}) == 0
+    balances, _ = checkpoints.balances_as_of(group_id, datetime.utcnow())
+    assert balances == {'Asha': 3000, 'Ravi': -3000}
+
+
+def test_checkpoints_built_during_a_write_are_dropped(repo, monkeypatch):
+    group_id, _ = _group_with_old_expense(repo)
+    checkpoints = BalanceCheckpoint(repo.db)
+    load = checkpoints._load
+
+    def load_then_write(*args, **kwargs):
+        loaded = load(*args, **kwargs)
+        SyncLog(repo.db).stamp(group_id, [{}])
+        return loaded
+    monkeypatch.setattr(checkpoints, '_load', load_then_write)
+
+    assert checkpoints.ensure_checkpoints(group_id) is None
+    assert repo.db.balance_checkpoints.count_documents({'group_id': group_id}) == 0
@@ -0,0 +1,51 @@
+"""
+Versioned ledger documents: v1 <-> compact v2 encoding.
+"""
+from app.models.expense import expense_fields
+from app.utils.ledger_schema import (
+    expense_to_v2, expense_to_v1, settlement_to_v2, settlement_to_v1,
+    unnamed_member_ids, add_member_names
+)
+
+NAMES = ['Asha', 'Ravi', 'Meera']
+
+
+def _grouped_expense():
+    expense = expense_fields('Dinner', 100, 'Ravi', ['Asha', 'Ravi', 'Meera'])
+    expense['group_id'] = 'g1'
+    expense['payer_id'] = NAMES.index(expense['payer'])
+    expense['member_ids'] = [NAMES.index(name) for name in expense['participants']]
+    expense['shares'] = [share['share_paisa'] for share in expense['participant_shares']]
+    return expense
+
+
+def test_grouped_v2_expense_stores_ids_only():
+    expense = _grouped_expense()
+    compact = expense_to_v2(expense)
+
+    assert not {'p', 'n'} & set(compact)
+    assert unnamed_member_ids('expense', compact) == [expense['payer_id']] + expense['member_ids']
+    add_member_names('expense', compact, NAMES)
+    assert expense_to_v1(compact) == expense
+
+
+def test_ungrouped_v2_expense_keeps_names():
+    expense = expense_fields('Dinner', 100, 'Ravi', ['Asha', 'Ravi'])
+    compact = expense_to_v2(expense)
+
+    assert compact['p'] == 'Ravi'
+    assert unnamed_member_ids('expense', compact) is None
+    assert expense_to_v1(compact) == expense
+
+
+def test_grouped_v2_settlement_stores_ids_only():
+    settlement = {
+        'fromUser': 'Meera', 'toUser': 'Asha', 'amount_paisa': 2500, 'amount': 25.0,
+        'currency': 'INR', 'group_id': 'g1', 'from_id': 2, 'to_id': 0
+    }
+    compact = settlement_to_v2(settlement)
+
+    assert not {'f', 't'} & set(compact)
+    assert unnamed_member_ids('settlement', compact) == [2, 0]
+    add_member_names('settlement', compact, NAMES)
+    assert settlement_to_v1(compact) == settlement
@@ -0,0 +1,79 @@
+"""
+Online ledger migration to the compact v2 schema on MongoDB.
+"""
+import pytest
+from app.models.migration import LedgerMigration, MIGRATION_ID
+from app.models.mongo_repository import MongoRepository
+
+
+@pytest.fixture
+def repo(mongo_db):
+    return MongoRepository(lambda: mongo_db)
+
+
+def _ledger(repo):
+    group_id = str(repo.create_group('Trip')[0])
+    for name in ('Asha', 'Ravi'):
+        repo.add_friend(name, f'{name.lower()}@example.com', group_id)
+    for amount in (30, 60, 90):
+        repo.create_expense('Dinner', amount, 'Asha', ['Asha', 'Ravi'], group_id)
+    repo.create_settlement('Ravi', 'Asha', 1000, group_id)
+    repo.create_expense('Taxi', 40, 'Ravi', ['Asha', 'Ravi'])
+    return group_id
+
+
+def _listings(repo, group_id):
+    return repo.list_expenses(group_id), repo.list_settlements(group_id), repo.list_expenses(None)
+
+
+def test_migration_keeps_listings_and_converts_everything(repo):
+    group_id = _ledger(repo)
+    before = _listings(repo, group_id)
+
+    results = LedgerMigration(repo.db, batch_size=2).run()
+
+    assert results['expenses'] == 4 and results['settlements'] == 1
+    assert set(LedgerMigration(repo.db).remaining().values()) == {0}
+    assert _listings(repo, group_id) == before
+    grouped = repo.db.expenses.find_one({'group_id': group_id})
+    assert grouped['v'] == 2 and 'description' not in grouped and 'payer' not in grouped
+
+
+def test_interrupted_migration_resumes_after_last_batch(repo, monkeypatch):
+    _ledger(repo)
+    migration = LedgerMigration(repo.db, batch_size=2)
+    convert = migration._convert_batch
+    calls = []
+
+    def fail_second_batch(kind, collection, batch):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise RuntimeError('interrupted')
+        return convert(kind, collection, batch)
+    monkeypatch.setattr(migration, '_convert_batch', fail_second_batch)
+
+    with pytest.raises(RuntimeError):
+        migration.run()
+    assert migration.progress()['migrated'] == {'expenses': 2}
+
+    results = LedgerMigration(repo.db, batch_size=2).run()
+    assert results['expenses'] == 2
+    assert repo.db.migrations.find_one({'_id': MIGRATION_ID})['migrated']['expenses'] == 4
+
+
+def test_document_edited_during_migration_is_not_overwritten(repo, monkeypatch):
+    group_id = _ledger(repo)
+    migration = LedgerMigration(repo.db)
+    convert = migration._convert_batch
+
+    def edit_then_convert(kind, collection, batch):
+        if collection.name == 'expenses':
+            # Lands between the batch read and its conversion
+            collection.update_one({'_id': batch[0]['_id']}, {'$set': {'description': 'Edited'}})
+        return convert(kind, collection, batch)
+    monkeypatch.setattr(migration, '_convert_batch', edit_then_convert)
+
+    migration.run()
+
+    assert 'Edited' in [expense['description'] for expense in repo.list_expenses(group_id)]
+    assert LedgerMigration(repo.db).remaining()['expenses'] == 0
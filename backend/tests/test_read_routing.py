@@ -0,0 +1,39 @@
+"""
+Causal tokens: issued from the times the server returned for the request's
+own writes, and majority concerns while reads are routed.
+"""
+from types import SimpleNamespace
+from bson.timestamp import Timestamp
+from app.utils.read_routing import ReadRouter, WriteTimes, client_options, decode_token
+
+
+def _reply(command_name, seconds):
+    cluster_time = {'clusterTime': Timestamp(seconds, 1), 'signature': {'keyId': 0}}
+    return SimpleNamespace(command_name=command_name,
+                           reply={'ok': 1, 'operationTime': Timestamp(seconds, 1), '$clusterTime': cluster_time})
+
+
+def test_token_covers_latest_write_of_the_request(app):
+    listener = WriteTimes()
+    router = ReadRouter(None)
+    with app.test_request_context('/api/expenses', method='POST'):
+        assert router.issue_token() is None
+        listener.succeeded(_reply('insert', 200))
+        listener.succeeded(_reply('update', 100))
+        listener.succeeded(_reply('find', 300))
+        token = decode_token(router.issue_token())
+    assert token['o'] == Timestamp(200, 1)
+
+    # Each request starts without one
+    with app.test_request_context('/api/expenses', method='POST'):
+        assert router.issue_token() is None
+
+
+def test_routed_reads_use_majority_concerns(monkeypatch):
+    monkeypatch.delenv('READ_PREFERENCE', raising=False)
+    assert client_options() == {}
+
+    monkeypatch.setenv('READ_PREFERENCE', 'secondaryPreferred')
+    options = client_options()
+    assert options['w'] == 'majority' and options['readConcernLevel'] == 'majority'
+    assert any(isinstance(listener, WriteTimes) for listener in options['event_listeners'])
@@ -0,0 +1,338 @@
+"""
+LedgerRepository contract: the same behaviour from every storage backend.
+"""
+import time
+import pytest
+from datetime import datetime, timedelta
+from app.utils.debt_optimizer import calculate_net_balances
+
+
+def _ids(documents):
+    return [str(doc['_id']) for doc in documents]
+
+
+def _group(repo, name='Trip'):
+    group_id, _ = repo.create_group(name)
+    return str(group_id)
+
+
+def _expense(repo, group_id, amount, payer, participants, description='Dinner'):
+    return str(repo.create_expense(description, amount, payer, participants, group_id))
+
+
+def _listed_balances(repo, group_id=None):
+    balances = calculate_net_balances(repo.list_expenses(group_id), repo.list_settlements(group_id))
+    return {name: paisa for name, paisa in balances.items() if paisa}
+
+
+def _nonzero(balances):
+    return {name: paisa for name, paisa in balances.items() if paisa}
+
+
+def _edge_set(edges):
+    return {frozenset(edge) for edge in edges}
+
+
+# Groups
+
+def test_group_create_get_and_lookup_by_code(repo):
+    group_id, group_code = repo.create_group('Trip')
+    group = repo.get_group(str(group_id))
+    assert group['name'] == 'Trip'
+    assert group['group_code'] == group_code
+    assert str(repo.get_group_by_code(group_code.lower())['_id']) == str(group_id)
+    assert repo.get_group_by_code('NOPE99') is None
+
+
+def test_group_name_is_validated(repo):
+    with pytest.raises(ValueError):
+        repo.create_group('   ')
+
+
+def test_groups_listed_newest_first(repo):
+    first = _group(repo, 'First')
+    # Stored dates have millisecond precision
+    time.sleep(0.005)
+    second = _group(repo, 'Second')
+    listed = _ids(repo.list_groups())
+    assert listed.index(second) < listed.index(first)
+
+
+def test_delete_group_cascades(repo):
+    group_id = _group(repo)
+    other_id = _group(repo, 'Other')
+    repo.add_friend('Asha', 'asha@example.com', group_id)
+    _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    _expense(repo, other_id, 50, 'Asha', ['Asha', 'Ravi'])
+    repo.create_settlement('Ravi', 'Asha', 2000, group_id)
+
+    assert repo.delete_group(group_id) is True
+    assert repo.get_group(group_id) is None
+    assert repo.list_expenses(group_id) == []
+    assert repo.list_settlements(group_id) == []
+    assert repo.list_friends(group_id) == []
+    assert len(repo.list_expenses(other_id)) == 1
+    assert repo.delete_group(group_id) is False
+
+
+# Friends
+
+def test_friend_email_unique_per_group(repo):
+    group_id = _group(repo)
+    other_id = _group(repo, 'Other')
+    assert repo.add_friend('Asha', 'asha@example.com', group_id) is not None
+    assert repo.add_friend('Asha again', 'asha@example.com', group_id) is None
+    assert repo.add_friend('Asha', 'asha@example.com', other_id) is not None
+    assert repo.add_friend('Asha', 'asha@example.com') is not None
+    assert repo.add_friend('Asha', 'asha@example.com') is None
+
+
+def test_add_friends_reports_duplicates(repo):
+    group_id = _group(repo)
+    repo.add_friend('Asha', 'asha@example.com', group_id)
+    inserted, duplicates = repo.add_friends([
+        {'name': 'Asha', 'email': 'asha@example.com'},
+        {'name': 'Ravi', 'email': 'ravi@example.com'},
+        {'name': 'Ravi', 'email': 'ravi@example.com'},
+        {'name': 'Meera', 'email': 'meera@example.com'}
+    ], group_id)
+    assert [index for index, _ in inserted] == [1, 3]
+    assert sorted(duplicates) == [0, 2]
+    assert [friend['name'] for friend in repo.list_friends(group_id)] == ['Asha', 'Meera', 'Ravi']
+
+
+def test_duplicate_friend_leaves_listing(repo):
+    group_id = _group(repo)
+    repo.add_friend('Asha', 'asha@example.com', group_id)
+    friends = repo.list_friends(group_id)
+    assert repo.add_friend('Asha again', 'asha@example.com', group_id) is None
+    assert repo.list_friends(group_id) == friends
+
+
+def test_list_friends_filters_by_group(repo):
+    group_id = _group(repo)
+    repo.add_friend('Ravi', 'ravi@example.com', group_id)
+    repo.add_friend('Zoya', 'zoya@example.com')
+    assert [friend['name'] for friend in repo.list_friends(group_id)] == ['Ravi']
+    assert [friend['name'] for friend in repo.list_friends()] == ['Ravi', 'Zoya']
+
+
+# Expenses
+
+def test_expense_create_and_list(repo):
+    group_id = _group(repo)
+    first = _expense(repo, group_id, 90, 'Asha', ['Asha', 'Ravi', 'Meera'], 'Lunch')
+    time.sleep(0.005)
+    second = _expense(repo, group_id, 10.5, 'Ravi', ['Asha', 'Ravi'], 'Tea')
+    _expense(repo, None, 30, 'Zoya', ['Zoya', 'Asha'])
+
+    expenses = repo.list_expenses(group_id)
+    assert _ids(expenses) == [second, first]
+    tea = expenses[0]
+    assert (tea['description'], tea['amount'], tea['payer']) == ('Tea', 10.5, 'Ravi')
+    assert sorted(tea['participants']) == ['Asha', 'Ravi']
+    assert isinstance(tea['date'], datetime)
+    assert len(repo.list_expenses()) == 3
+
+
+@pytest.mark.parametrize('amount, payer, participants', [
+    (0, 'Asha', ['Asha']),
+    (-5, 'Asha', ['Asha']),
+    (10, 'Asha', [])
+])
+def test_expense_validation(repo, amount, payer, participants):
+    with pytest.raises(ValueError):
+        repo.create_expense('Bad', amount, payer, participants, _group(repo))
+
+
+def test_update_expense(repo):
+    group_id = _group(repo)
+    expense_id = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    created = repo.list_expenses(group_id)[0]
+
+    updated = repo.update_expense(expense_id, 'Corrected', 60, 'Ravi', ['Asha', 'Ravi', 'Meera'], group_id)
+    assert str(updated['_id']) == expense_id
+    assert (updated['description'], updated['amount'], updated['payer']) == ('Corrected', 60, 'Ravi')
+    assert sorted(updated['participants']) == ['Asha', 'Meera', 'Ravi']
+    assert abs(updated['date'] - created['date']) < timedelta(seconds=1)
+    assert _listed_balances(repo, group_id) == {'Ravi': 4000, 'Asha': -2000, 'Meera': -2000}
+    assert _nonzero(repo.group_balances([group_id])[group_id]) == _listed_balances(repo, group_id)
+
+
+def test_update_missing_expense(repo):
+    assert repo.update_expense('0' * 24, 'Nothing', 10, 'Asha', ['Asha']) is None
+
+
+def test_delete_expense(repo):
+    group_id = _group(repo)
+    keep = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    time.sleep(0.005)
+    gone = _expense(repo, group_id, 40, 'Ravi', ['Asha', 'Ravi'])
+
+    assert repo.delete_expense(gone) is True
+    assert repo.delete_expense(gone) is False
+    assert _ids(repo.list_expenses(group_id)) == [keep]
+    assert _nonzero(repo.group_balances([group_id])[group_id]) == {'Asha': 5000, 'Ravi': -5000}
+
+
+# Settlements
+
+def test_settlement_create_and_list(repo):
+    group_id = _group(repo)
+    first = str(repo.create_settlement('Ravi', 'Asha', 2500, group_id))
+    time.sleep(0.005)
+    second = str(repo.create_settlement('Meera', 'Asha', 100, group_id))
+    repo.create_settlement('Zoya', 'Asha', 100)
+
+    settlements = repo.list_settlements(group_id)
+    assert _ids(settlements) == [second, first]
+    assert (settlements[1]['fromUser'], settlements[1]['toUser'], settlements[1]['amount']) == ('Ravi', 'Asha', 25.0)
+    assert len(repo.list_settlements()) == 3
+
+
+# Balances
+
+def test_group_balances_match_listings(repo):
+    group_ids = [_group(repo, 'One'), _group(repo, 'Two'), _group(repo, 'Empty')]
+    _expense(repo, group_ids[0], 100, 'Asha', ['Asha', 'Ravi', 'Meera'])
+    _expense(repo, group_ids[0], 33.33, 'Ravi', ['Asha', 'Ravi', 'Meera'])
+    repo.create_settlement('Meera', 'Asha', 1000, group_ids[0])
+    _expense(repo, group_ids[1], 20, 'Zoya', ['Zoya', 'Ravi'])
+
+    balances = repo.group_balances(group_ids)
+    assert set(balances) == set(group_ids)
+    for group_id in group_ids:
+        assert sum(balances[group_id].values()) == 0
+        assert _nonzero(balances[group_id]) == _listed_balances(repo, group_id)
+    assert _nonzero(balances[group_ids[2]]) == {}
+
+
+def test_group_balances_with_edges(repo):
+    group_id = _group(repo)
+    _expense(repo, group_id, 90, 'Asha', ['Asha', 'Ravi', 'Meera'])
+    repo.create_settlement('Zoya', 'Ravi', 500, group_id)
+
+    balances, edges = repo.group_balances([group_id], with_edges=True)
+    assert _nonzero(balances[group_id]) == _listed_balances(repo, group_id)
+    assert _edge_set(edges[group_id]) == _edge_set([
+        ('Asha', 'Ravi'), ('Asha', 'Meera'), ('Meera', 'Ravi'), ('Ravi', 'Zoya')
+    ])
+
+
+def test_all_balances(repo):
+    one = _group(repo, 'One')
+    two = _group(repo, 'Two')
+    _expense(repo, one, 100, 'Asha', ['Asha', 'Ravi'])
+    _expense(repo, two, 60, 'Ravi', ['Ravi', 'Meera', 'Asha'])
+    _expense(repo, None, 10, 'Zoya', ['Zoya', 'Asha'])
+
+    assert _nonzero(repo.all_balances()) == _listed_balances(repo)
+    balances, edges = repo.all_balances(with_edges=True)
+    assert _nonzero(balances) == _listed_balances(repo)
+    assert frozenset(('Asha', 'Zoya')) in _edge_set(edges)
+    assert _nonzero(repo.all_balances(until=datetime.utcnow() - timedelta(days=1))) == {}
+
+
+# Conditional GET markers
+
+def test_group_marker_changes_on_every_write(repo):
+    group_id = _group(repo)
+    markers = [repo.list_marker('expenses', group_id)]
+
+    def changed():
+        marker = repo.list_marker('expenses', group_id)
+        assert marker not in markers
+        markers.append(marker)
+
+    assert repo.list_marker('expenses', group_id) == markers[0]
+    repo.add_friend('Asha', 'asha@example.com', group_id)
+    changed()
+    expense_id = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    changed()
+    repo.update_expense(expense_id, 'Edited', 50, 'Asha', ['Asha', 'Ravi'], group_id)
+    changed()
+    repo.create_settlement('Ravi', 'Asha', 100, group_id)
+    changed()
+    repo.delete_expense(expense_id)
+    changed()
+    assert repo.list_marker('expenses', group_id) == markers[-1]
+
+
+def test_ungrouped_marker_changes_on_every_write(repo):
+    before = repo.list_marker('expenses')
+    expense_id = _expense(repo, None, 100, 'Asha', ['Asha', 'Ravi'])
+    created = repo.list_marker('expenses')
+    assert created != before
+    repo.update_expense(expense_id, 'Edited', 50, 'Asha', ['Asha', 'Ravi'])
+    edited = repo.list_marker('expenses')
+    assert edited not in (before, created)
+    repo.delete_expense(expense_id)
+    assert repo.list_marker('expenses') not in (before, created, edited)
+
+
+def test_unfiltered_marker_changes_on_grouped_edits(repo):
+    group_id = _group(repo)
+    expense_id = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    before = repo.list_marker('expenses')
+    repo.update_expense(expense_id, 'Edited', 50, 'Asha', ['Asha', 'Ravi'], group_id)
+    edited = repo.list_marker('expenses')
+    assert edited != before
+    repo.delete_expense(expense_id)
+    assert repo.list_marker('expenses') not in (before, edited)
+
+
+LISTINGS = ('expenses', 'settlements', 'friends', 'groups')
+
+
+def test_unfiltered_markers_change_on_every_write(repo):
+    def markers():
+        return {name: repo.list_marker(name) for name in LISTINGS}
+
+    def changed(*names):
+        after = markers()
+        for name in names:
+            assert after[name] != before[name], name
+        return after
+
+    before = markers()
+    group_id = _group(repo)
+    before = changed('groups')
+    repo.add_friend('Asha', 'asha@example.com', group_id)
+    before = changed('friends')
+    repo.add_friend('Zoya', 'zoya@example.com')
+    before = changed('friends')
+    expense_id = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    before = changed('expenses')
+    _expense(repo, None, 100, 'Zoya', ['Zoya', 'Ravi'])
+    before = changed('expenses')
+    repo.update_expense(expense_id, 'Edited', 50, 'Asha', ['Asha', 'Ravi'], group_id)
+    before = changed('expenses')
+    repo.create_settlement('Ravi', 'Asha', 100, group_id)
+    before = changed('settlements')
+    repo.create_settlement('Ravi', 'Zoya', 100)
+    before = changed('settlements')
+    repo.delete_expense(expense_id)
+    before = changed('expenses')
+    repo.delete_group(group_id)
+    changed('groups', 'friends', 'settlements')
+
+
+def test_unfiltered_marker_never_repeats_after_group_delete(repo):
+    deleted_id = _group(repo, 'Deleted')
+    repo.add_friend('Asha', 'asha@example.com', deleted_id)
+    group_id = _group(repo)
+    expense_id = _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    seen = {repo.list_marker('expenses')}
+    repo.delete_group(deleted_id)
+    seen.add(repo.list_marker('expenses'))
+    repo.update_expense(expense_id, 'Edited', 50, 'Asha', ['Asha', 'Ravi'], group_id)
+    assert repo.list_marker('expenses') not in seen
+
+
+def test_reading_view_serves_reads(repo):
+    group_id = _group(repo)
+    _expense(repo, group_id, 100, 'Asha', ['Asha', 'Ravi'])
+    with repo.reading() as reader:
+        assert len(reader.list_expenses(group_id)) == 1
+        assert reader.list_marker('expenses', group_id) == repo.list_marker('expenses', group_id)
+    assert repo.causal_token() is None
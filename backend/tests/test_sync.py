@@ -0,0 +1,122 @@
+"""
+Delta sync on MongoDB: sequence tokens and the paged full snapshot.
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models import sync
+from app.models.mongo_repository import MongoRepository
+from app.models.sync import SyncLog
+
+
+@pytest.fixture
+def repo(mongo_db, monkeypatch):
+    # Writes in these tests are settled as soon as they land
+    monkeypatch.setenv('SYNC_SETTLE_SECONDS', '0')
+    return MongoRepository(lambda: mongo_db)
+
+
+def _group_with_history(repo):
+    group_id = str(repo.create_group('Trip')[0])
+    for name in ('Asha', 'Ravi'):
+        repo.add_friend(name, f'{name.lower()}@example.com', group_id)
+    for amount in (30, 60, 90):
+        repo.create_expense('Dinner', amount, 'Asha', ['Asha', 'Ravi'], group_id)
+    repo.create_settlement('Ravi', 'Asha', 1000, group_id)
+    return group_id
+
+
+def _full_sync(sync_log, group_id, limit, between_pages=None):
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        changes, token, cursor = sync_log.snapshot(group_id, cursor, limit)
+        pages += 1
+        for kind in sync.SYNC_KINDS:
+            seen.extend(document['_id'] for document in changes[kind])
+        if cursor is None:
+            return seen, token, pages
+        assert token is None
+        cursor = SyncLog.decode_cursor(SyncLog.encode_cursor(cursor))
+        if between_pages:
+            between_pages()
+
+
+def test_full_sync_pages_every_document_once(repo):
+    group_id = _group_with_history(repo)
+    sync_log = SyncLog(repo.db)
+
+    seen, token, pages = _full_sync(sync_log, group_id, limit=2)
+
+    assert pages == 4
+    assert len(seen) == len(set(seen)) == 6
+    assert token == sync_log.marker(group_id)
+    changes, delta_token, has_more = sync_log.changes(group_id, token)
+    assert not any(changes.values()) and delta_token == token and not has_more
+
+
+def test_full_sync_sees_documents_moved_to_archive(repo):
+    group_id = _group_with_history(repo)
+    db = repo.db
+    first = db.expenses.find_one({'group_id': group_id}, sort=[('_id', 1)])
+    last = db.expenses.find_one({'group_id': group_id}, sort=[('_id', -1)])
+
+    def archive_last():
+        # Compaction copies to the archive, then deletes the hot copy
+        if db.expenses.find_one({'_id': last['_id']}):
+            db.expenses_archive.insert_one(last)
+            db.expenses.delete_one({'_id': last['_id']})
+
+    seen, _, _ = _full_sync(SyncLog(db), group_id, limit=1, between_pages=archive_last)
+    assert first['_id'] in seen and last['_id'] in seen
+    assert len(seen) == len(set(seen)) == 6
+
+
+def test_delta_sync_returns_edits_and_deletions(repo):
+    group_id = _group_with_history(repo)
+    sync_log = SyncLog(repo.db)
+    _, token, _ = _full_sync(sync_log, group_id, limit=100)
+    expense_ids = [str(expense['_id']) for expense in repo.list_expenses(group_id)]
+
+    repo.update_expense(expense_ids[0], 'Edited', 45, 'Asha', ['Asha', 'Ravi'], group_id)
+    repo.delete_expense(expense_ids[1])
+    changes, token, has_more = sync_log.changes(group_id, token)
+
+    assert [str(expense['_id']) for expense in changes['expense']] == [expense_ids[0]]
+    assert [tombstone['doc_id'] for tombstone in changes['tombstones']] == [expense_ids[1]]
+    assert token == sync_log.marker(group_id) and not has_more
+
+
+def test_token_stops_before_unsettled_seq_without_transactions(repo, monkeypatch):
+    group_id = _group_with_history(repo)
+    sync_log = SyncLog(repo.db)
+    since = sync_log.marker(group_id)
+    old = datetime.utcnow() - timedelta(minutes=1)
+
+    # seq since+1 landed long ago, since+2 is reserved with its write in
+    # flight, since+3 landed just now
+    sync_log.stamp(group_id, [{}])
+    repo.db.expenses.update_one({'group_id': group_id}, {'$set': {'seq': since + 1, 'changed_at': old}})
+    sync_log.reserve(group_id)
+    monkeypatch.setattr(sync_log, 'settle', timedelta(seconds=30))
+    repo.create_settlement('Asha', 'Ravi', 500, group_id)
+
+    changes, token, _ = sync_log.changes(group_id, since)
+    assert token == since + 1
+    assert [s['seq'] for s in changes['settlement']] == [since + 3]
+
+
+def test_token_follows_committed_counter_with_transactions(repo, monkeypatch):
+    monkeypatch.setattr(sync, 'supports_transactions', lambda db: True)
+    group_id = _group_with_history(repo)
+    sync_log = SyncLog(repo.db)
+    monkeypatch.setattr(sync_log, 'settle', timedelta(hours=1))
+
+    _, token, _ = _full_sync(sync_log, group_id, limit=100)
+    assert token == sync_log.marker(group_id)
+
+
+@pytest.mark.parametrize('cursor', ['', '1.2', 'x.5f0000000000000000000000.1', '9.5f0000000000000000000000.1', '0.nope.1'])
+def test_malformed_cursor_rejected(cursor):
+    with pytest.raises(ValueError):
+        SyncLog.decode_cursor(cursor)
@@ -1,26 +1,34 @@
 import React, { useState, useEffect } from 'react';
-import { Link } from 'react-router-dom';
+import { Link, useSearchParams } from 'react-router-dom';
 import { expensesAPI, debtsAPI } from '../services/api';
 import { formatCurrency } from '../utils/currency';
+import { useGroupEvents } from '../utils/groupEvents';
 
 const Dashboard = () => {
   const [expenses, setExpenses] = useState([]);
   const [debts, setDebts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  // Optional ?group=<id>: show that group and keep it live over SSE
+  const [searchParams] = useSearchParams();
+  const groupId = searchParams.get('group');
+  const groupQuery = groupId ? `?group=${groupId}` : '';
 
   useEffect(() => {
     fetchDashboardData();
-  }, []);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [groupId]);
 
-  const fetchDashboardData = async () => {
+  useGroupEvents(groupId, () => fetchDashboardData(false));
+
+  const fetchDashboardData = async (showLoading = true) => {
     try {
-      setLoading(true);
+      if (showLoading) setLoading(true);
       setError('');
       
       const [expensesRes, debtsRes] = await Promise.all([
-        expensesAPI.getAll(),
-        debtsAPI.getAll()
+        expensesAPI.getAll(groupId),
+        debtsAPI.getAll(groupId)
       ]);
       
       setExpenses(expensesRes.data.slice(0, 5)); // Show only recent 5
@@ -85,7 +93,7 @@ const Dashboard = () => {
         <div className="recent-expenses">
           <div className="section-header">
             <h2>Recent Expenses</h2>
-            <Link to="/history" className="view-all">View All</Link>
+            <Link to={`/history${groupQuery}`} className="view-all">View All</Link>
           </div>
           {expenses.length === 0 ? (
             <p className="empty-state">No expenses yet. <Link to="/add-expense">Add your first expense</Link></p>
@@ -109,7 +117,7 @@ const Dashboard = () => {
         <div className="debt-summary">
           <div className="section-header">
             <h2>Pending Settlements</h2>
-            <Link to="/debts" className="view-all">View All</Link>
+            <Link to={`/debts${groupQuery}`} className="view-all">View All</Link>
           </div>
           {debts.length === 0 ? (
             <p className="empty-state">All settled up!</p>
@@ -1,6 +1,8 @@
 import React, { useState, useEffect } from 'react';
+import { useSearchParams } from 'react-router-dom';
 import { debtsAPI, settlementsAPI } from '../services/api';
 import { formatCurrency } from '../utils/currency';
+import { useGroupEvents } from '../utils/groupEvents';
 
 const DebtTracker = () => {
   const [debts, setDebts] = useState([]);
@@ -8,17 +10,23 @@ const DebtTracker = () => {
   const [error, setError] = useState('');
   const [settlingDebt, setSettlingDebt] = useState(null);
   const [settlementAmount, setSettlementAmount] = useState('');
+  // Optional ?group=<id>: show that group and keep it live over SSE
+  const [searchParams] = useSearchParams();
+  const groupId = searchParams.get('group');
 
   useEffect(() => {
     fetchDebts();
-  }, []);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [groupId]);
 
-  const fetchDebts = async () => {
+  useGroupEvents(groupId, () => fetchDebts(false));
+
+  const fetchDebts = async (showLoading = true) => {
     try {
-      setLoading(true);
+      if (showLoading) setLoading(true);
       setError('');
       
-      const response = await debtsAPI.getAll();
+      const response = await debtsAPI.getAll(groupId);
       
       // Handle optimized response format
       if (response.data.debts) {
@@ -46,7 +54,8 @@ const DebtTracker = () => {
       await settlementsAPI.create({
         fromUser: debt.debtor,
         toUser: debt.creditor,
-        amount: amount
+        amount: amount,
+        ...(groupId && { group_id: groupId })
       });
 
       setSettlingDebt(null);
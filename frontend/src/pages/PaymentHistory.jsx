@@ -1,6 +1,8 @@
 import React, { useState, useEffect } from 'react';
+import { useSearchParams } from 'react-router-dom';
 import { expensesAPI, settlementsAPI } from '../services/api';
 import { formatCurrency } from '../utils/currency';
+import { useGroupEvents } from '../utils/groupEvents';
 
 const PaymentHistory = () => {
   const [expenses, setExpenses] = useState([]);
@@ -9,18 +11,25 @@ const PaymentHistory = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
 
+  // Optional ?group=<id>: show that group and keep it live over SSE
+  const [searchParams] = useSearchParams();
+  const groupId = searchParams.get('group');
+
   useEffect(() => {
     fetchHistory();
-  }, []);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [groupId]);
+
+  useGroupEvents(groupId, () => fetchHistory(false));
 
-  const fetchHistory = async () => {
+  const fetchHistory = async (showLoading = true) => {
     try {
-      setLoading(true);
+      if (showLoading) setLoading(true);
       setError('');
       
       const [expensesRes, settlementsRes] = await Promise.all([
-        expensesAPI.getAll(),
-        settlementsAPI.getHistory()
+        expensesAPI.getAll(groupId),
+        settlementsAPI.getHistory(groupId)
       ]);
       
       setExpenses(Array.isArray(expensesRes.data) ? expensesRes.data : []);
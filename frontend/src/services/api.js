@@ -10,9 +10,17 @@ const api = axios.create({
   timeout: 30000, // 30s for Render cold starts
 });
 
+// Latest causal token from a write; sending it back lets reads served by a
+// replica still include this client's own changes
+const CAUSAL_TOKEN_HEADER = 'X-Causal-Token';
+let causalToken = null;
+
 // Request interceptor
 api.interceptors.request.use(
   (config) => {
+    if (causalToken) {
+      config.headers[CAUSAL_TOKEN_HEADER] = causalToken;
+    }
     if (process.env.NODE_ENV === 'development') {
       console.log(`API Request: ${config.method.toUpperCase()} ${config.url}`);
     }
@@ -24,6 +32,10 @@ api.interceptors.request.use(
 // Response interceptor
 api.interceptors.response.use(
   (response) => {
+    const token = response.headers[CAUSAL_TOKEN_HEADER.toLowerCase()];
+    if (token) {
+      causalToken = token;
+    }
     if (process.env.NODE_ENV === 'development') {
       console.log(`API Response: ${response.config.url} - ${response.status}`);
     }
@@ -77,6 +89,8 @@ export const expensesAPI = {
     return retryRequest(() => api.get(url));
   },
   create: (expenseData) => api.post('/api/expenses', expenseData),
+  update: (expenseId, expenseData) => api.put(`/api/expenses/${expenseId}`, expenseData),
+  delete: (expenseId) => api.delete(`/api/expenses/${expenseId}`),
 };
 
 export const debtsAPI = {
@@ -88,6 +102,7 @@ export const debtsAPI = {
     if (params.length) url += '?' + params.join('&');
     return retryRequest(() => api.get(url));
   },
+  getBatch: (groupIds) => retryRequest(() => api.get(`/api/debts/batch?group_ids=${groupIds.join(',')}`)),
 };
 
 export const settlementsAPI = {
@@ -113,6 +128,41 @@ export const groupsAPI = {
   delete: (groupId) => api.delete(`/api/groups/${groupId}`),
 };
 
+// Live group updates over Server-Sent Events (replaces polling).
+// handlers: { expense, settlement, deleted, balances, resync, reconnect }
+// callbacks; `deleted` receives { kind, _id } for a removed expense or
+// settlement, `reconnect` fires when the stream reopens (events may be missed)
+export const eventsAPI = {
+  subscribe: (groupId, handlers) => {
+    const source = new EventSource(`${API_BASE_URL}/api/groups/${groupId}/events`);
+    ['expense', 'settlement', 'deleted', 'balances', 'resync'].forEach((type) => {
+      if (handlers[type]) {
+        source.addEventListener(type, (event) => handlers[type](JSON.parse(event.data)));
+      }
+    });
+    if (handlers.reconnect) {
+      let opened = false;
+      source.addEventListener('open', () => {
+        if (opened) handlers.reconnect();
+        opened = true;
+      });
+    }
+    return () => source.close();
+  },
+};
+
+// Delta sync: pass the token from the previous response to fetch only changes.
+// Without a token the snapshot is paged: pass `next` back as `cursor` until it
+// is null, then keep that page's token
+export const syncAPI = {
+  get: (groupId, since, cursor) => {
+    const params = new URLSearchParams({ group_id: groupId });
+    if (since) params.set('since', since);
+    if (cursor) params.set('cursor', cursor);
+    return retryRequest(() => api.get(`/api/sync?${params}`));
+  },
+};
+
 export const healthAPI = {
   check: () => api.get('/health'),
 };
@@ -0,0 +1,33 @@
+import { useEffect, useRef } from 'react';
+import { eventsAPI } from '../services/api';
+
+// Calls onChange once per burst of live changes to the group (new, edited or
+// deleted expenses and settlements, or a reconnect that may have missed some).
+// Does nothing without a groupId
+export const useGroupEvents = (groupId, onChange, delay = 300) => {
+  const callback = useRef(onChange);
+
+  useEffect(() => {
+    callback.current = onChange;
+  }, [onChange]);
+
+  useEffect(() => {
+    if (!groupId) return undefined;
+    let timer = null;
+    const schedule = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => callback.current(), delay);
+    };
+    const unsubscribe = eventsAPI.subscribe(groupId, {
+      expense: schedule,
+      settlement: schedule,
+      deleted: schedule,
+      resync: schedule,
+      reconnect: schedule,
+    });
+    return () => {
+      clearTimeout(timer);
+      unsubscribe();
+    };
+  }, [groupId, delay]);
+};